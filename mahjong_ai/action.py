@@ -1,208 +1,191 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 # ai/ai_decide.py
-import torch
-from mahjong_ai.table.tile import Tile
-from mahjong_ai.model.model import Brain, DQN, AuxNet
-from mahjong_ai.table.encode_obs import encode_obs_v2
 import os
-# from ai.reward import evaluate_action_reward
+import numpy as np
+from mahjong_ai.table.decision import Decision
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Table  # 僅供型別檢查工具使用，不會在執行時引入
     from mahjong_ai.table.player import Player
 
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-brain = Brain(version=2, conv_channels=128, num_blocks=8).to(DEVICE).eval()
-dqn = DQN(version=2).to(DEVICE).eval()
-aux = AuxNet((4,)).to(DEVICE).eval()  # 若你推理階段不需要，可不用算
+# 模型在第一次推論時才建立並載入（get_policy），只用規則或 helper 的程式不必載入 torch；
+# 也可以用 set_policy 直接指定要用的模型
+DEVICE = None
+brain = None
+dqn = None
+aux = None
+graph = None   # 計算圖來源時的模型（model/export.py 的 TorchScriptPolicy / OnnxPolicy），此時 brain / dqn 為 None
 model_path = "mahjong_ai/models"
-if os.path.exists(f"{model_path}/best_brain.pth"):
-    brain.load_state_dict(torch.load(f"{model_path}/best_brain.pth", map_location=DEVICE, weights_only=True))
-    dqn.load_state_dict(torch.load(f"{model_path}/best_dqn.pth", map_location=DEVICE, weights_only=True))
-    print("[!] 使用 best 模型")
-elif os.path.exists(f"{model_path}/latest_brain.pth"):
-    brain.load_state_dict(torch.load(f"{model_path}/latest_brain.pth", map_location=DEVICE, weights_only=True))
-    dqn.load_state_dict(torch.load(f"{model_path}/latest_dqn.pth", map_location=DEVICE, weights_only=True))
-    print(" 使用 latest 模型")
-else:
-    print("[!] 沒有找到任何模型，請先執行訓練 train.py")
 
-def ai_decide_action(table, tile , buffer, action_types: set[str]) -> int:
-    # 1. 編碼 obs/mask
-    obs, mask = encode_obs_v2(table, action_types)
-    obs_tensor = torch.tensor(obs).unsqueeze(0).float().to(DEVICE)   # [1, C, 34]
-    mask_tensor = torch.tensor(mask).unsqueeze(0).bool().to(DEVICE)  # [1, A]
+# 推論模型的來源：
+#   fp32  訓練存下的 best / latest 模型
+#   int8  export_policy.py 產生的推論檔（BatchNorm 併進卷積、Linear 動態 INT8，只在 CPU 上跑）
+#   torchscript / onnx  export_policy.py 追蹤成單一計算圖的 Brain + DQN（onnx 需要 onnxruntime），只在 CPU 上跑
+POLICY_BACKENDS = ("fp32", "int8", "torchscript", "onnx")
+INT8_POLICY_PATH = f"{model_path}/policy_int8.pth"
+GRAPH_POLICY_PATHS = {"torchscript": f"{model_path}/policy.ts", "onnx": f"{model_path}/policy.onnx"}
+# 模型結構（與 train.py 預設參數相同）
+POLICY_CONFIG = {"version": 2, "conv_channels": 128, "num_blocks": 8}
+_policy_backend: str | None = None
+_policy_threads: int | None = None
+
+def policy_backend() -> str:
+    return _policy_backend or os.environ.get("MAHJONG_POLICY_BACKEND", "fp32")
+
+def policy_threads() -> int | None:
+    """
+    推論的 intra-op 執行緒數（None 則不設定，用 torch / onnxruntime 的預設）。
+    """
+    threads = _policy_threads or int(os.environ.get("MAHJONG_POLICY_THREADS", "0"))
+    return threads or None
+
+def set_policy_threads(threads: int | None) -> None:
+    global _policy_threads
+    _policy_threads = threads
+
+def set_policy_backend(name: str | None) -> None:
+    """
+    切換推論模型的來源（None 則依 MAHJONG_POLICY_BACKEND）；來源有變時下次推論才重新載入。
+    """
+    global _policy_backend, brain, dqn, graph
+    if name is not None and name not in POLICY_BACKENDS:
+        raise ValueError(f"未知的推論模型來源：{name}")
+    previous = policy_backend()
+    _policy_backend = name
+    if policy_backend() != previous:
+        brain = dqn = graph = None
+
+def load_fp32_policy(device=None):
+    """
+    建立 fp32 的 (brain, dqn, aux)，有 best / latest 模型檔就載入。
+    """
+    import torch
+    from mahjong_ai.model.model import Brain, DQN, AuxNet
+
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    brain = Brain(**POLICY_CONFIG).to(device).eval()
+    dqn = DQN(version=POLICY_CONFIG["version"]).to(device).eval()
+    aux = AuxNet((4,)).to(device).eval()  # 若你推理階段不需要，可不用算
+    if os.path.exists(f"{model_path}/best_brain.pth"):
+        brain.load_state_dict(torch.load(f"{model_path}/best_brain.pth", map_location=device, weights_only=True))
+        dqn.load_state_dict(torch.load(f"{model_path}/best_dqn.pth", map_location=device, weights_only=True))
+        print("[!] 使用 best 模型")
+    elif os.path.exists(f"{model_path}/latest_brain.pth"):
+        brain.load_state_dict(torch.load(f"{model_path}/latest_brain.pth", map_location=device, weights_only=True))
+        dqn.load_state_dict(torch.load(f"{model_path}/latest_dqn.pth", map_location=device, weights_only=True))
+        print(" 使用 latest 模型")
+    else:
+        print("[!] 沒有找到任何模型，請先執行訓練 train.py")
+    return brain, dqn, aux
+
+def load_policy():
+    global DEVICE, brain, dqn, aux, graph
+    import torch
+
+    backend = policy_backend()
+    if policy_threads():
+        torch.set_num_threads(policy_threads())
+    if backend in GRAPH_POLICY_PATHS:
+        path = GRAPH_POLICY_PATHS[backend]
+        if os.path.exists(path):
+            from mahjong_ai.model.export import TorchScriptPolicy, OnnxPolicy
+            try:
+                graph = (TorchScriptPolicy if backend == "torchscript" else OnnxPolicy)(path, policy_threads())
+                DEVICE = torch.device("cpu")
+                print(f"[!] 使用 {backend} 模型 {path}")
+                return
+            except ImportError as e:
+                print(f"[!] 無法載入 {backend} 模型（{e}），改用 fp32")
+        else:
+            print(f"[!] 找不到 {backend} 模型 {path}，改用 fp32（先執行 python -m mahjong_ai.export_policy --format {backend}）")
+    if backend == "int8":
+        if os.path.exists(INT8_POLICY_PATH):
+            from mahjong_ai.model.quantize import load_int8_policy
+            DEVICE = torch.device("cpu")
+            brain, dqn, meta = load_int8_policy(INT8_POLICY_PATH)
+            agreement = meta.get("agreement")
+            print(f"[!] 使用 INT8 模型 {INT8_POLICY_PATH}" + (f"（與 fp32 argmax 一致率 {agreement:.2%}）" if agreement is not None else ""))
+            return
+        print(f"[!] 找不到 INT8 模型 {INT8_POLICY_PATH}，改用 fp32（先執行 python -m mahjong_ai.export_policy）")
+    DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    brain, dqn, aux = load_fp32_policy(DEVICE)
+
+def get_policy():
+    """
+    (brain, dqn)；第一次呼叫時才建立並載入模型。計算圖來源時兩者皆為 None（改用 graph）。
+    """
+    if brain is None and graph is None:
+        load_policy()
+    return brain, dqn
+
+def set_policy(new_brain, new_dqn, device=None) -> None:
+    """
+    指定推論用的模型（需已是 eval 模式），取代 load_policy 從檔案載入的模型。
+    """
+    global DEVICE, brain, dqn, graph
+    brain = new_brain
+    dqn = new_dqn
+    graph = None
+    DEVICE = device or next(new_brain.parameters()).device
+
+# 批次推論服務（inference.py 的 InferenceServer 或其他行程的 InferenceClient）；None 則直接以批次大小 1 推論
+inference = None
+
+def set_inference(server) -> None:
+    global inference
+    inference = server
+
+def decide_batch(obs, mask) -> list[int]:
+    """
+    一批 obs [B, C, 34]、mask [B, A] 各自的 action（Q 值最大者）。
+    """
+    if inference is not None:
+        # 與其他牌桌的請求湊成一批再推論；InferenceClient 一次只能有一個請求在等，只能逐筆送
+        submit = getattr(inference, "submit", None)
+        if submit is None:
+            return [inference.decide(o, m) for o, m in zip(obs, mask)]
+        return [future.result() for future in [submit(o, m) for o, m in zip(obs, mask)]]
+    return policy_decide(obs, mask)
+
+def policy_decide(obs, mask) -> list[int]:
+    """
+    以本行程的模型（依 policy_backend）推論一批 obs / mask 的 action。
+    """
+    import torch
+    brain, dqn = get_policy()
+    if graph is not None:
+        return graph.decide(np.asarray(obs, dtype=np.float32), np.asarray(mask, dtype=bool))
+    obs_tensor = torch.from_numpy(np.asarray(obs, dtype=np.float32)).to(DEVICE)   # [B, C, 34]
+    mask_tensor = torch.from_numpy(np.asarray(mask, dtype=bool)).to(DEVICE)      # [B, A]
 
     with torch.no_grad():
-        phi = brain(obs_tensor)  # [1, 1024]
-        q = dqn(phi, mask_tensor)  # [1, A]
-        action = torch.argmax(q, dim=-1).item()
+        phi = brain(obs_tensor)  # [B, 1024]
+        q = dqn(phi, mask_tensor)  # [B, A]
 
         # 可選：預測 rank，只記錄不使用
-        # pred_rank = torch.argmax(aux(phi), dim=-1).item()
-
-    reward =  evaluate_action_reward(table, action, tile)
-
-    if buffer is not None:
-        buffer.push({
-            "obs": obs.tolist(),       # [942, 34] → list of list
-            "mask": mask.tolist(),     # [46] → list
-            "action": int(action),     # 確保不是 np.int64
-            "reward": float(reward),   # 確保不是 np.float32
-        })
+        # pred_rank = torch.argmax(aux(phi), dim=-1)
+        return torch.argmax(q, dim=-1).tolist()
+
+def answer_decisions(decisions: list[Decision]) -> list:
+    """
+    回答一批 Decision（可來自不同牌桌）：需要模型的湊成一次推論，依規則的用預設答案。
+    """
+    answers = [d.default for d in decisions]
+    model = [i for i, d in enumerate(decisions) if d.needs_model]
+    if model:
+        encoded = [decisions[i].encode() for i in model]
+        actions = decide_batch(np.stack([obs for obs, _ in encoded]), np.stack([mask for _, mask in encoded]))
+        for i, action in zip(model, actions):
+            answers[i] = action
+    return answers
+
+def answer_decision(decision: Decision):
+    return answer_decisions([decision])[0]
 
+def ai_decide_action(table, tile , buffer, action_types: set[str]) -> int:
+    # 編碼 obs/mask → 推論 → 計算 reward 並寫入 buffer
+    decision = Decision(table, None, "action", tile, action_types=action_types)
+    action = answer_decision(decision)
+    decision.record(action, buffer)
     return action
-
-
-from mahjong_ai.utils.helper_interface import (
-    call_mahjong_helper, choose_first_3_discards_from_output,
-    mingpai_mahjong_helper, chi_mingpai_top_two_lines, pon_mingpai_top_two_lines
-)
-
-def evaluate_action_reward(table: Table, action: int, tile: Tile | None) -> float:
-    from mahjong_ai.table.Mingpai import can_chi_sets, can_pon, can_daiminkan
-    player = table.players[table.current_turn]
-    print(f"\n{action}")
-    # 打牌 (0~33)
-    if 0 <= action <= 33:
-        discard_tile = Tile.from_34_id(action)
-        output = call_mahjong_helper(player.hand.tiles, player.melds)
-        top_discards = choose_first_3_discards_from_output(output)
-        if discard_tile.to_helper_string() in top_discards:
-            return 1.0
-        else:
-            return -0.2
-
-    # 立直
-    elif action == 34:
-        if player.is_riichi:
-            return 1.5
-        return -0.5
-
-    # 吃牌 (35–37)
-    elif 35 <= action <= 37:
-        if not tile:
-            return -1.0
-        if (player.hasyaku or player.do_has_yaku()) :
-            output = mingpai_mahjong_helper(player.hand.tiles, player.melds, tile)
-            result = chi_mingpai_top_two_lines(output, tile)
-            return 1.0 if result else -1.0
-        
-        return -2.0
-
-    # 碰牌
-    elif action == 38:
-        if not tile:
-            return -1.0
-
-        
-        if sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) < 2:
-                return -1.0
-
-        # 如果是字牌才檢查風牌限制
-        if tile.tile_type == 'honor':
-            # 東=1, 南=2, 西=3, 北=4, 白=5, 發=6, 中=7
-            valid_values = []
-
-            # 自風 & 場風（東=0, 南=1, 西=2, 北=3）
-            wind_map = {0: 1, 1: 2, 2: 3, 3: 4}
-            valid_values.append(wind_map.get(player.seat_wind))
-            valid_values.append(wind_map.get(player.round_wind))
-
-            # 中白發永遠可碰（5,6,7）
-            valid_values += [5, 6, 7]
-
-            if tile.tile_value not in valid_values:
-                return -1.0
-        
-            player.hasyaku = True
-
-        if ((player.hasyaku or player.do_has_yaku())) :
-            output = mingpai_mahjong_helper(player.hand.tiles, player.melds, tile)
-            result = pon_mingpai_top_two_lines(output)
-            return 1.0 if result else -1.0
-        
-        return -2.0
-        
-
-    # 槓牌
-    elif action == 40:
-        if not tile:
-            return -1.0
-        if ((player.hasyaku or player.do_has_yaku())) :
-            return 0.5
-        return -0.3
-
-    
-    elif action == 39 or action == 41:
-        return 0.5
-
-    # 和牌
-    elif action == 42:
-        if table.round_result and table.round_result.winner == player.player_id:
-            return 10.0
-        return -1.0
-
-    # 流局
-    elif action == 43:
-        return 0.0
-    # PASS
-    elif action == 44:
-        if tile:
-            # --- 檢查是否能吃（僅限下家）
-            chi_allowed = (table.last_discard_player_id + 1) % 4 == table.current_turn
-            if chi_allowed and can_chi_sets(player, tile):
-                if (player.hasyaku or player.do_has_yaku()) :
-                    output = mingpai_mahjong_helper(player.hand.tiles, player.melds, tile)
-                    result = chi_mingpai_top_two_lines(output, tile)
-                    return -0.3 if result else 1.0
-                return 1.0
-
-            # --- 檢查是否能碰
-            if can_pon(player, tile):
-                if sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) < 2:
-                    return -1.0
-
-                # 如果是字牌才檢查風牌限制
-                if tile.tile_type == 'honor':
-                    # 東=1, 南=2, 西=3, 北=4, 白=5, 發=6, 中=7
-                    valid_values = []
-
-                    # 自風 & 場風（東=0, 南=1, 西=2, 北=3）
-                    wind_map = {0: 1, 1: 2, 2: 3, 3: 4}
-                    valid_values.append(wind_map.get(player.seat_wind))
-                    valid_values.append(wind_map.get(player.round_wind))
-
-                    # 中白發永遠可碰（5,6,7）
-                    valid_values += [5, 6, 7]
-
-                    if tile.tile_value not in valid_values:
-                        return -1.0
-                
-                    player.hasyaku = True
-
-                if ((player.hasyaku or player.do_has_yaku())) :
-                    output = mingpai_mahjong_helper(player.hand.tiles, player.melds, tile)
-                    result = pon_mingpai_top_two_lines(output)
-                    return -0.3 if result else 1.0
-                
-                return 0.5
-                
-            # if can_daiminkan(player, tile):
-            #     if ((player.hasyaku or player.do_has_yaku())) :
- 
-                
-            return 1.0  # 不能吃／不能碰 → PASS 是合理的
-        else:
-            return 0.1  # 沒有 tile 無法判斷，保守給中性分
-
-
-    return 0.0
-
-
-
-
-    
-
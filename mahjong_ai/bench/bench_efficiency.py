@@ -0,0 +1,123 @@
+# bench_efficiency.py - 比較 efficiency.py（純 Python 牌效率）與 mahjong-helper 的速度與建議一致率
+
+import argparse
+import random
+import time
+
+from mahjong_ai.bench.bench_shanten import make_hands
+from mahjong_ai.table import shanten
+from mahjong_ai.table.tile import Tile
+from mahjong_ai.utils import efficiency
+from mahjong_ai.utils.helper_interface import pon_mingpai_top_two_lines, chi_mingpai_top_two_lines
+from mahjong_ai.utils.helper_output import HelperResult, parse_helper_output
+from mahjong_ai.utils.helper_pool import get_helper_pool
+
+
+def to_helper_str(counts: list[int]) -> str:
+    # 與 format_tiles_for_helper 相同的寫法（依花色分組，字牌用 z）
+    parts = []
+    for suit, base in zip("mpsz", (0, 9, 18, 27)):
+        digits = "".join(str(v + 1) * counts[base + v] for v in range(9 if suit != "z" else 7))
+        if digits:
+            parts.append(digits + suit)
+    return " ".join(parts)
+
+
+def make_inputs(num_hands: int, seed: int) -> tuple[list[str], list[tuple[str, int]]]:
+    """
+    產生兩種請求：摸牌後的 14 張（切牌建議）與 13 張 + 別人打出的一張（鳴牌建議）。
+    """
+    rng = random.Random(seed)
+    discards = []
+    calls = []
+    for counts in make_hands(num_hands, seed):
+        tid = rng.choice([i for i in range(34) if counts[i] < 4])
+        calls.append((f"{to_helper_str(counts)} + {to_helper_str([int(i == tid) for i in range(34)])}", tid))
+        counts[tid] += 1
+        discards.append(to_helper_str(counts))
+    return discards, calls
+
+
+def check_ukeire(inputs: list[str]) -> int:
+    """
+    以「每種牌加一張重算向聽」的暴力法檢查打牌後的有效牌，回傳不一致的手牌數。
+    """
+    wrong = 0
+    for input_str in inputs:
+        hand, _, _ = efficiency.parse_helper_input(input_str)
+        for e in efficiency.evaluate_discards(hand, two_step=False):
+            hand[e.tid] -= 1
+            expect = []
+            for t in range(34):
+                if hand[t] < 4:
+                    hand[t] += 1
+                    if shanten.calculate_shanten(hand) < e.shanten:
+                        expect.append(t)
+                    hand[t] -= 1
+            hand[e.tid] += 1
+            if tuple(expect) != e.ukeire:
+                wrong += 1
+                break
+    return wrong
+
+
+def timed(fn, inputs: list[str]) -> tuple[list, float]:
+    start = time.perf_counter()
+    outputs = [fn(s) for s in inputs]
+    return outputs, (time.perf_counter() - start) / len(inputs) * 1e3
+
+
+def call_decision(result: str | HelperResult, tid: int):
+    # 與 player.py 相同的判斷：先看碰，再看吃
+    if pon_mingpai_top_two_lines(result):
+        return "pon"
+    chi = chi_mingpai_top_two_lines(result, Tile.from_34_id(tid))
+    return tuple(chi) if chi else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hands", type=int, default=500, help="測試手牌數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    discards, calls = make_inputs(args.hands, args.seed)
+    call_inputs = [s for s, _ in calls]
+
+    print(f"有效牌錯誤        : {check_ukeire(discards)}/{len(discards)}")
+
+    native_d, native_d_ms = timed(efficiency.analyze_helper_input, discards)
+    native_c, native_c_ms = timed(efficiency.analyze_helper_input, call_inputs)
+    print(f"native 切牌       : {native_d_ms:8.2f} ms/request")
+    print(f"native 鳴牌       : {native_c_ms:8.2f} ms/request")
+
+    pool = get_helper_pool()
+    if not pool.analyze(discards[0]):
+        print("helper            : 無法執行（MAHJONG_HELPER_PATH），略過一致率比較")
+        pool.close()
+        return
+
+    helper_d, helper_d_ms = timed(pool.analyze, discards)
+    helper_c, helper_c_ms = timed(pool.analyze, call_inputs)
+    print(f"helper 切牌       : {helper_d_ms:8.2f} ms/request  (native x{helper_d_ms / native_d_ms:.2f})")
+    print(f"helper 鳴牌       : {helper_c_ms:8.2f} ms/request  (native x{helper_c_ms / native_c_ms:.2f})")
+
+    same_best = same_comprehensive = in_top3 = 0
+    for n, h_text in zip(native_d, helper_d):
+        h = parse_helper_output(h_text)
+        same_best += n.best_discard() == h.best_discard()
+        same_comprehensive += n.comprehensive_discard() == h.comprehensive_discard()
+        in_top3 += n.best_discard() in h.top_discards(3)
+    same_call = sum(
+        call_decision(n, tid) == call_decision(h_text, tid)
+        for n, h_text, (_, tid) in zip(native_c, helper_c, calls)
+    )
+    total = len(discards)
+    print(f"第一建議一致      : {same_best}/{total}（在 helper 前三名內 {in_top3}/{total}）")
+    print(f"綜合策略一致      : {same_comprehensive}/{total}（native 沒有打點，只在一、兩向聽時有建議）")
+    print(f"鳴牌決定一致      : {same_call}/{len(calls)}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
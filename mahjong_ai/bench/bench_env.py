@@ -0,0 +1,69 @@
+# bench_env.py - 量測 VecMahjongEnv 的每秒 env step 數（隨機合法動作或模型推論）
+
+import argparse
+import time
+
+import numpy as np
+
+from mahjong_ai.env.vec_env import VecMahjongEnv
+from mahjong_ai.utils.helper_interface import HELPER_BACKENDS, set_helper_backend
+
+
+def random_policy(rng: np.random.Generator, num_tables: int):
+    """
+    在 mask 內均勻隨機選一個 action；分數陣列只配置一次。
+    """
+    scores = np.empty((num_tables, 0), dtype=np.float64)
+
+    def act(obs, mask):
+        nonlocal scores
+        if scores.shape != mask.shape:
+            scores = np.empty(mask.shape, dtype=np.float64)
+        rng.random(out=scores)
+        scores[~mask] = -1.0
+        return scores.argmax(axis=1)
+    return act
+
+
+def run(num_tables: int, steps: int, policy: str, seed: int) -> None:
+    env = VecMahjongEnv(num_tables, seed=seed)
+    if policy == "model":
+        import torch
+        from mahjong_ai import action
+        torch.set_num_threads(1)
+        act = action.decide_batch
+    else:
+        act = random_policy(np.random.default_rng(seed), num_tables)
+
+    start = time.perf_counter()
+    obs, mask = env.reset()
+    reset_seconds = time.perf_counter() - start
+    policy_seconds = 0.0
+    start = time.perf_counter()
+    for _ in range(steps):
+        t = time.perf_counter()
+        actions = act(obs, mask)
+        policy_seconds += time.perf_counter() - t
+        obs, mask, reward, done = env.step(actions)
+    elapsed = time.perf_counter() - start
+    env.close()
+    print(f"{num_tables:3d} 個牌桌：{env.steps / elapsed:7.1f} env step/秒（{env.steps} 步，完成 {env.games_done} 場，"
+          f"{elapsed:.1f}s，其中策略 {policy_seconds:.1f}s；reset {reset_seconds:.1f}s）")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, nargs="+", default=[1, 8, 32], help="牌桌數（可給多個）")
+    parser.add_argument("--steps", type=int, default=50, help="每種設定呼叫 step 的次數")
+    parser.add_argument("--policy", choices=("random", "model"), default="random", help="動作來源")
+    parser.add_argument("--helper", choices=HELPER_BACKENDS, default="native", help="非 AI 玩家切牌建議的來源")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    set_helper_backend(args.helper)
+    for num_tables in args.tables:
+        run(num_tables, args.steps, args.policy, args.seed)
+
+
+if __name__ == "__main__":
+    main()
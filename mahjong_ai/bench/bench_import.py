@@ -0,0 +1,50 @@
+# bench_import.py - 量測各入口在全新行程中的 import 時間（worker 與 CLI 的冷啟動），以及是否載入了 torch / 模型
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# 名稱 → 在全新行程中執行的程式碼
+TARGETS = {
+    "table（規則）": "import mahjong_ai.table.table",
+    "env.vec_env": "import mahjong_ai.env.vec_env",
+    "label_rewards（CLI）": "import mahjong_ai.label_rewards",
+    "simulate_selfplay（CLI／spawn worker）": "import mahjong_ai.simulate_selfplay",
+    # 原本 import table 就會做的事：載入 torch、建立模型並讀取模型檔
+    "載入模型（原本每次 import 都要）": "import mahjong_ai.action as a; a.get_policy()",
+}
+
+PROBE = """
+import contextlib, io, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    exec({code!r})
+print(time.perf_counter() - start, "torch" in sys.modules)
+"""
+
+
+def measure(code: str, repeat: int) -> tuple[float, bool]:
+    """
+    在 repeat 個全新行程中執行 code，回傳 (中位數秒數, 是否載入了 torch)。
+    """
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", PROBE.format(code=code)], capture_output=True, text=True, check=True)
+        seconds, torch_loaded = result.stdout.split()
+        times.append(float(seconds))
+    return statistics.median(times), torch_loaded == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="每個入口量測的次數（取中位數）")
+    args = parser.parse_args()
+
+    for name, code in TARGETS.items():
+        seconds, torch_loaded = measure(code, args.repeat)
+        print(f"{name:<36s}: {seconds * 1e3:8.1f} ms  torch {'已載入' if torch_loaded else '未載入'}")
+
+
+if __name__ == "__main__":
+    main()
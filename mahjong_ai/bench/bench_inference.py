@@ -0,0 +1,73 @@
+# bench_inference.py - 比較逐筆推論與 InferenceServer 批次推論的每秒決策數、批次大小分布與排隊時間
+
+import argparse
+import threading
+import time
+
+import numpy as np
+import torch
+
+from mahjong_ai.bench.bench_buffer import make_samples
+from mahjong_ai.inference import InferenceServer, format_stats
+from mahjong_ai.model.model import Brain, DQN
+
+
+def run_clients(decide, samples: list[dict], tables: int, decisions: int) -> float:
+    """
+    tables 個執行緒（模擬同時進行的牌桌）各做 decisions 次決策，回傳每秒決策數。
+    """
+    def client(offset):
+        for i in range(decisions):
+            s = samples[(offset + i) % len(samples)]
+            decide(s["obs"], s["mask"])
+
+    threads = [threading.Thread(target=client, args=(t * decisions,)) for t in range(tables)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return tables * decisions / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=32, help="同時進行的牌桌（執行緒）數")
+    parser.add_argument("--decisions", type=int, default=20, help="每個牌桌的決策次數")
+    parser.add_argument("--max_batch", type=int, nargs="+", default=[8, 32, 64], help="批次上限（可給多個）")
+    parser.add_argument("--max_latency_ms", type=float, nargs="+", default=[1.0, 5.0], help="最長等待毫秒數（可給多個）")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    brain = Brain(version=2, conv_channels=128, num_blocks=8).eval()
+    dqn = DQN(version=2).eval()
+    samples = make_samples(256, args.seed)
+
+    def direct(obs, mask):
+        # 原本 ai_decide_action 的做法：每個決策各自以批次大小 1 推論
+        with torch.no_grad():
+            q = dqn(brain(torch.from_numpy(obs).unsqueeze(0)), torch.from_numpy(mask).unsqueeze(0))
+            return int(torch.argmax(q, dim=-1).item())
+
+    base = run_clients(direct, samples, args.tables, args.decisions)
+    print(f"逐筆推論                    : {base:8.1f} 決策/秒")
+
+    # 同一批 obs 逐筆與批次推論的 action 要相同
+    server = InferenceServer(brain, dqn, max_batch=64, max_latency_ms=5.0)
+    futures = [server.submit(s["obs"], s["mask"]) for s in samples]
+    same = sum(f.result() == direct(s["obs"], s["mask"]) for f, s in zip(futures, samples))
+    server.close()
+    print(f"與逐筆推論相同              : {same}/{len(samples)}")
+
+    for max_batch in args.max_batch:
+        for latency in args.max_latency_ms:
+            server = InferenceServer(brain, dqn, max_batch=max_batch, max_latency_ms=latency)
+            rate = run_clients(server.decide, samples, args.tables, args.decisions)
+            server.close()
+            print(f"批次 ≤{max_batch:<3d} 等待 {latency:4.1f} ms     : {rate:8.1f} 決策/秒  (x{rate / base:.1f})")
+            print("  " + format_stats(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
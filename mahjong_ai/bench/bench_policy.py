@@ -0,0 +1,98 @@
+# bench_policy.py - 比較各種推論模型（fp32、BatchNorm 併入卷積、INT8、TorchScript、ONNX）在不同批次大小的延遲，以及 argmax 與 fp32 的一致率
+
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from mahjong_ai import action
+from mahjong_ai.bench.bench_buffer import make_samples
+from mahjong_ai.model.export import example_inputs, export_onnx, trace_policy
+from mahjong_ai.model.model import Brain, DQN
+from mahjong_ai.model.quantize import fold_batchnorm, quantize_policy
+
+
+def make_variants(brain, dqn, threads: int = 1) -> dict:
+    """
+    名稱 → decide(obs, mask) -> q；obs / mask 為 torch tensor。
+    onnx 只在裝了 onnx 與 onnxruntime 時加入（threads 為 onnxruntime session 的 intra-op 執行緒數）。
+    """
+    folded = fold_batchnorm(copy.deepcopy(brain))
+    q_brain, q_dqn = quantize_policy(brain, dqn)
+    traced = trace_policy(brain, dqn)
+    variants = {
+        "fp32": lambda obs, mask: dqn(brain(obs), mask),
+        "fp32 併 BN": lambda obs, mask: dqn(folded(obs), mask),
+        "int8": lambda obs, mask: q_dqn(q_brain(obs), mask),
+        "torchscript": lambda obs, mask: traced(obs, mask),
+    }
+    try:
+        from mahjong_ai.model.export import OnnxPolicy
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policy.onnx")
+            export_onnx(brain, dqn, path)
+            onnx_policy = OnnxPolicy(path, threads)
+        variants["onnx"] = lambda obs, mask: torch.from_numpy(onnx_policy.q_values(obs.numpy(), mask.numpy()))
+    except ImportError as e:
+        print(f"[!] 略過 onnx（{e}）")
+    return variants
+
+
+def latency_ms(decide, obs: torch.Tensor, mask: torch.Tensor, repeat: int) -> float:
+    with torch.no_grad():
+        decide(obs, mask)   # 暖機
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decide(obs, mask)
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 64, 512], help="批次大小（可給多個）")
+    parser.add_argument("--version", type=int, choices=(2, 3, 4), default=None, help="以隨機權重建立此版本的模型（預設載入 action.py 的 fp32 模型）")
+    parser.add_argument("--repeat", type=int, default=20, help="每種設定重複次數")
+    parser.add_argument("--check", type=int, default=512, help="檢查 argmax 一致率的筆數")
+    parser.add_argument("--threads", type=int, default=1, help="torch 的 intra-op 執行緒數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    torch.set_num_threads(args.threads)
+    if args.version is None:
+        brain, dqn, _ = action.load_fp32_policy(torch.device("cpu"))
+    else:
+        config = {**action.POLICY_CONFIG, "version": args.version}
+        brain, dqn = Brain(**config).eval(), DQN(version=args.version).eval()
+    variants = make_variants(brain, dqn, args.threads)
+
+    rows = max(args.check, max(args.batch))
+    if brain.version == 2:
+        samples = make_samples(rows, args.seed)
+        obs = torch.from_numpy(np.stack([s["obs"] for s in samples]))
+        mask = torch.from_numpy(np.stack([s["mask"] for s in samples]))
+    else:
+        # make_samples 只有 version 2 的編碼，其他版本以隨機輸入量測
+        obs, mask = example_inputs(brain.version, rows)
+
+    with torch.no_grad():
+        reference = variants["fp32"](obs[:args.check], mask[:args.check]).argmax(-1)
+        for name, decide in variants.items():
+            same = (decide(obs[:args.check], mask[:args.check]).argmax(-1) == reference).float().mean().item()
+            print(f"{name:<12s} argmax 與 fp32 一致 {same:.2%}")
+
+    for batch in args.batch:
+        base = None
+        for name, decide in variants.items():
+            ms = latency_ms(decide, obs[:batch], mask[:batch], args.repeat)
+            base = base or ms
+            print(f"批次 {batch:<4d} {name:<12s}: {ms:8.2f} ms/批  {ms / batch:7.3f} ms/筆  (x{base / ms:.2f})")
+
+
+if __name__ == "__main__":
+    main()
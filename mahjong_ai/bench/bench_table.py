@@ -0,0 +1,104 @@
+# bench_table.py - 量測牌桌規則引擎每一步的耗時與每張 Table 的記憶體用量（不呼叫 AI 與 mahjong-helper）
+
+import argparse
+import contextlib
+import io
+import random
+import time
+import tracemalloc
+
+from mahjong_ai.table.table import Table
+from mahjong_ai.table.wall import Wall, WallPool
+from mahjong_ai.table import Mingpai
+from mahjong_ai.table.Hepai import can_tsumo, can_ron_13
+
+
+def play_rules_only(table: Table, rng: random.Random) -> int:
+    """
+    只跑規則判定的一局：摸牌 → 自摸判定 → 隨機打牌 → 其他三家的榮和／碰／槓／吃判定。
+    回傳走了幾步。
+    """
+    steps = 0
+    turn = table.current_turn
+    while not table.wall.is_empty():
+        player = table.players[turn]
+        tile = player.draw_tile_from_wall(table.wall)
+        can_tsumo(player, tile)
+        discard = rng.choice(player.hand.tiles)
+        player.discard_tile_from_hand(discard)
+        for offset in range(1, 4):
+            other = table.players[(turn + offset) % 4]
+            can_ron_13(table, other, discard)
+            Mingpai.can_pon(other, discard)
+            Mingpai.can_daiminkan(other, discard)
+        Mingpai.can_chi_sets(table.players[(turn + 1) % 4], discard)
+        turn = (turn + 1) % 4
+        steps += 1
+    return steps
+
+
+def measure_steps(num_rounds: int, seed: int) -> float:
+    rng = random.Random(seed)
+    random.seed(seed)
+    total_steps = 0
+    elapsed = 0.0
+    for _ in range(num_rounds):
+        table = Table()
+        table.round.start_round(table)
+        start = time.perf_counter()
+        total_steps += play_rules_only(table, rng)
+        elapsed += time.perf_counter() - start
+    return elapsed / total_steps * 1e6
+
+
+def measure_walls(num_walls: int, seed: int) -> tuple[float, float]:
+    """
+    建一副牌山並摸完全部可摸的牌，回傳（每局自行洗牌, 從 WallPool 取）各自的每副耗時（us）。
+    """
+    results = []
+    pool = WallPool(seed)
+    for make_wall in (Wall, pool.next_wall):
+        start = time.perf_counter()
+        for _ in range(num_walls):
+            wall = make_wall()
+            while wall.draw_tile() is not None:
+                pass
+        results.append((time.perf_counter() - start) / num_walls * 1e6)
+    return results[0], results[1]
+
+
+def measure_table_memory(num_tables: int) -> float:
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot()
+    tables = [Table() for _ in range(num_tables)]
+    for table in tables:
+        table.round.start_round(table)
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in snapshot.compare_to(base, "filename"))
+    del tables
+    return used / num_tables
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50, help="規則模擬局數")
+    parser.add_argument("--walls", type=int, default=4096, help="量測牌山用的副數")
+    parser.add_argument("--tables", type=int, default=200, help="量測記憶體用的 Table 數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    # Table() 會印出開局資訊，量測時不需要
+    with contextlib.redirect_stdout(io.StringIO()):
+        per_step = measure_steps(args.rounds, args.seed)
+        per_wall, per_pool_wall = measure_walls(args.walls, args.seed)
+        per_table = measure_table_memory(args.tables)
+
+    print(f"每步規則判定耗時 : {per_step:8.1f} us/step")
+    print(f"牌山（每局洗牌）  : {per_wall:8.1f} us/wall")
+    print(f"牌山（WallPool）  : {per_pool_wall:8.1f} us/wall")
+    print(f"每張 Table 記憶體 : {per_table / 1024:8.1f} KB/table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_tables.py - 比較逐桌同步對局與單一行程同時推進多個牌桌（decision.drive_tables）的每秒決策數與推論時間
+
+import argparse
+import collections
+import contextlib
+import os
+import random
+import time
+
+import torch
+
+from mahjong_ai import action
+from mahjong_ai.table.decision import drive_tables, run_to_end
+from mahjong_ai.table.table import Table
+from mahjong_ai.table.wall import WallPool
+from mahjong_ai.utils.helper_interface import HELPER_BACKENDS, set_helper_backend
+
+
+class Timer:
+    """
+    包住 action.answer_decisions，累計推論時間、模型決策數與批次大小。
+    """
+    def __init__(self):
+        self.seconds = 0.0
+        self.batch_sizes = collections.Counter()
+
+    def __call__(self, decisions):
+        start = time.perf_counter()
+        answers = action.answer_decisions(decisions)
+        self.seconds += time.perf_counter() - start
+        self.batch_sizes[sum(d.needs_model for d in decisions)] += 1
+        return answers
+
+    def decisions(self):
+        return sum(size * count for size, count in self.batch_sizes.items())
+
+    def report(self, name, elapsed):
+        decisions = self.decisions()
+        batches = sum(count for size, count in self.batch_sizes.items() if size)
+        print(f"{name:<12s}: {decisions / elapsed:7.1f} 決策/秒，推論 {self.seconds:5.1f}s / 全部 {elapsed:5.1f}s，"
+              f"平均批次 {decisions / batches if batches else 0.0:5.1f}，每次決策推論 {self.seconds / decisions * 1e3:.2f} ms")
+
+
+def run(games: int, tables: int, seed: int) -> None:
+    random.seed(seed)
+    torch.manual_seed(seed)
+    wall_pool = WallPool(seed)
+    timer = Timer()
+    start = time.perf_counter()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        if tables <= 1:
+            for _ in range(games):
+                run_to_end(Table(wall_pool=wall_pool).play(None), lambda d: timer([d])[0])
+        else:
+            for _ in drive_tables(((i, Table(wall_pool=wall_pool).play(None)) for i in range(games)), timer, tables):
+                pass
+    timer.report(f"{tables} 個牌桌", time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=16, help="每種設定的對局數")
+    parser.add_argument("--tables", type=int, nargs="+", default=[1, 4, 16], help="同時推進的牌桌數（可給多個）")
+    parser.add_argument("--helper", choices=HELPER_BACKENDS, default="native", help="非 AI 玩家切牌建議的來源")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    set_helper_backend(args.helper)
+    torch.set_num_threads(1)
+    for tables in args.tables:
+        run(args.games, tables, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,198 @@
-# buffer.py - ReplayBuffer 類別，儲存 obs/action/reward 訓練資料
+# buffer.py - ReplayBuffer 類別，以預先配置的 NumPy 環形緩衝儲存 obs/action/reward 訓練資料
 
 import json
+import numbers
 import os
-import random
+
+import numpy as np
+
+from mahjong_ai.table.encode_obs import (
+    OBS_SHAPE_V2, ACTION_DIM, SCALAR_ROWS, FLAG_BYTES, compress_obs, expand_obs,
+)
+
+# 陣列一開始配置的筆數，之後倍增直到 capacity
+INITIAL_SIZE = 4096
+
+# 緊湊格式的欄位（ReplayBuffer 與資料分片共用）；hand/flags/scalars 的意義見 encode_obs.compress_obs
+FIELDS = ("hand", "flags", "scalars", "mask", "action", "reward")
+
+
+def decode_arrays(arrays: dict, action_dim=ACTION_DIM):
+    """
+    把一批緊湊格式（key 同 FIELDS）還原成模型輸入：obs float32、mask bool、action int64、reward float32。
+    """
+    obs = expand_obs(arrays["hand"], arrays["flags"], arrays["scalars"])
+    mask = np.unpackbits(arrays["mask"], axis=1, count=action_dim).astype(bool)
+    return obs, mask, arrays["action"].astype(np.int64), np.asarray(arrays["reward"], dtype=np.float32)
+
 
 class ReplayBuffer:
-    def __init__(self, capacity):
+    def __init__(self, capacity, obs_shape=OBS_SHAPE_V2, action_dim=ACTION_DIM, defer_rewards=False):
+        """
+        環形緩衝：每個欄位各自一個型別化陣列，push 為 O(1)，滿了就覆蓋最舊的一筆。
+        - obs: 以 encode_obs.compress_obs 拆成 hand（uint8 張數）、flags（0/1 列的位元）、scalars（float32 連續值）
+        - mask: 以 np.packbits 壓成位元
+        - action: int16，reward: float32
+        - defer_rewards: ai_decide_action 不當場呼叫 helper 算 reward，而是 push 一個 RewardQuery（reward.py），
+          該筆 reward 先存 NaN，查詢另外保存，save_shards 後由 label_rewards.py 批次標註
+        """
         self.capacity = capacity
-        self.buffer = []
+        self.defer_rewards = defer_rewards
+        self.queries = {}   # 位置 → RewardQuery
+        self.obs_shape = tuple(obs_shape)
+        self.action_dim = action_dim
+        self.size = 0   # 目前筆數
+        self.pos = 0    # 下一筆要寫入的位置
+        self._allocate(min(capacity, INITIAL_SIZE))
+
+    def _allocate(self, n):
+        packed_mask = (self.action_dim + 7) // 8
+        new = {
+            "hand": np.zeros((n, self.obs_shape[1]), dtype=np.uint8),
+            "flags": np.zeros((n, FLAG_BYTES), dtype=np.uint8),
+            "scalars": np.zeros((n, len(SCALAR_ROWS)), dtype=np.float32),
+            "mask": np.zeros((n, packed_mask), dtype=np.uint8),
+            "action": np.zeros(n, dtype=np.int16),
+            "reward": np.zeros(n, dtype=np.float32),
+        }
+        if self.size:
+            for key, arr in new.items():
+                arr[:self.size] = getattr(self, key)[:self.size]
+        for key, arr in new.items():
+            setattr(self, key, arr)
+
+    def __len__(self):
+        return self.size
 
     def push(self, data):
-        if len(self.buffer) >= self.capacity:
-            self.buffer.pop(0)
-        self.buffer.append(data)
+        """
+        新增一筆 {"obs", "mask", "action", "reward"}；obs/mask 可為 ndarray 或 list。
+        """
+        if self.pos >= len(self.action):
+            # 尚未到 capacity 前才會擴充；到 capacity 後 pos 會繞回 0
+            self._allocate(min(self.capacity, len(self.action) * 2))
+        i = self.pos
+        self.hand[i], self.flags[i], self.scalars[i] = compress_obs(data["obs"])
+        self.mask[i] = np.packbits(np.asarray(data["mask"], dtype=bool))
+        self.action[i] = data["action"]
+        reward = data["reward"]
+        self.queries.pop(i, None)
+        if isinstance(reward, numbers.Real):
+            self.reward[i] = reward
+        else:
+            self.reward[i] = np.nan
+            self.queries[i] = reward
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_arrays(self, arrays: dict) -> None:
+        """
+        整批加入已是緊湊格式的資料（key 同 FIELDS，例如另一個 ReplayBuffer.compact_arrays() 的結果）。
+        """
+        n = len(arrays["action"])
+        while len(self.action) < min(self.capacity, self.pos + n):
+            self._allocate(min(self.capacity, len(self.action) * 2))
+        indices = (self.pos + np.arange(n)) % self.capacity
+        for key in FIELDS:
+            getattr(self, key)[indices] = arrays[key]
+        for i in indices.tolist():
+            self.queries.pop(i, None)
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def _ordered_indices(self):
+        # 由舊到新的索引
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.size) + self.pos) % self.capacity
+
+    def get_arrays(self, indices):
+        """
+        取出指定索引的 NumPy 陣列（obs 還原成 float32）：obs, mask, action, reward。
+        """
+        return decode_arrays(self.compact_arrays(indices), action_dim=self.action_dim)
 
     def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
+        """
+        隨機抽 batch_size 筆（不重複），直接回傳可餵給模型的 tensor：
+        obs [B, C, 34] float、mask [B, A] bool、action [B] long、reward [B] float。
+        """
+        import torch
+
+        indices = np.random.choice(self.size, batch_size, replace=False)
+        obs, mask, action, reward = self.get_arrays(indices)
+        return (
+            torch.from_numpy(obs),
+            torch.from_numpy(mask),
+            torch.from_numpy(action),
+            torch.from_numpy(reward),
+        )
+
+    def rewards(self):
+        """
+        由舊到新的 reward 陣列。
+        """
+        return self.reward[self._ordered_indices()]
+
+    def memory_per_sample(self):
+        """
+        每筆資料實際佔用的位元組數。
+        """
+        return sum(getattr(self, key)[0:1].nbytes for key in FIELDS)
+
+    def nbytes(self):
+        """
+        目前已配置的陣列總位元組數。
+        """
+        return sum(getattr(self, key).nbytes for key in FIELDS)
+
+    def compact_arrays(self, indices=None):
+        """
+        取出緊湊格式的欄位（預設由舊到新全部），key 與 FIELDS 相同。
+        """
+        if indices is None:
+            indices = self._ordered_indices()
+        return {key: getattr(self, key)[indices] for key in FIELDS}
+
+    def save_shards(self, out_dir: str, meta: dict = None, **writer_kwargs):
+        """
+        以二進位分片格式（見 shards.py）寫出全部資料，回傳 manifest 路徑。
+        """
+        from mahjong_ai.shards import ShardWriter
+
+        writer = ShardWriter(out_dir, obs_shape=self.obs_shape, action_dim=self.action_dim, **writer_kwargs)
+        order = self._ordered_indices()
+        for start in range(0, len(order), writer.shard_size):
+            writer.add_arrays(**self.compact_arrays(order[start:start + writer.shard_size]))
+        return writer.close(meta, reward_queries=self.reward_queries())
+
+    def reward_queries(self) -> dict:
+        """
+        延後標註的 reward 查詢：{由舊到新的列號: RewardQuery.to_list()}。
+        """
+        return {row: self.queries[i].to_list() for row, i in enumerate(self._ordered_indices().tolist()) if i in self.queries}
 
     def save_to_json(self, filename: str):
         os.makedirs(os.path.dirname(filename), exist_ok=True)
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.buffer, f, ensure_ascii=False, indent=2)
+            json.dump(self.to_records(), f, ensure_ascii=False, indent=2)
+
+    def to_records(self):
+        """
+        轉回舊版的 list[dict] 格式（由舊到新）。
+        """
+        records = []
+        for i in self._ordered_indices():
+            obs, mask, action, reward = self.get_arrays([i])
+            records.append({
+                "obs": obs[0].tolist(),
+                "mask": mask[0].tolist(),
+                "action": int(action[0]),
+                "reward": float(reward[0]),
+            })
+        return records
 
     def clear(self):
-        self.buffer = []
\ No newline at end of file
+        self.size = 0
+        self.pos = 0
+        self.queries.clear()
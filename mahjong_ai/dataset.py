@@ -0,0 +1,161 @@
+# dataset.py - 讀取分片資料集的 torch Dataset：逐筆（map-style）與串流批次（iterable）兩種
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+from mahjong_ai.buffer import FIELDS, decode_arrays
+from mahjong_ai.shards import ShardReader, expand_dataset_paths
+from mahjong_ai.table.encode_obs import OBS_SHAPE_V2, ROW_HAND, FLAG_ROWS, SCALAR_ROWS
+
+_BIT_SHIFTS = torch.arange(7, -1, -1, dtype=torch.uint8)
+
+
+# 分片資料集：以 memory-map 讀取，不會整份載入記憶體
+class ShardedMahjongDataset(Dataset):
+    def __init__(self, dataset_dir):
+        self.reader = ShardReader(dataset_dir)
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, idx):
+        obs, mask, action, reward = self.reader.get_item(idx)
+        return torch.from_numpy(obs), torch.from_numpy(mask), torch.tensor(action), torch.tensor(reward)
+
+
+def expand_obs_tensor(hand: torch.Tensor, flags: torch.Tensor, scalars: torch.Tensor) -> torch.Tensor:
+    """
+    encode_obs.expand_obs 的 torch 版：在 hand 所在的裝置上把緊湊格式展開成 [B, C, 34] float，
+    搬到 GPU 的只有緊湊格式（每筆約 0.5 KB）。
+    """
+    batch = hand.shape[0]
+    device = hand.device
+    bits = (flags.unsqueeze(-1) >> _BIT_SHIFTS.to(device)) & 1
+    bits = bits.reshape(batch, -1)[:, :len(FLAG_ROWS) * OBS_SHAPE_V2[1]].reshape(batch, len(FLAG_ROWS), OBS_SHAPE_V2[1])
+    obs = torch.zeros((batch, *OBS_SHAPE_V2), dtype=torch.float32, device=device)
+    obs[:, ROW_HAND] = hand.float()
+    obs[:, FLAG_ROWS] = bits.float()
+    obs[:, SCALAR_ROWS, 0] = scalars
+    return obs
+
+
+def to_model_inputs(batch, device):
+    """
+    把 DataLoader 的一批搬到 device 並回傳 (obs, mask, action, reward)；
+    緊湊批次（hand, flags, scalars, mask, action, reward）在 device 上才展開。
+    """
+    batch = [t.to(device, non_blocking=True) for t in batch]
+    if len(batch) == len(FIELDS):
+        return (expand_obs_tensor(*batch[:3]), *batch[3:])
+    return tuple(batch)
+
+
+class ShardStreamDataset(IterableDataset):
+    def __init__(self, paths, batch_size: int = 256, block_size: int = 1024, shuffle_blocks: int = 8,
+                 shuffle: bool = True, drop_last: bool = False, seed: int = 0, compact: bool = False,
+                 rank: int = 0, world_size: int = 1):
+        """
+        串流讀取任意多個分片資料集，直接產生整批 tensor（DataLoader 請用 batch_size=None）。
+        - 洗牌分兩層：所有 (資料集, 分片, 區塊) 以每個 epoch 不同的種子打亂，
+          再把 shuffle_blocks 個區塊併在一起打亂後切成批次；區塊內是連續讀取，對 memory-map 友善
+        - 分散式訓練時各 rank（world_size 個行程，種子相同）輪流分配區塊；
+          num_workers > 0 時，再由 rank 內各 worker 輪流分配，不會重複
+        - compact: True 時產生緊湊批次（hand, flags, scalars, mask, action, reward），
+          交給 to_model_inputs 在模型的裝置上展開
+        """
+        self.paths = expand_dataset_paths(paths)
+        if not self.paths:
+            raise FileNotFoundError(f"找不到分片資料集：{paths}")
+        self.readers = [ShardReader(p) for p in self.paths]
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.shuffle_blocks = shuffle_blocks
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.compact = compact
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+        self.blocks = [
+            (r, s, start, min(start + block_size, size))
+            for r, reader in enumerate(self.readers)
+            for s, size in enumerate(reader.shard_sizes)
+            for start in range(0, size, block_size)
+        ]
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        每個 epoch 開始前呼叫，換一組洗牌順序（worker 由主行程複製設定，因此要在建立迭代器前設定）。
+        """
+        self.epoch = epoch
+
+    def num_samples(self) -> int:
+        return sum(len(r) for r in self.readers)
+
+    def __len__(self):
+        # 批次數（drop_last=False 時每個區塊群組最後可能多一個不滿的批次，這裡只是估計值）
+        n = self.num_samples()
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def epoch_batches(self, num_workers: int = 0) -> int:
+        """
+        本 rank 在目前 epoch 會產生的批次數（與 __iter__ 相同的區塊分配；每個 worker 各自有最後一個不滿的批次）。
+        分散式訓練以此對齊各 rank 的步數。
+        """
+        total = 0
+        for worker in [(w, num_workers) for w in range(num_workers)] or [None]:
+            blocks = self._my_blocks(np.random.default_rng([self.seed, self.epoch]), worker)
+            n = sum(end - start for _, _, start, end in blocks)
+            total += n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+        return total
+
+    def _my_blocks(self, rng, worker=None) -> list:
+        """
+        worker 為 (worker id, worker 數)；None 則依目前所在的 DataLoader worker。
+        """
+        order = rng.permutation(len(self.blocks)) if self.shuffle else np.arange(len(self.blocks))
+        order = order[self.rank::self.world_size]
+        if worker is None:
+            info = get_worker_info()
+            worker = (info.id, info.num_workers) if info is not None else None
+        if worker is not None:
+            order = order[worker[0]::worker[1]]
+        return [self.blocks[i] for i in order]
+
+    def _read_group(self, group):
+        """
+        讀出一組區塊的緊湊欄位並串接（每個區塊一次 slice，沒有逐筆迴圈）。
+        """
+        parts = [self.readers[r].read(s, slice(start, end)) for r, s, start, end in group]
+        return {key: np.concatenate([p[key] for p in parts]) for key in FIELDS}
+
+    def __iter__(self):
+        rng = np.random.default_rng([self.seed, self.epoch])
+        blocks = self._my_blocks(rng)
+        leftover = None
+        for g in range(0, len(blocks), self.shuffle_blocks):
+            arrays = self._read_group(blocks[g:g + self.shuffle_blocks])
+            if leftover is not None:
+                arrays = {key: np.concatenate([leftover[key], arrays[key]]) for key in arrays}
+                leftover = None
+            n = len(arrays["action"])
+            perm = rng.permutation(n) if self.shuffle else np.arange(n)
+            full = n - n % self.batch_size
+            for start in range(0, full, self.batch_size):
+                yield self._to_tensors(arrays, perm[start:start + self.batch_size])
+            if full < n:
+                # 不滿一批的留到下一組再用
+                leftover = {key: arr[perm[full:]] for key, arr in arrays.items()}
+        if leftover is not None and not self.drop_last:
+            yield self._to_tensors(leftover, np.arange(len(leftover["action"])))
+
+    def _to_tensors(self, arrays, idx):
+        batch = {key: arr[idx] for key, arr in arrays.items()}
+        if self.compact:
+            batch["mask"] = np.unpackbits(batch["mask"], axis=1, count=self.readers[0].action_dim).astype(bool)
+            batch["action"] = batch["action"].astype(np.int64)
+            return tuple(torch.from_numpy(batch[key]) for key in FIELDS)
+        obs, mask, action, reward = decode_arrays(batch, action_dim=self.readers[0].action_dim)
+        return torch.from_numpy(obs), torch.from_numpy(mask), torch.from_numpy(action), torch.from_numpy(reward)
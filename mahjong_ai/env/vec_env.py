@@ -0,0 +1,117 @@
+# vec_env.py - N 個牌桌的向量化環境：reset()/step(actions) 回傳堆疊好的 obs/mask，對局結束自動開下一場
+
+import contextlib
+import numbers
+import os
+
+import numpy as np
+
+from mahjong_ai.table.decision import resume
+from mahjong_ai.table.encode_obs import OBS_SHAPE_V2, ACTION_DIM
+from mahjong_ai.table.table import Table
+from mahjong_ai.table.wall import WallPool
+
+
+class VecMahjongEnv:
+    def __init__(self, num_tables: int, seed=None, buffer=None, verbose: bool = False):
+        """
+        每個牌桌是一場 Table.play() 對局，停在 AI 玩家下一個需要模型決定的地方（出牌、吃碰槓）；
+        依規則決定的地方（立直、和牌、九種九牌…）直接以 Decision.default 回答。
+        - obs [N, 942, 34] float32、mask [N, 46] bool、reward [N] float32、done [N] bool 只配置一次，
+          reset()/step() 每次都寫進同一批陣列並回傳它們（需要保留請自行 copy）
+        - step 時某桌的對局結束：done 為 True，final_points / final_rank 記下該場結果，
+          obs/mask 已是下一場第一個決策
+        - buffer: 交給 Table.play，每一步照常寫進 ReplayBuffer（None 則不記錄）；
+          buffer.defer_rewards 時 reward 待標註，該步的 reward 為 NaN
+        - verbose: 是否輸出牌局紀錄
+        """
+        self.num_tables = num_tables
+        self.wall_pool = WallPool(seed)
+        self.buffer = buffer
+        self.obs = np.zeros((num_tables, *OBS_SHAPE_V2), dtype=np.float32)
+        self.mask = np.zeros((num_tables, ACTION_DIM), dtype=bool)
+        self.reward = np.zeros(num_tables, dtype=np.float32)
+        self.done = np.zeros(num_tables, dtype=bool)
+        self.final_points = np.zeros((num_tables, 4), dtype=np.int32)   # 各桌最近一場結束時的分數
+        self.final_rank = np.zeros(num_tables, dtype=np.int8)           # 各桌最近一場 AI 的名次（1~4）
+        self.tables: list[Table] = [None] * num_tables
+        self._games = [None] * num_tables
+        self._decisions = [None] * num_tables
+        self.steps = 0        # 累計 step 的決策數（所有牌桌）
+        self.games_done = 0   # 累計完成的對局數
+        self._log = None if verbose else open(os.devnull, 'w', encoding='utf-8')
+
+    def _quiet(self):
+        return contextlib.redirect_stdout(self._log) if self._log is not None else contextlib.nullcontext()
+
+    def _next_model_decision(self, game, decision):
+        # 依規則的決策直接回答，推進到下一個需要模型的決策（對局結束則為 None）
+        while decision is not None and not decision.needs_model:
+            decision = resume(game, decision.default)
+        return decision
+
+    def _start(self, i: int) -> None:
+        decision = None
+        while decision is None:   # 整場都沒有 AI 決策的對局直接略過
+            table = Table(wall_pool=self.wall_pool)
+            game = table.play(self.buffer)
+            decision = self._next_model_decision(game, resume(game))
+        self.tables[i] = table
+        self._games[i] = game
+        self._set(i, decision)
+
+    def _set(self, i: int, decision) -> None:
+        self._decisions[i] = decision
+        decision.encode_into(self.obs[i], self.mask[i])
+
+    def _finish(self, i: int) -> None:
+        players = self.tables[i].players
+        self.final_points[i] = [p.points for p in players]
+        ai = next(p for p in players if p.is_ai)
+        self.final_rank[i] = 1 + sum(p.points > ai.points for p in players)
+        self.games_done += 1
+
+    def reset(self):
+        """
+        每個牌桌開一場新對局，回傳 (obs, mask)。
+        """
+        with self._quiet():
+            for i in range(self.num_tables):
+                self._start(i)
+        self.reward[:] = 0.0
+        self.done[:] = False
+        return self.obs, self.mask
+
+    def step(self, actions):
+        """
+        actions [N]（每桌一個 action 編號，需符合 mask），回傳 (obs, mask, reward, done)。
+        """
+        with self._quiet():
+            for i, action in enumerate(actions):
+                action = int(action)
+                if not self.mask[i, action]:
+                    raise ValueError(f"牌桌 {i} 的 action {action} 不合法")
+                decision = self._decisions[i]
+                game = self._games[i]
+                following = self._next_model_decision(game, resume(game, action))
+                reward = decision.reward
+                self.reward[i] = reward if isinstance(reward, numbers.Real) else np.nan
+                self.done[i] = following is None
+                if following is None:
+                    self._finish(i)
+                    self._start(i)
+                else:
+                    self._set(i, following)
+        self.steps += len(actions)
+        return self.obs, self.mask, self.reward, self.done
+
+    def decisions(self) -> list:
+        """
+        各桌目前等待回答的 Decision（可取得 kind、tile、table 等資訊）。
+        """
+        return list(self._decisions)
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -0,0 +1,118 @@
+# export_policy.py - 把 fp32 模型匯出成推論用的模型檔（action.py 的 int8 / torchscript / onnx 推論模型來源），匯出前先在保留資料上檢查 argmax 與 fp32 一致
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import torch
+
+from mahjong_ai import action
+from mahjong_ai.shards import ShardReader, expand_dataset_paths
+from mahjong_ai.utils.helper_interface import HELPER_BACKENDS, set_helper_backend
+
+DEFAULT_SAMPLES = 1024
+DEFAULT_MIN_AGREEMENT = 0.99
+EXPORT_FORMATS = ("int8", "torchscript", "onnx")
+
+
+def held_out_set(paths, samples: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    檢查用的 (obs, mask)。paths 為沒拿來訓練的分片資料集；沒給則以 VecMahjongEnv 隨機合法動作對局收集。
+    """
+    obs, mask = [], []
+    count = 0
+    for path in expand_dataset_paths(paths or []):
+        reader = ShardReader(path)
+        for shard_id in range(reader.num_shards):
+            rows = min(samples - count, reader.shard_sizes[shard_id])
+            o, m, _, _ = reader.get_shard_arrays(shard_id, slice(0, rows))
+            obs.append(o)
+            mask.append(m)
+            count += rows
+            if count >= samples:
+                return np.concatenate(obs), np.concatenate(mask)
+    if count:
+        return np.concatenate(obs), np.concatenate(mask)
+
+    from mahjong_ai.env.vec_env import VecMahjongEnv
+    rng = np.random.default_rng(seed)
+    env = VecMahjongEnv(8, seed=seed)
+    o, m = env.reset()
+    while count < samples:
+        obs.append(o.copy())
+        mask.append(m.copy())
+        count += len(o)
+        scores = rng.random(m.shape)
+        scores[~m] = -1.0
+        o, m, _, _ = env.step(scores.argmax(axis=1))
+    env.close()
+    return np.concatenate(obs)[:samples], np.concatenate(mask)[:samples]
+
+
+def policy_actions(brain, dqn, obs: np.ndarray, mask: np.ndarray, batch_size: int = 256) -> np.ndarray:
+    actions = []
+    with torch.no_grad():
+        for start in range(0, len(obs), batch_size):
+            q = dqn(brain(torch.from_numpy(obs[start:start + batch_size])), torch.from_numpy(mask[start:start + batch_size]))
+            actions.append(q.argmax(dim=-1).numpy())
+    return np.concatenate(actions)
+
+
+def graph_actions(policy, obs: np.ndarray, mask: np.ndarray, batch_size: int = 256) -> np.ndarray:
+    return np.concatenate([policy.decide(obs[start:start + batch_size], mask[start:start + batch_size])
+                           for start in range(0, len(obs), batch_size)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匯出推論模型：int8（BatchNorm 併進卷積、Linear 動態量化）或 torchscript / onnx（Brain + DQN 單一計算圖）")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="int8", help="輸出格式")
+    parser.add_argument("--out", type=str, default=None, help="輸出檔案（預設為 action.py 該來源讀取的路徑）")
+    parser.add_argument("--data", type=str, nargs="*", default=None, help="檢查用的保留分片資料集（沒給則以隨機對局收集）")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="檢查的筆數")
+    parser.add_argument("--min_agreement", type=float, default=DEFAULT_MIN_AGREEMENT, help="argmax 一致率低於此值就不輸出")
+    parser.add_argument("--helper", choices=HELPER_BACKENDS, default="native", help="收集檢查資料時非 AI 玩家切牌建議的來源")
+    args = parser.parse_args()
+
+    out = args.out or (action.INT8_POLICY_PATH if args.format == "int8" else action.GRAPH_POLICY_PATHS[args.format])
+    set_helper_backend(args.helper)
+    brain, dqn, _ = action.load_fp32_policy(torch.device("cpu"))
+    obs, mask = held_out_set(args.data, args.samples)
+    reference = policy_actions(brain, dqn, obs, mask)
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    if args.format == "int8":
+        from mahjong_ai.model.quantize import quantize_policy, save_int8_policy
+
+        q_brain, q_dqn = quantize_policy(brain, dqn)
+        same = reference == policy_actions(q_brain, q_dqn, obs, mask)
+    else:
+        # 計算圖先寫到暫存檔，載入回來檢查通過才換成正式檔名
+        from mahjong_ai.model.export import export_torchscript, export_onnx, TorchScriptPolicy, OnnxPolicy
+
+        tmp = f"{out}.tmp"
+        if args.format == "torchscript":
+            export_torchscript(brain, dqn, tmp, meta={"config": action.POLICY_CONFIG})
+            same = reference == graph_actions(TorchScriptPolicy(tmp), obs, mask)
+        else:
+            export_onnx(brain, dqn, tmp)
+            same = reference == graph_actions(OnnxPolicy(tmp), obs, mask)
+
+    agreement = float(same.mean())
+    print(f"argmax 與 fp32 一致：{int(same.sum())}/{len(same)}（{agreement:.2%}）")
+    if agreement < args.min_agreement:
+        print(f"[!] 一致率低於 {args.min_agreement:.2%}，不輸出")
+        if args.format != "int8":
+            os.remove(tmp)
+        sys.exit(1)
+
+    if args.format == "int8":
+        save_int8_policy(out, q_brain, q_dqn, config=action.POLICY_CONFIG,
+                         meta={"agreement": agreement, "held_out": len(same), "data": args.data or "selfplay"})
+    else:
+        os.replace(tmp, out)
+    print(f"✓ {args.format} 模型已儲存於 {out}（MAHJONG_POLICY_BACKEND={args.format} 或 --policy {args.format} 使用）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# inference.py - 跨牌桌的批次推論服務：收集多個牌桌（執行緒或行程）的 obs，湊成一批跑一次 Brain + DQN
+
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from mahjong_ai.table.encode_obs import compress_obs, expand_obs
+
+# 設定：
+#   max_batch       一批最多幾個請求
+#   max_latency_ms  第一個請求進來後最多等多久就送出（不論湊到幾個）
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_LATENCY_MS = 2.0
+# 統計保留最近幾筆排隊時間
+LATENCY_WINDOW = 100000
+
+
+class InferenceServer:
+    def __init__(self, brain=None, dqn=None, device=None, max_batch: int = DEFAULT_MAX_BATCH, max_latency_ms: float = DEFAULT_MAX_LATENCY_MS,
+                 decide=None):
+        """
+        批次推論服務。submit() 立即回傳 Future（結果為 action），decide() 為同步版本。
+        背景執行緒取到第一個請求後，最多再等 max_latency_ms 或湊滿 max_batch 個，就一起做一次前向運算。
+        brain / dqn 需已是 eval 模式（BatchNorm 用統計值，結果與批次大小無關）；
+        也可改給 decide(obs, mask) -> list[int]（如 action.policy_decide），以其他推論來源計算整批。
+        """
+        self.brain = brain
+        self.dqn = dqn
+        self._decide = decide
+        self.device = device or (next(brain.parameters()).device if brain is not None else None)
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1e3
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self.batch_sizes = collections.Counter()
+        self.queue_latency = collections.deque(maxlen=LATENCY_WINDOW)   # 秒：submit 到開始運算
+        self.forward_seconds = 0.0
+        self._thread = threading.Thread(target=self._loop, name="inference-server", daemon=True)
+        self._thread.start()
+
+    def submit(self, obs, mask) -> Future:
+        future = Future()
+        self._queue.put((np.asarray(obs, dtype=np.float32), np.asarray(mask, dtype=bool), future, time.perf_counter()))
+        return future
+
+    def decide(self, obs, mask) -> int:
+        return self.submit(obs, mask).result()
+
+    def _collect(self) -> list:
+        # 等第一個請求，之後在期限內盡量多收
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._closed = True
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self) -> None:
+        while not self._closed:
+            batch = self._collect()
+            if not batch:
+                break
+            start = time.perf_counter()
+            try:
+                actions = self._forward(np.stack([b[0] for b in batch]), np.stack([b[1] for b in batch]))
+            except Exception as e:
+                for item in batch:
+                    item[2].set_exception(e)
+                continue
+            with self._lock:
+                self.forward_seconds += time.perf_counter() - start
+                self.batch_sizes[len(batch)] += 1
+                self.queue_latency.extend(start - item[3] for item in batch)
+            for item, action in zip(batch, actions):
+                item[2].set_result(int(action))
+
+    def _forward(self, obs: np.ndarray, mask: np.ndarray) -> list[int]:
+        if self._decide is not None:
+            return self._decide(obs, mask)
+        import torch
+        with torch.no_grad():
+            obs_tensor = torch.from_numpy(obs).to(self.device)
+            mask_tensor = torch.from_numpy(mask).to(self.device)
+            q = self.dqn(self.brain(obs_tensor), mask_tensor)
+            return torch.argmax(q, dim=-1).tolist()
+
+    def stats(self) -> dict:
+        """
+        批次大小分布、平均批次、排隊時間（ms，平均 / p50 / p95 / 最大）與平均前向時間。
+        """
+        with self._lock:
+            histogram = dict(sorted(self.batch_sizes.items()))
+            latency = np.array(self.queue_latency) * 1e3
+            batches = sum(histogram.values())
+            forward = self.forward_seconds
+        requests = sum(size * count for size, count in histogram.items())
+        result = {
+            "requests": requests,
+            "batches": batches,
+            "mean_batch": requests / batches if batches else 0.0,
+            "batch_histogram": histogram,
+            "forward_ms": forward / batches * 1e3 if batches else 0.0,
+        }
+        if len(latency):
+            result.update(
+                queue_ms_mean=float(latency.mean()),
+                queue_ms_p50=float(np.percentile(latency, 50)),
+                queue_ms_p95=float(np.percentile(latency, 95)),
+                queue_ms_max=float(latency.max()),
+            )
+        return result
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    # === 給其他行程用 ===
+    def serve_queues(self, requests, responses: list) -> threading.Thread:
+        """
+        以 multiprocessing 佇列服務其他行程：requests 收 (client_id, obs_parts, mask)，
+        obs_parts 是 compress_obs 的結果（一筆約 0.5 KB，不傳整個 float obs），
+        結果 action 放進 responses[client_id]。requests 收到 None 時停止。
+        """
+        def forward_request(client_id, future):
+            responses[client_id].put(future.result())
+
+        def loop():
+            while True:
+                item = requests.get()
+                if item is None:
+                    break
+                client_id, (hand, flags, scalars), mask = item
+                future = self.submit(expand_obs(hand, flags, scalars), mask)
+                future.add_done_callback(lambda f, c=client_id: forward_request(c, f))
+
+        thread = threading.Thread(target=loop, name="inference-queues", daemon=True)
+        thread.start()
+        return thread
+
+
+class InferenceClient:
+    def __init__(self, requests, response, client_id: int):
+        """
+        其他行程中的用戶端，decide() 與 InferenceServer.decide() 相同；每個用戶端一次只有一個請求在等。
+        """
+        self.requests = requests
+        self.response = response
+        self.client_id = client_id
+
+    def decide(self, obs, mask) -> int:
+        self.requests.put((self.client_id, compress_obs(obs), np.asarray(mask, dtype=bool)))
+        return self.response.get()
+
+
+def format_stats(stats: dict) -> str:
+    histogram = " ".join(f"{size}:{count}" for size, count in stats["batch_histogram"].items())
+    text = (f"推論 {stats['requests']} 次／{stats['batches']} 批，平均批次 {stats['mean_batch']:.1f}，"
+            f"前向 {stats['forward_ms']:.2f} ms/批")
+    if "queue_ms_mean" in stats:
+        text += (f"，排隊 平均 {stats['queue_ms_mean']:.2f} / p50 {stats['queue_ms_p50']:.2f} / "
+                 f"p95 {stats['queue_ms_p95']:.2f} / 最大 {stats['queue_ms_max']:.2f} ms")
+    return f"{text}\n  批次大小分布 {histogram}"
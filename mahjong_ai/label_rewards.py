@@ -0,0 +1,76 @@
+# label_rewards.py - 對局後批次標註 reward：讀取分片資料集中延後的 reward 查詢，去重後分給多個行程呼叫 helper，再寫回分片
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from mahjong_ai.reward import RewardQuery
+from mahjong_ai.shards import ShardReader, expand_dataset_paths, update_rewards
+from mahjong_ai.utils.helper_interface import HELPER_BACKENDS, run_helper, set_helper_backend
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+
+def _init_worker(backend: str | None) -> None:
+    # 子行程各自建立 helper 工作池與快取（SQLite 快取檔為所有行程共用）
+    set_helper_backend(backend)
+
+
+def _analyze(key: tuple) -> tuple:
+    input_str, visible = key
+    return key, run_helper(input_str, visible)
+
+
+def analyze_all(inputs: list[tuple], workers: int, backend: str | None = None, chunksize: int = 16) -> dict:
+    """
+    對每個（不重複的）helper 查詢（RewardQuery.key）取得結果；workers > 1 時以行程池平行處理。
+    """
+    if workers <= 1 or len(inputs) <= chunksize:
+        _init_worker(backend)
+        return dict(_analyze(s) for s in inputs)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(backend,)) as pool:
+        return dict(pool.imap_unordered(_analyze, inputs, chunksize=chunksize))
+
+
+def label_dataset(dataset_dir: str, workers: int = DEFAULT_WORKERS, backend: str | None = None) -> dict:
+    """
+    標註一個分片資料集中所有延後的 reward，回傳統計。
+    相同的 helper 查詢（同樣的手牌、副露與場上公開的牌）只分析一次。
+    """
+    reader = ShardReader(dataset_dir)
+    queries = {row: RewardQuery.from_list(q) for row, q in reader.reward_queries().items()}
+    if not queries:
+        return {"queries": 0, "unique": 0, "seconds": 0.0}
+
+    start = time.perf_counter()
+    unique = list(dict.fromkeys(q.key for q in queries.values()))
+    outputs = analyze_all(unique, workers, backend)
+    rewards = {row: q.resolve(outputs[q.key]) for row, q in queries.items()}
+    seconds = time.perf_counter() - start
+
+    stats = {"queries": len(queries), "unique": len(unique), "seconds": round(seconds, 3)}
+    update_rewards(dataset_dir, rewards, meta={"reward_labeling": {**stats, "workers": workers, "backend": backend or "default"}})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="標註 simulate_selfplay --defer_rewards 產生的分片資料集")
+    parser.add_argument("paths", nargs="+", help="分片資料夾（可用萬用字元，或放了多個分片資料集的上層資料夾）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="呼叫 helper 的行程數")
+    parser.add_argument("--helper", choices=HELPER_BACKENDS, default=None, help="reward 依據的 helper 實作（預設依 MAHJONG_HELPER_BACKEND）")
+    args = parser.parse_args()
+
+    for path in expand_dataset_paths(args.paths):
+        pending = ShardReader(path).pending_rewards
+        if not pending:
+            print(f"- {path}：沒有待標註的 reward")
+            continue
+        stats = label_dataset(path, args.workers, args.helper)
+        rate = stats["unique"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(f"✓ {path}：{stats['queries']} 筆 reward（不重複 {stats['unique']}），"
+              f"{stats['seconds']:.1f}s，{rate:.0f} 次分析/秒")
+
+
+if __name__ == "__main__":
+    main()
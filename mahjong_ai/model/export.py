@@ -0,0 +1,112 @@
+# export.py - 把 Brain + DQN（version 2/3/4）追蹤成單一計算圖：TorchScript 或 ONNX，並提供載入後以 NumPy 推論的包裝
+
+import json
+
+import numpy as np
+import torch
+from torch import nn
+
+from mahjong_ai.model.consts import obs_shape, ACTION_SPACE
+from mahjong_ai.model.model import Brain, DQN
+
+GRAPH_VERSIONS = (2, 3, 4)
+ONNX_OPSET = 17
+META_NAME = "meta.json"
+
+
+class PolicyNet(nn.Module):
+    """
+    obs [B, C, 34]、mask [B, A] → q [B, A]（含 mask 的 dueling head），給追蹤／匯出用。
+    追蹤後 Brain / DQN 中依 version 的分支與 partial 建構都已展開，只剩張量運算。
+    """
+    def __init__(self, brain: Brain, dqn: DQN):
+        super().__init__()
+        if brain.version not in GRAPH_VERSIONS or dqn.version != brain.version:
+            raise ValueError(f"只支援 version {GRAPH_VERSIONS} 的 Brain + DQN（目前 {brain.version} / {dqn.version}）")
+        if brain.is_oracle:
+            raise ValueError("oracle Brain 需要額外輸入，不支援匯出")
+        self.brain = brain
+        self.dqn = dqn
+
+    def forward(self, obs, mask):
+        return self.dqn(self.brain(obs), mask)
+
+
+def example_inputs(version: int, batch_size: int = 8) -> tuple[torch.Tensor, torch.Tensor]:
+    obs = torch.rand(batch_size, *obs_shape(version))
+    mask = torch.rand(batch_size, ACTION_SPACE) < 0.3
+    mask[:, 0] = True   # 至少一個合法動作
+    return obs, mask
+
+
+def trace_policy(brain: Brain, dqn: DQN) -> torch.jit.ScriptModule:
+    """
+    追蹤成 TorchScript 並 freeze（權重變常數，BatchNorm 併進卷積）；批次大小可與追蹤時不同。
+    """
+    net = PolicyNet(brain, dqn).eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(net, example_inputs(brain.version))
+    return torch.jit.freeze(traced)
+
+
+def export_torchscript(brain: Brain, dqn: DQN, path: str, meta: dict = None) -> None:
+    meta = {"version": brain.version, **(meta or {})}
+    torch.jit.save(trace_policy(brain, dqn), path, _extra_files={META_NAME: json.dumps(meta)})
+
+
+def export_onnx(brain: Brain, dqn: DQN, path: str) -> None:
+    """
+    匯出 ONNX（批次維度可變）；需要 onnx 套件。
+    """
+    import onnx  # noqa: F401  沒裝時在這裡就丟 ImportError（torch.onnx 本身丟的是 RuntimeError）
+
+    net = PolicyNet(brain, dqn).eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            net, example_inputs(brain.version), path,
+            dynamo=False,
+            opset_version=ONNX_OPSET,
+            input_names=["obs", "mask"],
+            output_names=["q"],
+            dynamic_axes={"obs": {0: "batch"}, "mask": {0: "batch"}, "q": {0: "batch"}},
+        )
+
+
+class TorchScriptPolicy:
+    def __init__(self, path: str, threads: int | None = None):
+        """
+        載入 export_torchscript 的檔案；threads 為 torch 的 intra-op 執行緒數（全行程共用）。
+        """
+        if threads:
+            torch.set_num_threads(threads)
+        extra = {META_NAME: ""}
+        self.module = torch.jit.load(path, map_location="cpu", _extra_files=extra)
+        self.meta = json.loads(extra[META_NAME] or "{}")
+
+    def q_values(self, obs: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        with torch.no_grad():
+            return self.module(torch.from_numpy(obs), torch.from_numpy(mask)).numpy()
+
+    def decide(self, obs: np.ndarray, mask: np.ndarray) -> list[int]:
+        return self.q_values(obs, mask).argmax(axis=-1).tolist()
+
+
+class OnnxPolicy:
+    def __init__(self, path: str, threads: int | None = None):
+        """
+        以 onnxruntime（CPU）載入 export_onnx 的檔案；threads 為這個 session 的 intra-op 執行緒數。
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.meta = {}
+
+    def q_values(self, obs: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return self.session.run(["q"], {"obs": obs, "mask": mask})[0]
+
+    def decide(self, obs: np.ndarray, mask: np.ndarray) -> list[int]:
+        return self.q_values(obs, mask).argmax(axis=-1).tolist()
@@ -0,0 +1,78 @@
+# quantize.py - 推論用的 Brain + DQN：把 BatchNorm1d 併進前一層 Conv1d，Linear 做動態 INT8 量化，並存成單一檔案
+
+import copy
+
+import torch
+from torch import nn
+from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from mahjong_ai.model.model import Brain, DQN
+
+INT8_FORMAT = "mahjong-policy-int8"
+INT8_FORMAT_VERSION = 1
+
+
+def fold_batchnorm(module: nn.Module) -> nn.Module:
+    """
+    把每個 nn.Sequential 中緊接在 Conv1d 後面的 BatchNorm1d 併進該 Conv1d（BatchNorm 換成 Identity），直接修改 module。
+    只在 eval 模式下等價（用的是 running_mean / running_var）；前面不是卷積的 BatchNorm（如 pre-activation 區塊開頭）維持原樣。
+    """
+    for seq in module.modules():
+        if not isinstance(seq, nn.Sequential):
+            continue
+        for i in range(len(seq) - 1):
+            if isinstance(seq[i], nn.Conv1d) and isinstance(seq[i + 1], nn.BatchNorm1d):
+                seq[i] = fuse_conv_bn_eval(seq[i], seq[i + 1])
+                seq[i + 1] = nn.Identity()
+    return module
+
+
+def _projection_name(brain: Brain) -> str:
+    # ResNet 最後一層 Linear(32 * 34, 1024) 的名稱
+    last = len(brain.encoder.net) - 1
+    assert isinstance(brain.encoder.net[last], nn.Linear)
+    return f"encoder.net.{last}"
+
+
+def quantize_policy(brain: Brain, dqn: DQN) -> tuple[Brain, DQN]:
+    """
+    回傳推論用的副本（原模型不變）：BatchNorm 併進卷積，encoder 的 32·34→1024 投影與 DQN 所有 Linear 改為動態 INT8。
+    ChannelAttention 的小 Linear 維持 fp32（量化的額外成本比省下的還多）。
+    """
+    brain = fold_batchnorm(copy.deepcopy(brain).eval())
+    brain = quantize_dynamic(brain, {_projection_name(brain): default_dynamic_qconfig}, dtype=torch.qint8)
+    dqn = quantize_dynamic(copy.deepcopy(dqn).eval(), {nn.Linear}, dtype=torch.qint8)
+    return brain, dqn
+
+
+def save_int8_policy(path: str, q_brain: Brain, q_dqn: DQN, config: dict, meta: dict = None) -> None:
+    """
+    把 quantize_policy 的結果存成推論用的檔案。
+    config 為建立 Brain 的參數（version / conv_channels / num_blocks），meta 為附加資訊（如一致率）。
+    """
+    torch.save({
+        "format": INT8_FORMAT,
+        "format_version": INT8_FORMAT_VERSION,
+        "config": config,
+        "brain": q_brain.state_dict(),
+        "dqn": q_dqn.state_dict(),
+        "meta": meta or {},
+    }, path)
+
+
+def load_int8_policy(path: str, device="cpu") -> tuple[Brain, DQN, dict]:
+    """
+    讀取 save_int8_policy 的檔案，回傳 (brain, dqn, meta)；動態量化只支援 CPU。
+    先以 config 建出同結構的模型（併 BatchNorm、量化），再載入權重。
+    """
+    data = torch.load(path, map_location=device, weights_only=True)
+    if data.get("format") != INT8_FORMAT or data.get("format_version") != INT8_FORMAT_VERSION:
+        raise ValueError(f"{path} 不是 INT8 推論模型檔（format={data.get('format')}）")
+    config = data["config"]
+    brain = Brain(version=config["version"], conv_channels=config["conv_channels"], num_blocks=config["num_blocks"]).eval()
+    dqn = DQN(version=config["version"]).eval()
+    brain, dqn = quantize_policy(brain, dqn)
+    brain.load_state_dict(data["brain"])
+    dqn.load_state_dict(data["dqn"])
+    return brain, dqn, data["meta"]
@@ -0,0 +1,405 @@
+# pipeline.py - 常駐的 actor–learner 訓練流程：self-play actor 持續產生資料到共用的 replay，learner 同時持續訓練，
+# 每 K 步把權重經共享記憶體廣播給 actor；取代 run_all.py「模擬 → 訓練 → 測試」逐段啟動子行程的做法
+
+import argparse
+import contextlib
+import copy
+import datetime
+import json
+import os
+import queue
+import random
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from mahjong_ai import action
+from mahjong_ai.buffer import ReplayBuffer, FIELDS
+from mahjong_ai.dataset import to_model_inputs
+from mahjong_ai.model.model import Brain, DQN
+from mahjong_ai.shards import ShardWriter
+from mahjong_ai.table.table import Table
+from mahjong_ai.table.wall import WallPool
+from mahjong_ai.test_play import OUTPUT_PATH as TEST_RESULT_PATH
+from mahjong_ai.train import AMP_DTYPES, append_json_log, make_optimizer, make_train_step
+from mahjong_ai.utils.helper_interface import HELPER_BACKENDS, helper_backend, set_helper_backend
+
+PIPELINE_LOG_PATH = "mahjong_ai/models/pipeline_log.json"
+PIPELINE_BEST_PATH = "mahjong_ai/models/pipeline_best.json"
+REPLAY_CAPACITY = 200000
+SNAPSHOT_LIMIT = 4   # 最多留幾個廣播版本的權重快照等待評估
+
+
+class VersionedReplay:
+    __slots__ = ("buffer", "policy_steps")
+
+    def __init__(self, capacity: int):
+        """
+        learner 端的 ReplayBuffer，另外記下每筆資料是以第幾步的權重產生的（用來算 staleness）。
+        """
+        self.buffer = ReplayBuffer(capacity=capacity)
+        self.policy_steps = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, arrays: dict, policy_step: int) -> None:
+        n = len(arrays["action"])
+        self.policy_steps[(self.buffer.pos + np.arange(n)) % self.buffer.capacity] = policy_step
+        self.buffer.push_arrays(arrays)
+
+    def sample(self, batch_size: int, rng) -> tuple[tuple, np.ndarray]:
+        """
+        隨機抽 batch_size 筆（可重複），回傳 (緊湊批次 tensor，交給 to_model_inputs 展開；各筆的策略步數)。
+        """
+        indices = rng.integers(0, len(self.buffer), batch_size)
+        arrays = self.buffer.compact_arrays(indices)
+        arrays["mask"] = np.unpackbits(arrays["mask"], axis=1, count=self.buffer.action_dim).astype(bool)
+        arrays["action"] = arrays["action"].astype(np.int64)
+        return tuple(torch.from_numpy(arrays[key]) for key in FIELDS), self.policy_steps[indices]
+
+
+# ====== 權重廣播：learner 寫入共享記憶體中的一份模型，actor 看到版本變了才複製 ======
+def publish_weights(modules, shared, lock, version, step: int) -> None:
+    with lock:
+        for src, dst in zip(modules, shared):
+            dst.load_state_dict(src.state_dict())
+        version.value = step
+
+def pull_weights(modules, shared, lock, version) -> int:
+    with lock:
+        for dst, src in zip(modules, shared):
+            dst.load_state_dict(src.state_dict())
+        return version.value
+
+
+def play_game(seed: int) -> dict:
+    """
+    以目前的推論模型跑一場 self-play，回傳緊湊格式資料與 AI 玩家的終局點數、名次（取代另跑 test_play 評估）。
+    """
+    random.seed(seed)
+    torch.manual_seed(seed)
+    buffer = ReplayBuffer(capacity=100000)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        table = Table(wall_pool=WallPool(seed, batch_size=64))
+        table.run_game_loop(buffer)
+    ai_player = next(p for p in table.players if p.is_ai)
+    rank = sorted(table.players, key=lambda p: p.points, reverse=True).index(ai_player) + 1
+    return {"arrays": buffer.compact_arrays(), "points": ai_player.points, "rank": rank}
+
+
+def _actor(actor_id, seed, helper, shared, lock, version, games, stop):
+    set_helper_backend(helper)
+    # 每個 actor 只用一個執行緒推論，其餘核心留給 learner
+    torch.set_num_threads(1)
+    models = [copy.deepcopy(m) for m in shared]
+    policy_step = pull_weights(models, shared, lock, version)
+    action.set_policy(*models, device=torch.device("cpu"))
+    n = 0
+    while not stop.is_set():
+        if version.value != policy_step:
+            policy_step = pull_weights(models, shared, lock, version)
+        start = time.perf_counter()
+        result = play_game(int(np.random.SeedSequence([seed, actor_id, n]).generate_state(1)[0]))
+        result.update(actor=actor_id, policy_step=policy_step, seconds=time.perf_counter() - start)
+        games.put(result)
+        n += 1
+
+
+class BestTracker:
+    def __init__(self, eval_games: int):
+        """
+        依 actor 回報的對局成績挑 best 模型（取代另跑 test_play）：每個廣播版本留一份 CPU 權重快照，
+        該版本累積 eval_games 場後，平均名次（同名次時比平均點數）勝過比較基準就存成 best_*.pth。
+        比較基準依序為：pipeline 上次的紀錄、已有 best_*.pth 時 test_play 最近一次的成績、
+        都沒有時第 0 步（續訓起點）的成績。已有 best_*.pth 時第 0 步的權重只當基準，不會覆蓋 best。
+        """
+        self.eval_games = eval_games
+        self.snapshots = {}   # 策略步數 → (brain state_dict, dqn state_dict)
+        self.results = {}     # 策略步數 → [(點數, 名次, reward 總和, 步數)]
+        self.has_best = os.path.exists(f"{action.model_path}/best_brain.pth") and os.path.exists(f"{action.model_path}/best_dqn.pth")
+        self.best = load_pipeline_best() or (load_test_result() if self.has_best else None)
+
+    def snapshot(self, step: int, modules) -> None:
+        self.snapshots[step] = tuple({k: v.detach().cpu().clone() for k, v in m.state_dict().items()} for m in modules)
+        self.results[step] = []
+        # actor 只會用最新的幾版，太舊的版本等不到足夠場數，直接丟掉
+        for old in sorted(self.snapshots)[:-SNAPSHOT_LIMIT]:
+            del self.snapshots[old]
+            del self.results[old]
+
+    def add(self, result: dict) -> dict | None:
+        """
+        記下一場對局；該版本場數足夠且成績創新高時回傳評估紀錄（已存成 best），否則回傳 None。
+        """
+        games = self.results.get(result["policy_step"])
+        if games is None:
+            return None
+        rewards = result["arrays"]["reward"]
+        games.append((result["points"], result["rank"], float(rewards.sum()), len(rewards)))
+        if len(games) < self.eval_games:
+            return None
+        return self.evaluate(result["policy_step"])
+
+    def evaluate(self, step: int) -> dict | None:
+        games = self.results.pop(step)
+        brain_state, dqn_state = self.snapshots.pop(step)
+        points, ranks, rewards, steps = (sum(column) for column in zip(*games))
+        record = {
+            "step": step,
+            "games": len(games),
+            "avg_point": points / len(games),
+            "avg_rank": ranks / len(games),
+            "avg_reward": rewards / steps if steps else 0.0,   # 與 test_play 的 avg_reward 同定義（每步平均）
+        }
+        if step == 0 and self.has_best:
+            # 第 0 步是剛載入的模型（或隨機權重），不覆蓋既有的 best；沒有其他基準時以它的成績當基準
+            if self.best is None:
+                self.best = record
+            return None
+        if self.best is not None and (record["avg_rank"], -record["avg_point"]) >= (self.best["avg_rank"], -self.best["avg_point"]):
+            return None
+        os.makedirs(action.model_path, exist_ok=True)
+        torch.save(brain_state, f"{action.model_path}/best_brain.pth")
+        torch.save(dqn_state, f"{action.model_path}/best_dqn.pth")
+        with open(f"{action.model_path}/best_reward.txt", "w") as f:
+            f.write(str(record["avg_reward"]))
+        with open(PIPELINE_BEST_PATH, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        self.best = record
+        return record
+
+
+def load_pipeline_best() -> dict | None:
+    try:
+        with open(PIPELINE_BEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_test_result() -> dict | None:
+    """
+    test_play 最近一次的成績（train.py 產生 best 模型時會跑）；缺欄位或沒有檔案時回傳 None。
+    """
+    try:
+        with open(TEST_RESULT_PATH, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        return {"step": None, "avg_point": float(result["avg_point"]), "avg_rank": float(result["avg_rank"])}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def resume_checkpoint() -> str | None:
+    """
+    續訓的起點："best" 或 "latest" 中檔案較新的一組（pipeline 每 save_every 步存 latest，成績進步時才存 best）；都沒有則回傳 None。
+    """
+    names = [name for name in ("best", "latest")
+             if os.path.exists(f"{action.model_path}/{name}_brain.pth") and os.path.exists(f"{action.model_path}/{name}_dqn.pth")]
+    return max(names, key=lambda name: os.path.getmtime(f"{action.model_path}/{name}_brain.pth"), default=None)
+
+
+class Metrics:
+    def __init__(self):
+        """
+        learner 每個紀錄區間的吞吐量與 staleness；report() 回傳一筆紀錄並歸零。
+        """
+        self.start = time.perf_counter()
+        self.reset()
+
+    def reset(self):
+        self.window_start = time.perf_counter()
+        self.games = 0
+        self.generated = 0
+        self.trained = 0
+        self.steps = 0
+        self.idle = 0.0
+        self.loss = None
+        self.sample_staleness = []   # 每步訓練資料的平均 staleness（learner 步數）
+        self.game_staleness = []     # 每場對局送達時，產生它的權重落後幾步
+        self.points = []
+        self.ranks = []
+
+    def report(self, step: int, replay_size: int, broadcasts: int) -> dict:
+        seconds = time.perf_counter() - self.window_start
+        record = {
+            "step": step,
+            "elapsed": round(time.perf_counter() - self.start, 1),
+            "loss": self.loss.item() / self.steps if self.steps else None,
+            "games_per_sec": self.games / seconds,
+            "generated_per_sec": self.generated / seconds,
+            "trained_per_sec": self.trained / seconds,
+            "steps_per_sec": self.steps / seconds,
+            "replay_ratio": self.trained / self.generated if self.generated else None,
+            "learner_idle": self.idle / seconds,
+            "sample_staleness": float(np.mean(self.sample_staleness)) if self.sample_staleness else None,
+            "game_staleness": float(np.mean(self.game_staleness)) if self.game_staleness else None,
+            "game_staleness_max": max(self.game_staleness) if self.game_staleness else None,
+            "avg_point": float(np.mean(self.points)) if self.points else None,
+            "avg_rank": float(np.mean(self.ranks)) if self.ranks else None,
+            "replay_size": replay_size,
+            "broadcasts": broadcasts,
+        }
+        self.reset()
+        return record
+
+
+def format_record(r: dict) -> str:
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+    return (f"[step {r['step']}] loss {fmt(r['loss'], '.4f')}｜actor {r['games_per_sec']:.2f} 場/秒、{r['generated_per_sec']:.0f} 筆/秒"
+            f"｜learner {r['steps_per_sec']:.2f} 步/秒、{r['trained_per_sec']:.0f} 筆/秒（閒置 {r['learner_idle']:.0%}）"
+            f"｜replay {r['replay_size']} 筆、重用 {fmt(r['replay_ratio'], '.1f')} 次"
+            f"｜staleness 訓練資料 {fmt(r['sample_staleness'], '.1f')} 步、對局 {fmt(r['game_staleness'], '.1f')}（最大 {fmt(r['game_staleness_max'], 'd')}）步"
+            f"｜AI 平均點數 {fmt(r['avg_point'], '.0f')}、名次 {fmt(r['avg_rank'], '.2f')}")
+
+
+def run_pipeline(config):
+    """
+    啟動 config.actors 個 actor 行程，本行程作為 learner：
+    - 收到的對局加入 replay（並可同時寫成分片資料集），replay 滿 min_samples 筆後每步抽一批訓練
+    - 每 broadcast_every 步把權重寫進共享記憶體，actor 在下一場對局開始前換上
+    - 每 log_every 步輸出吞吐量、staleness 與 AI 對局成績，每 save_every 步存 latest 模型
+    - 每個廣播版本的權重在 actor 下了 eval_games 場後評估一次，成績創新高就升為 best 模型
+    """
+    set_helper_backend(config.helper)
+    seed = config.seed if config.seed is not None else random.getrandbits(32)
+    rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+    torch.set_num_threads(config.learner_threads or max(1, (os.cpu_count() or 1) - config.actors))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    brain = Brain(version=config.version, conv_channels=config.conv_channels, num_blocks=config.num_blocks)
+    dqn = DQN(version=config.version)
+    checkpoint = resume_checkpoint()
+    if checkpoint is not None:
+        print(f"載入 {checkpoint} 模型進行續訓...")
+        brain.load_state_dict(torch.load(f"{action.model_path}/{checkpoint}_brain.pth", map_location="cpu", weights_only=True))
+        dqn.load_state_dict(torch.load(f"{action.model_path}/{checkpoint}_dqn.pth", map_location="cpu", weights_only=True))
+    # actor 讀取的那一份（CPU、共享記憶體）
+    shared = [copy.deepcopy(brain).eval().share_memory(), copy.deepcopy(dqn).eval().share_memory()]
+    brain, dqn = brain.to(device), dqn.to(device)
+    optimizer = make_optimizer(list(brain.parameters()) + list(dqn.parameters()), config.lr, config.weight_decay, config.fused_optimizer)
+    train_step = make_train_step(brain, dqn, optimizer, config.amp, config.compile)
+
+    # spawn：learner 已用過 torch 的執行緒池，fork 出的子行程可能卡在 OpenMP；共享記憶體的權重以 torch.multiprocessing 傳遞
+    ctx = mp.get_context("spawn")
+    lock = ctx.Lock()
+    version = ctx.Value('q', 0)
+    games = ctx.Queue(maxsize=config.queue_games)
+    stop = ctx.Event()
+    actors = [ctx.Process(target=_actor, args=(i, seed, helper_backend(), shared, lock, version, games, stop), daemon=True)
+              for i in range(config.actors)]
+    for p in actors:
+        p.start()
+
+    replay = VersionedReplay(config.replay_capacity)
+    writer = ShardWriter(config.output) if config.output else None
+    metrics = Metrics()
+    tracker = BestTracker(config.eval_games)
+    tracker.snapshot(0, shared)
+    step = 0
+    broadcasts = 0
+    print(f"actor {config.actors} 個，learner {torch.get_num_threads()} 執行緒（{device}），每 {config.broadcast_every} 步廣播權重")
+
+    def receive(result):
+        replay.add(result["arrays"], result["policy_step"])
+        if writer is not None:
+            writer.extend(result["arrays"])
+        metrics.games += 1
+        metrics.generated += len(result["arrays"]["action"])
+        metrics.game_staleness.append(step - result["policy_step"])
+        metrics.points.append(result["points"])
+        metrics.ranks.append(result["rank"])
+        best = tracker.add(result)
+        if best is not None:
+            print(f"🏆 第 {best['step']} 步的權重升為 best 模型（{best['games']} 場：平均名次 {best['avg_rank']:.2f}、"
+                  f"點數 {best['avg_point']:.0f}、reward {best['avg_reward']:.4f}）")
+
+    try:
+        while step < config.steps:
+            # 先收下所有已完成的對局；replay 還不夠時才等待（這段時間算 learner 閒置）
+            while True:
+                try:
+                    receive(games.get_nowait())
+                except queue.Empty:
+                    break
+            if len(replay) < config.min_samples:
+                wait_start = time.perf_counter()
+                receive(games.get())
+                metrics.idle += time.perf_counter() - wait_start
+                continue
+
+            batch, policy_steps = replay.sample(config.batch_size, rng)
+            loss = train_step(*to_model_inputs(batch, device))
+            metrics.loss = loss if metrics.loss is None else metrics.loss + loss
+            metrics.steps += 1
+            metrics.trained += config.batch_size
+            metrics.sample_staleness.append(step - policy_steps.mean())
+            step += 1
+
+            if step % config.broadcast_every == 0:
+                publish_weights((brain, dqn), shared, lock, version, step)
+                tracker.snapshot(step, shared)
+                broadcasts += 1
+            if step % config.log_every == 0:
+                record = metrics.report(step, len(replay), broadcasts)
+                print(format_record(record))
+                append_json_log(PIPELINE_LOG_PATH, record)
+            if step % config.save_every == 0:
+                save_latest(brain, dqn)
+    finally:
+        stop.set()
+        # actor 可能卡在佇列已滿的 put，先清空佇列再等它們結束
+        while any(p.is_alive() for p in actors):
+            try:
+                games.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for p in actors:
+            p.join()
+        save_latest(brain, dqn)
+        if writer is not None:
+            manifest = writer.close({"pipeline": {"seed": seed, "steps": step}})
+            print(f"✓ 對局資料儲存於 {config.output}（{manifest}）")
+    print(f"✓ 共訓練 {step} 步、廣播 {broadcasts} 次，latest 模型已儲存")
+
+
+def save_latest(brain, dqn):
+    os.makedirs(action.model_path, exist_ok=True)
+    torch.save(brain.state_dict(), f"{action.model_path}/latest_brain.pth")
+    torch.save(dqn.state_dict(), f"{action.model_path}/latest_dqn.pth")
+
+
+def build_parser():
+    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    parser = argparse.ArgumentParser(description="actor–learner 同時進行的 self-play 訓練")
+    parser.add_argument("--steps", type=int, default=10000, help="learner 訓練步數")
+    parser.add_argument("--actors", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="self-play actor 行程數")
+    parser.add_argument("--learner_threads", type=int, default=None, help="learner 的 intra-op 執行緒數（預設為核心數扣掉 actor 數）")
+    parser.add_argument("--broadcast_every", type=int, default=100, help="每幾步把權重廣播給 actor")
+    parser.add_argument("--batch_size", type=int, default=256, help="訓練批次大小")
+    parser.add_argument("--min_samples", type=int, default=2048, help="replay 至少幾筆才開始訓練")
+    parser.add_argument("--replay_capacity", type=int, default=REPLAY_CAPACITY, help="replay 容量（滿了覆蓋最舊的資料）")
+    parser.add_argument("--queue_games", type=int, default=64, help="等待 learner 接收的對局上限（actor 超過就暫停）")
+    parser.add_argument("--log_every", type=int, default=50, help="每幾步輸出一次指標")
+    parser.add_argument("--save_every", type=int, default=1000, help="每幾步存一次 latest 模型")
+    parser.add_argument("--eval_games", type=int, default=20, help="每個廣播版本累積幾場對局後評估是否升為 best 模型")
+    parser.add_argument("--output", type=str, default=f"mahjong_ai/data/pipeline_{now}", help="對局資料另存的分片資料夾（給空字串則不存）")
+    parser.add_argument("--helper", choices=HELPER_BACKENDS, default=None, help="切牌建議的來源（預設依 MAHJONG_HELPER_BACKEND）")
+    parser.add_argument("--seed", type=int, default=None, help="種子（不指定則隨機）")
+    parser.add_argument("--lr", type=float, default=1e-4, help="學習率")
+    parser.add_argument("--weight_decay", type=float, default=0.0, help="L2 正則化係數")
+    parser.add_argument("--version", type=int, default=2, help="模型版本（與 obs encoder 對應）")
+    parser.add_argument("--conv_channels", type=int, default=128, help="CNN 特徵圖通道數")
+    parser.add_argument("--num_blocks", type=int, default=8, help="殘差區塊數")
+    parser.add_argument("--amp", choices=list(AMP_DTYPES), default="none", help="混合精度")
+    parser.add_argument("--compile", action="store_true", help="以 torch.compile 編譯訓練步驟")
+    parser.add_argument("--fused_optimizer", action="store_true", help="Adam 使用 fused 實作")
+    return parser
+
+
+if __name__ == "__main__":
+    run_pipeline(build_parser().parse_args())
@@ -0,0 +1,195 @@
+# reward.py - AI 行動的 reward 規則；需要 helper 的部分拆成 RewardQuery，可當場計算或在對局後批次標註
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from mahjong_ai.table.tile import Tile
+from mahjong_ai.utils.helper_output import HelperResult
+from mahjong_ai.utils.helper_interface import (
+    run_helper, helper_input_str, choose_first_3_discards_from_output,
+    chi_mingpai_top_two_lines, pon_mingpai_top_two_lines
+)
+
+if TYPE_CHECKING:
+    from mahjong_ai.table.table import Table
+
+
+class RewardQuery:
+    """
+    一個還沒問 helper 的 reward：helper 對 input_str 的建議符合條件時為 if_true，否則為 if_false。
+    - kind: 'discard'（arg 為打出的牌的 helper 字串，在前三建議內即符合）
+            'chi'（arg 為被吃的牌的 34 編號，helper 建議吃即符合）
+            'pon'（helper 建議碰即符合）
+    visible: 當時牌桌上公開的牌（Table.visible_counts，native 用來算有效牌剩餘張數）；舊資料沒有這欄時為 None。
+    只含字串與數字，可直接存成 JSON 或傳給其他行程。
+    """
+    __slots__ = ('kind', 'input_str', 'arg', 'if_true', 'if_false', 'visible')
+
+    def __init__(self, kind: str, input_str: str, arg, if_true: float, if_false: float, visible: list[int] = None):
+        self.kind = kind
+        self.input_str = input_str
+        self.arg = arg
+        self.if_true = if_true
+        self.if_false = if_false
+        self.visible = visible
+
+    @property
+    def key(self) -> tuple:
+        """helper 的查詢內容（相同的 key 只需分析一次）"""
+        return self.input_str, tuple(self.visible) if self.visible is not None else None
+
+    def to_list(self) -> list:
+        return [self.kind, self.input_str, self.arg, self.if_true, self.if_false, self.visible]
+
+    @classmethod
+    def from_list(cls, values: list) -> RewardQuery:
+        return cls(*values)
+
+    def resolve(self, output: str | HelperResult) -> float:
+        """
+        以 helper 對 input_str 的輸出算出 reward。
+        """
+        if self.kind == 'discard':
+            matched = self.arg in choose_first_3_discards_from_output(output)
+        elif self.kind == 'chi':
+            matched = bool(chi_mingpai_top_two_lines(output, Tile.from_34_id(self.arg)))
+        else:
+            matched = bool(pon_mingpai_top_two_lines(output))
+        return self.if_true if matched else self.if_false
+
+    def __repr__(self):
+        return f"RewardQuery({self.kind}, {self.input_str!r}, {self.arg!r}, {self.if_true}, {self.if_false})"
+
+
+def evaluate_action_reward(table: Table, action: int, tile: Tile | None) -> float:
+    """
+    當場算出 reward（需要 helper 時直接呼叫）。
+    """
+    reward = reward_query(table, action, tile)
+    if isinstance(reward, RewardQuery):
+        return reward.resolve(run_helper(reward.input_str, reward.visible))
+    return reward
+
+
+def _pon_allowed_honor(player, tile: Tile) -> bool:
+    # 字牌只有自風、場風與三元牌可以碰（役牌）
+    # 東=1, 南=2, 西=3, 北=4, 白=5, 發=6, 中=7
+    valid_values = []
+
+    # 自風 & 場風（東=0, 南=1, 西=2, 北=3）
+    wind_map = {0: 1, 1: 2, 2: 3, 3: 4}
+    valid_values.append(wind_map.get(player.seat_wind))
+    valid_values.append(wind_map.get(player.round_wind))
+
+    # 中白發永遠可碰（5,6,7）
+    valid_values += [5, 6, 7]
+    return tile.tile_value in valid_values
+
+
+def reward_query(table: Table, action: int, tile: Tile | None) -> float | RewardQuery:
+    """
+    依目前牌桌狀態算出 reward；需要 helper 的情況回傳 RewardQuery（只記下 helper 的輸入，不呼叫）。
+    牌桌狀態只在這裡讀取（包含碰役牌時設定 player.hasyaku），之後的標註不需要牌桌。
+    """
+    from mahjong_ai.table.Mingpai import can_chi_sets, can_pon, can_daiminkan
+    player = table.players[table.current_turn]
+    # 打牌 (0~33)
+    if 0 <= action <= 33:
+        discard_tile = Tile.from_34_id(action)
+        return RewardQuery('discard', helper_input_str(player.hand.tiles, player.melds), discard_tile.to_helper_string(), 1.0, -0.2, table.visible_counts())
+
+    # 立直
+    elif action == 34:
+        if player.is_riichi:
+            return 1.5
+        return -0.5
+
+    # 吃牌 (35–37)
+    elif 35 <= action <= 37:
+        if not tile:
+            return -1.0
+        if (player.hasyaku or player.do_has_yaku()) :
+            return RewardQuery('chi', helper_input_str(player.hand.tiles, player.melds, tile), tile.to_34_id(), 1.0, -1.0, table.visible_counts())
+
+        return -2.0
+
+    # 碰牌
+    elif action == 38:
+        if not tile:
+            return -1.0
+
+
+        if sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) < 2:
+                return -1.0
+
+        # 如果是字牌才檢查風牌限制
+        if tile.tile_type == 'honor':
+            if not _pon_allowed_honor(player, tile):
+                return -1.0
+
+            player.hasyaku = True
+
+        if ((player.hasyaku or player.do_has_yaku())) :
+            return RewardQuery('pon', helper_input_str(player.hand.tiles, player.melds, tile), None, 1.0, -1.0, table.visible_counts())
+
+        return -2.0
+
+
+    # 槓牌
+    elif action == 40:
+        if not tile:
+            return -1.0
+        if ((player.hasyaku or player.do_has_yaku())) :
+            return 0.5
+        return -0.3
+
+
+    elif action == 39 or action == 41:
+        return 0.5
+
+    # 和牌
+    elif action == 42:
+        if table.round_result and table.round_result.winner == player.player_id:
+            return 10.0
+        return -1.0
+
+    # 流局
+    elif action == 43:
+        return 0.0
+    # PASS
+    elif action == 44:
+        if tile:
+            # --- 檢查是否能吃（僅限下家）
+            chi_allowed = (table.last_discard_player_id + 1) % 4 == table.current_turn
+            if chi_allowed and can_chi_sets(player, tile):
+                if (player.hasyaku or player.do_has_yaku()) :
+                    return RewardQuery('chi', helper_input_str(player.hand.tiles, player.melds, tile), tile.to_34_id(), -0.3, 1.0, table.visible_counts())
+                return 1.0
+
+            # --- 檢查是否能碰
+            if can_pon(player, tile):
+                if sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) < 2:
+                    return -1.0
+
+                # 如果是字牌才檢查風牌限制
+                if tile.tile_type == 'honor':
+                    if not _pon_allowed_honor(player, tile):
+                        return -1.0
+
+                    player.hasyaku = True
+
+                if ((player.hasyaku or player.do_has_yaku())) :
+                    return RewardQuery('pon', helper_input_str(player.hand.tiles, player.melds, tile), None, -0.3, 1.0, table.visible_counts())
+
+                return 0.5
+
+            # if can_daiminkan(player, tile):
+            #     if ((player.hasyaku or player.do_has_yaku())) :
+
+
+            return 1.0  # 不能吃／不能碰 → PASS 是合理的
+        else:
+            return 0.1  # 沒有 tile 無法判斷，保守給中性分
+
+
+    return 0.0
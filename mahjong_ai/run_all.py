@@ -1,51 +1,69 @@
-# run_all.py - 一鍵模擬、訓練與測試流程，支援 CLI 路徑與訓練參數
+# run_all.py - 一鍵模擬、訓練與測試流程：預設為 pipeline.py 的 actor–learner 同時進行，--sequential 為原本逐段執行子行程的流程
 
 import subprocess
 import datetime
 import os
 import sys
 
+from mahjong_ai.pipeline import build_parser, run_pipeline
+
 
 # === 確保輸出資料夾存在 ===
 os.makedirs("mahjong_ai/data", exist_ok=True)
 os.makedirs("mahjong_ai/models", exist_ok=True)
 
-# === 訓練輪數設定 ===
+# === 訓練輪數設定（--sequential）===
 NUM_ROUNDS = 1
    # ← 想跑幾輪你可以改這裡
+# 訓練的資料平行行程數（gloo，CPU 多核心時可設為核心數；學習率會依行程數線性放大）
+TRAIN_PROCESSES = int(os.environ.get("MAHJONG_TRAIN_PROCESSES", "1"))
+
+
+def run_sequential():
+    for i in range(1, NUM_ROUNDS + 1):
+        print(f"\n========== 第 {i} 輪訓練開始 ==========")
+
+        # 建立唯一輸出檔名（加時間戳）
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        data_path = f"mahjong_ai/data/selfplay_round_{now}"
+
+        # [1] 執行模擬對局，產生訓練資料
+        print("[1] 開始模擬對局...")
+        subprocess.run([sys.executable, "-m", "mahjong_ai.simulate_selfplay", "--output", data_path])
+
+        # [2] 執行模型訓練
+        print("\n[2] 開始模型訓練...")
+        subprocess.run([
+            sys.executable, "-m", "mahjong_ai.train",
+            "--data_path", data_path,
+            "--batch_size", "256",
+            "--epochs", "50",
+            "--lr", "0.0001",
+            "--conv_channels", "128",
+            "--num_blocks", "8",
+            "--version", "2",
+            "--nproc", str(TRAIN_PROCESSES)
+        ])
+
+        try:
+            with open("mahjong_ai/models/best_reward.txt", "r") as f:
+                best = f.read().strip()
+            print(f"🏆 當前最佳 reward：{best}")
+        except:
+            print("⚠️ 尚未產生 best_reward.txt")
+
+    print("\n✅ 全部訓練輪數完成")
+
 
-for i in range(1, NUM_ROUNDS + 1):
-    print(f"\n========== 第 {i} 輪訓練開始 ==========")
-
-    # 建立唯一輸出檔名（加時間戳）
-    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    json_path = f"mahjong_ai/data/selfplay_round_{now}.json"
-
-    # [1] 執行模擬對局，產生訓練資料
-    print("[1] 開始模擬對局...")
-    subprocess.run([sys.executable, "-m", "mahjong_ai.simulate_selfplay", "--output", json_path])
-
-    # [2] 執行模型訓練
-    print("\n[2] 開始模型訓練...")
-    subprocess.run([
-        sys.executable, "-m", "mahjong_ai.train",
-        "--json_path", json_path,
-        "--batch_size", "256",
-        "--epochs", "50",
-        "--lr", "0.0001",
-        "--conv_channels", "128",
-        "--num_blocks", "8",
-        "--version", "2"
-    ])
-
-    try:
-        with open("mahjong_ai/models/best_reward.txt", "r") as f:
-            best = f.read().strip()
-        print(f"🏆 當前最佳 reward：{best}")
-    except:
-        print("⚠️ 尚未產生 best_reward.txt")
-
-print("\n✅ 全部訓練輪數完成")
+# pipeline 的 actor 以 spawn 啟動，會重新 import 主模組，因此流程要放在 __main__ 裡
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.add_argument("--sequential", action="store_true", help="改用原本「模擬 → 訓練」逐段執行子行程的流程")
+    args = parser.parse_args()
+    if args.sequential:
+        run_sequential()
+    else:
+        run_pipeline(args)
 
 
 # [3] 顯示測試結果
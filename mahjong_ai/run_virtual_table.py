@@ -9,12 +9,14 @@ def setup_virtual_table() -> Table:
     你可在這邊直接設定任意場況。
     """
     table = Table()
+    table.round.start_round(table)  # 發牌並建立牌山，以下再覆寫成指定場況
     ai_player = table.players[3]
     ai_player.is_ai = True
 
     # === AI 手牌（13 張）
     hand_ids = [2 ,4, 5, 12, 13, 18, 21, 32, 32 ,32,3,11,4]  # 一二三萬 + 白白發中
     ai_player.hand.tiles = [Tile.from_34_id(tid) for tid in hand_ids]
+    ai_player.update_waits()
 
     # === 副露（碰發）← Player 2
     ai_player.melds = [
@@ -0,0 +1,362 @@
+# shards.py - 二進位分片資料集：ShardWriter 寫出壓縮分片與 manifest，ShardReader 以 memory-map 讀取
+
+import glob
+import json
+import os
+
+import numpy as np
+
+from mahjong_ai.buffer import ReplayBuffer, FIELDS, decode_arrays
+from mahjong_ai.table.encode_obs import OBS_SHAPE_V2, ACTION_DIM, SCALAR_ROWS, FLAG_ROWS, compress_obs
+
+# 資料夾結構：
+#   <dataset>/manifest.json        欄位形狀、各分片筆數、附加資訊（例如牌山種子）
+#   <dataset>/shard_00000.npz      hand(uint8) / flags(packbits uint8) / scalars(float32) / mask(packbits uint8) / action(int16) / reward(float32)
+#   <dataset>/.mmap/shard_00000/   讀取時解壓出的 .npy（給 memory-map 用，第一次讀到才建立）
+#   <dataset>/reward_queries.json  延後標註的 reward 查詢（全域列號 → RewardQuery），標註完會刪除
+MANIFEST_NAME = "manifest.json"
+QUERIES_NAME = "reward_queries.json"
+FORMAT_NAME = "mahjong-shards"
+FORMAT_VERSION = 2
+# 第 1 版的欄位：obs 是整張 uint8（SCALAR_ROWS 的格子為 0），讀取時轉成第 2 版的緊湊格式
+LEGACY_FIELDS = ("obs", "scalars", "mask", "action", "reward")
+SHARD_SIZE = 4096
+MMAP_DIR = ".mmap"
+
+
+def is_shard_dataset(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def expand_dataset_paths(paths) -> list[str]:
+    """
+    把資料路徑（可含萬用字元，或是放了多個分片資料集的上層資料夾）展開成分片資料集清單。
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    result = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if is_shard_dataset(path):
+                result.append(path)
+            elif os.path.isdir(path):
+                result.extend(sorted(p for p in glob.glob(os.path.join(path, "*")) if is_shard_dataset(p)))
+    return result
+
+
+class ShardWriter:
+    def __init__(self, out_dir: str, shard_size: int = SHARD_SIZE, compress: bool = True,
+                 obs_shape=OBS_SHAPE_V2, action_dim=ACTION_DIM):
+        """
+        逐筆或整批寫入，每滿 shard_size 筆寫出一個分片；close() 時寫 manifest。
+        - compress: True 用 np.savez_compressed（obs 大多是 0，壓縮率很高），False 則不壓縮
+        """
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.compress = compress
+        self.obs_shape = tuple(obs_shape)
+        self.action_dim = action_dim
+        self.shards: list[dict] = []
+        self.reward_queries: dict[int, list] = {}   # 全域列號 → RewardQuery.to_list()
+        # 暫存區直接沿用 ReplayBuffer 的緊湊格式，滿了就寫出並清空
+        self._staging = ReplayBuffer(shard_size, obs_shape=obs_shape, action_dim=action_dim)
+        os.makedirs(out_dir, exist_ok=True)
+
+    def add(self, obs, mask, action, reward) -> None:
+        """
+        加入一筆原始資料（float obs、bool mask）。
+        """
+        self._staging.push({"obs": obs, "mask": mask, "action": action, "reward": reward})
+        if len(self._staging) >= self.shard_size:
+            self.flush()
+
+    def add_arrays(self, hand, flags, scalars, mask, action, reward) -> None:
+        """
+        直接加入一批已是緊湊格式的資料（例如 ReplayBuffer.compact_arrays()）。
+        """
+        self.flush()
+        arrays = {"hand": hand, "flags": flags, "scalars": scalars, "mask": mask, "action": action, "reward": reward}
+        for start in range(0, len(action), self.shard_size):
+            self._write_shard({key: arr[start:start + self.shard_size] for key, arr in arrays.items()})
+
+    @property
+    def num_samples(self) -> int:
+        """已加入的筆數（含還在暫存區的）"""
+        return sum(s["num_samples"] for s in self.shards) + len(self._staging)
+
+    def extend(self, arrays: dict, reward_queries: dict = None) -> None:
+        """
+        加入一批緊湊格式的資料（key 同 FIELDS），放進暫存區、滿 shard_size 筆才寫出，
+        適合一局一局陸續加入（例如多行程 self-play）。reward_queries 的列號以這批資料的第一筆為 0。
+        """
+        base = self.num_samples
+        for row, query in (reward_queries or {}).items():
+            self.reward_queries[base + row] = query
+        n = len(arrays["action"])
+        start = 0
+        while start < n:
+            take = min(n - start, self.shard_size - len(self._staging))
+            self._staging.push_arrays({key: arrays[key][start:start + take] for key in FIELDS})
+            start += take
+            if len(self._staging) >= self.shard_size:
+                self.flush()
+
+    def flush(self) -> None:
+        if len(self._staging):
+            self._write_shard(self._staging.compact_arrays())
+            self._staging.clear()
+
+    def _write_shard(self, arrays: dict) -> None:
+        name = f"shard_{len(self.shards):05d}.npz"
+        path = os.path.join(self.out_dir, name)
+        save = np.savez_compressed if self.compress else np.savez
+        save(path, **{key: np.ascontiguousarray(arrays[key]) for key in FIELDS})
+        self.shards.append({"file": name, "num_samples": int(len(arrays["action"]))})
+
+    def close(self, meta: dict = None, reward_queries: dict = None) -> str:
+        """
+        寫出剩餘資料與 manifest，回傳 manifest 路徑。
+        - reward_queries: {全域列號: RewardQuery.to_list()}，這些列的 reward 先存 NaN，由 label_rewards.py 補上
+        """
+        self.flush()
+        reward_queries = {**self.reward_queries, **(reward_queries or {})}
+        if reward_queries:
+            with open(os.path.join(self.out_dir, QUERIES_NAME), 'w', encoding='utf-8') as f:
+                json.dump({str(row): query for row, query in sorted(reward_queries.items())}, f, ensure_ascii=False)
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "obs_shape": list(self.obs_shape),
+            "action_dim": self.action_dim,
+            "scalar_rows": list(SCALAR_ROWS),
+            "flag_rows": list(FLAG_ROWS),
+            "compressed": self.compress,
+            "num_samples": sum(s["num_samples"] for s in self.shards),
+            "pending_rewards": len(reward_queries),
+            "shards": self.shards,
+            "meta": meta or {},
+        }
+        path = os.path.join(self.out_dir, MANIFEST_NAME)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return path
+
+
+class ShardReader:
+    def __init__(self, dataset_dir: str):
+        """
+        讀取分片資料集。各分片第一次用到時才解壓成 .npy 並以 memory-map 開啟，
+        因此整個資料集不會一次載入記憶體；多個 DataLoader worker 共用同一份解壓檔。
+        """
+        self.dataset_dir = dataset_dir
+        with open(os.path.join(dataset_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_NAME:
+            raise ValueError(f"不是分片資料集：{dataset_dir}")
+        self.version = self.manifest.get("version", 1)
+        self.fields = FIELDS if self.version >= 2 else LEGACY_FIELDS
+        self.action_dim = self.manifest["action_dim"]
+        self.obs_shape = tuple(self.manifest["obs_shape"])
+        self.shard_sizes = [s["num_samples"] for s in self.manifest["shards"]]
+        self.offsets = np.concatenate([[0], np.cumsum(self.shard_sizes)]).astype(np.int64)
+        self._opened: dict[int, dict] = {}
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getstate__(self):
+        # 傳給 DataLoader worker 時不帶已開啟的 memory-map，各 worker 自行開啟
+        state = self.__dict__.copy()
+        state["_opened"] = {}
+        return state
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shard_sizes)
+
+    @property
+    def pending_rewards(self) -> int:
+        """還沒標註 reward 的筆數（見 label_rewards.py）"""
+        return self.manifest.get("pending_rewards", 0)
+
+    def reward_queries(self) -> dict[int, list]:
+        """
+        延後標註的 reward 查詢：{全域列號: RewardQuery.to_list()}。
+        """
+        path = os.path.join(self.dataset_dir, QUERIES_NAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return {int(row): query for row, query in json.load(f).items()}
+
+    def shard(self, shard_id: int) -> dict:
+        """
+        回傳分片儲存的原始欄位（memory-map 的唯讀陣列，key 為 self.fields）。
+        """
+        arrays = self._opened.get(shard_id)
+        if arrays is None:
+            arrays = self._open_shard(shard_id)
+            self._opened[shard_id] = arrays
+        return arrays
+
+    def _open_shard(self, shard_id: int) -> dict:
+        name = self.manifest["shards"][shard_id]["file"]
+        cache_dir = os.path.join(self.dataset_dir, MMAP_DIR, os.path.splitext(name)[0])
+        paths = {key: os.path.join(cache_dir, f"{key}.npy") for key in self.fields}
+        if not all(os.path.exists(p) for p in paths.values()):
+            os.makedirs(cache_dir, exist_ok=True)
+            with np.load(os.path.join(self.dataset_dir, name)) as npz:
+                for key, path in paths.items():
+                    # 先寫暫存檔再改名，避免多個 worker 同時解壓時讀到寫一半的檔案
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, 'wb') as f:
+                        np.save(f, npz[key])
+                    os.replace(tmp, path)
+        return {key: np.load(path, mmap_mode='r') for key, path in paths.items()}
+
+    def locate(self, index: int) -> tuple[int, int]:
+        """
+        全域索引 → (分片編號, 分片內索引)。
+        """
+        shard_id = int(np.searchsorted(self.offsets, index, side='right') - 1)
+        return shard_id, int(index - self.offsets[shard_id])
+
+    def read(self, shard_id: int, rows) -> dict:
+        """
+        取出某分片指定列（索引陣列或 slice）的緊湊格式欄位，key 同 FIELDS；第 1 版資料在這裡轉換。
+        """
+        arrays = self.shard(shard_id)
+        if self.version >= 2:
+            return {key: np.asarray(arrays[key][rows]) for key in FIELDS}
+        result = {key: np.asarray(arrays[key][rows]) for key in LEGACY_FIELDS[1:]}
+        result["hand"], result["flags"], _ = compress_obs(arrays["obs"][rows])
+        return result
+
+    def get_shard_arrays(self, shard_id: int, rows) -> tuple[np.ndarray, ...]:
+        """
+        取出某分片指定列並還原成模型輸入（obs float32、mask bool、action int64、reward float32）。
+        """
+        return decode_arrays(self.read(shard_id, rows), action_dim=self.action_dim)
+
+    def get_item(self, index: int) -> tuple[np.ndarray, ...]:
+        shard_id, row = self.locate(index)
+        obs, mask, action, reward = self.get_shard_arrays(shard_id, [row])
+        return obs[0], mask[0], action[0], reward[0]
+
+    def rewards(self) -> np.ndarray:
+        """
+        全部 reward（只讀 reward 欄位）。
+        """
+        parts = [np.zeros(0, dtype=np.float32)]
+        for shard_id, info in enumerate(self.manifest["shards"]):
+            if shard_id in self._opened:
+                parts.append(np.asarray(self._opened[shard_id]["reward"]))
+            else:
+                # 只解壓 reward 這個欄位，不必展開整個分片
+                with np.load(os.path.join(self.dataset_dir, info["file"])) as npz:
+                    parts.append(npz["reward"])
+        return np.concatenate(parts)
+
+
+def update_rewards(dataset_dir: str, rewards: dict[int, float], meta: dict = None) -> None:
+    """
+    把標註好的 reward（全域列號 → 值）寫回分片：只重寫有變動的分片，並清掉它們解壓出的 .npy。
+    全部寫完後更新 manifest（pending_rewards 歸零、meta 合併進去）並刪除 reward_queries.json。
+    """
+    reader = ShardReader(dataset_dir)
+    by_shard: dict[int, list[tuple[int, float]]] = {}
+    for index, value in rewards.items():
+        shard_id, row = reader.locate(index)
+        by_shard.setdefault(shard_id, []).append((row, value))
+
+    compress = reader.manifest.get("compressed", True)
+    for shard_id, items in sorted(by_shard.items()):
+        name = reader.manifest["shards"][shard_id]["file"]
+        path = os.path.join(dataset_dir, name)
+        with np.load(path) as npz:
+            arrays = {key: npz[key] for key in npz.files}
+        reward = arrays["reward"].copy()
+        rows, values = zip(*items)
+        reward[list(rows)] = values
+        arrays["reward"] = reward
+        # 先寫暫存檔再改名，寫到一半中斷時原分片不受影響
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        (np.savez_compressed if compress else np.savez)(tmp, **arrays)
+        os.replace(tmp, path)
+        stale = os.path.join(dataset_dir, MMAP_DIR, os.path.splitext(name)[0], "reward.npy")
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    manifest = reader.manifest
+    manifest["pending_rewards"] = max(0, reader.pending_rewards - len(rewards))
+    manifest["meta"] = {**manifest.get("meta", {}), **(meta or {})}
+    with open(os.path.join(dataset_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    queries = os.path.join(dataset_dir, QUERIES_NAME)
+    if not manifest["pending_rewards"] and os.path.exists(queries):
+        os.remove(queries)
+
+
+# === 舊版 JSON 資料轉換 ===
+
+def iter_json_records(json_path: str, chunk_size: int = 1 << 20):
+    """
+    逐筆讀出 save_to_json 寫的 [ {...}, {...}, ... ]，一次只保留一筆與一個讀取區塊在記憶體中。
+    """
+    decoder = json.JSONDecoder()
+    with open(json_path, 'r', encoding='utf-8') as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith('['):
+            raise ValueError(f"不是 JSON 陣列：{json_path}")
+        pos = 1
+        eof = False
+        while True:
+            # 跳過空白與分隔的逗號
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            if pos < len(buf):
+                try:
+                    record, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield record
+                    pos = end
+                    continue
+            if eof:
+                raise ValueError(f"JSON 在結尾前中斷：{json_path}")
+            # 這筆還沒讀完整：丟掉已處理的部分，再讀一塊
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def convert_json(json_path: str, out_dir: str, **writer_kwargs) -> str:
+    """
+    把一個舊版 JSON 資料檔串流轉成分片資料集，回傳 manifest 路徑。
+    """
+    writer = ShardWriter(out_dir, **writer_kwargs)
+    for record in iter_json_records(json_path):
+        writer.add(record["obs"], record["mask"], record["action"], record["reward"])
+    return writer.close({"source": os.path.basename(json_path)})
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="把 mahjong_ai/data/*.json 轉成二進位分片資料集")
+    parser.add_argument("inputs", nargs="*", default=None, help="JSON 檔（預設 mahjong_ai/data/*.json）")
+    parser.add_argument("--shard_size", type=int, default=SHARD_SIZE, help="每個分片的筆數")
+    parser.add_argument("--no_compress", action="store_true", help="分片不壓縮")
+    args = parser.parse_args()
+
+    inputs = args.inputs or sorted(p for p in glob.glob("mahjong_ai/data/*.json") if not p.endswith(".seeds.json"))
+    for json_path in inputs:
+        out_dir = os.path.splitext(json_path)[0]
+        manifest = convert_json(json_path, out_dir, shard_size=args.shard_size, compress=not args.no_compress)
+        print(f"✓ {json_path} → {out_dir}（{manifest}）")
@@ -1,32 +1,265 @@
-# simulate_selfplay.py - 產生訓練資料的模擬對局器，支援 CLI 輸出路徑參數
+# simulate_selfplay.py - 產生訓練資料的模擬對局器，支援 CLI 輸出路徑參數（預設寫成二進位分片資料集）
 
 import os
+import sys
+import json
+import time
+import random
 import argparse
+import collections
 import datetime
+import contextlib
+import multiprocessing
+import numpy as np
+from mahjong_ai import action
 from mahjong_ai.buffer import ReplayBuffer
+from mahjong_ai.inference import InferenceServer, InferenceClient, DEFAULT_MAX_BATCH, DEFAULT_MAX_LATENCY_MS, format_stats
+from mahjong_ai.shards import ShardWriter
 from mahjong_ai.table.table import Table
+from mahjong_ai.table.decision import drive_tables
+from mahjong_ai.table.wall import WallPool
+from mahjong_ai.utils.helper_interface import HELPER_BACKENDS, helper_backend, helper_cache_stats, set_helper_backend
 
 NUM_GAMES = 20  # 對局數
 
 # 主模擬函數：跑多場對局並儲存訓練資料至指定路徑
-def simulate_selfplay(output_path):
-    buffer = ReplayBuffer(capacity=100000)
-    for i in range(NUM_GAMES):
+# 與多行程版本相同，每場以 game_seed(seed, 場次) 設定種子，同一個 seed 的資料與 worker 數無關
+def simulate_selfplay(output_path, seed=None, defer_rewards=False, num_games=None):
+    # defer_rewards：reward 中需要 helper 的部分留給 label_rewards.py 在對局後批次標註
+    seed = seed if seed is not None else random.getrandbits(32)
+    load_seeded_policy(seed)
+    buffer = ReplayBuffer(capacity=100000, defer_rewards=defer_rewards)
+    wall_seeds = []
+    for i in range(num_games or NUM_GAMES):
         print(f"=== 第 {i + 1} 場對局 ===")
-        table = Table()
-        table.run_game_loop(buffer)
+        table = play_seeded_game(game_seed(seed, i), buffer)
+        wall_seeds.append(table.wall_seeds)
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    buffer.save_to_json(output_path)
-    print(f"✓ 所有對局已完成，資料儲存於 {output_path}")
+    save_buffer(buffer, output_path, {"seed": seed, "games": wall_seeds})
+    print_cache_stats(helper_cache_stats())
+
+def load_seeded_policy(seed):
+    """
+    以 seed 設定 torch 的種子後才載入模型：沒有模型檔時權重為隨機初始化，同一個 seed 才會是同一個模型。
+    """
+    import torch
+    torch.manual_seed(seed)
+    action.get_policy()
+
+def play_seeded_game(seed, buffer):
+    """
+    以 seed 設定 random / torch，並用這個種子的牌山跑一場；結果只取決於 seed（與在哪個行程跑無關）。
+    """
+    random.seed(seed)
+    if "torch" in sys.modules:
+        # 推論交給主行程時 worker 不載入 torch
+        sys.modules["torch"].manual_seed(seed)
+    table = Table(wall_pool=WallPool(seed, batch_size=64))
+    table.run_game_loop(buffer)
+    return table
+
+def save_buffer(buffer, output_path, seeds):
+    if output_path.endswith(".json"):
+        # 舊版 JSON 格式，牌山種子另存一個檔
+        buffer.save_to_json(output_path)
+        seeds_path = os.path.splitext(output_path)[0] + ".seeds.json"
+        with open(seeds_path, 'w', encoding='utf-8') as f:
+            json.dump(seeds, f)
+        print(f"✓ 所有對局已完成，資料儲存於 {output_path}（牌山種子：{seeds_path}）")
+    else:
+        # 分片資料集，牌山種子記在 manifest 的 meta
+        manifest = buffer.save_shards(output_path, meta={"wall_seeds": seeds})
+        print(f"✓ 所有對局已完成，資料儲存於 {output_path}（{len(buffer)} 筆，{manifest}）")
+        if buffer.queries:
+            print(f"  其中 {len(buffer.queries)} 筆 reward 待標註：python -m mahjong_ai.label_rewards {output_path}")
+
+def print_cache_stats(stats):
+    if stats is None:   # native 不經過快取
+        return
+    print(f"helper 快取：命中率 {stats['hit_rate']:.1%}（{stats['requests']} 次，記憶體 {stats['memory_hits']}、磁碟 {stats['disk_hits']}），"
+          f"命中 {stats['avg_hit_ms']:.3f} ms／未命中 {stats['avg_miss_ms']:.1f} ms")
+
+# === 單一行程同時推進多個牌桌 ===
+# 牌局是 generator（Table.play），每個 AI 決策點都會停下來；driver 把所有牌桌停住的決策湊成一批推論後再一起送回。
+
+def simulate_selfplay_vectorized(output_path, seed=None, tables=16, num_games=None, defer_rewards=False):
+    """
+    單一行程同時進行 tables 個牌桌，一場結束就開下一場，直到完成 num_games 場。
+    """
+    num_games = num_games or NUM_GAMES
+    buffer = ReplayBuffer(capacity=100000, defer_rewards=defer_rewards)
+    wall_pool = WallPool(seed)
+    load_seeded_policy(wall_pool.seed)
+    started = {}   # 場次 → Table
+    batch_sizes = collections.Counter()   # 一次推論的決策數 → 次數
+
+    def games():
+        for i in range(num_games):
+            table = Table(wall_pool=wall_pool)
+            started[i] = table
+            yield i, table.play(buffer)
+
+    def answer_batch(decisions):
+        batch_sizes[sum(d.needs_model for d in decisions)] += 1
+        return action.answer_decisions(decisions)
+
+    stdout = sys.stdout
+    start = time.perf_counter()
+    # 多個牌桌的對局紀錄會交錯，不輸出
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        for done, index in enumerate(drive_tables(games(), answer_batch, tables), 1):
+            print(f"=== 第 {index + 1} 場對局完成（{done}/{num_games}）===", file=stdout)
+    elapsed = time.perf_counter() - start
+
+    save_buffer(buffer, output_path, {"seed": wall_pool.seed, "games": [started[i].wall_seeds for i in range(num_games)]})
+    decisions = sum(size * count for size, count in batch_sizes.items())
+    batches = sum(count for size, count in batch_sizes.items() if size)
+    print(f"整體：{num_games / elapsed:.2f} 場/秒，{len(buffer) / elapsed:.0f} 步/秒（{tables} 個牌桌，{elapsed:.1f}s）")
+    print(f"推論 {decisions} 次／{batches} 批，平均批次 {decisions / batches if batches else 0.0:.1f}")
+    print_cache_stats(helper_cache_stats())
+
+# === 多行程 self-play ===
+# 每場對局是一個工作，由行程池中的 worker 執行；每場有自己的種子（由 seed 與場次推得），
+# 因此結果與哪個 worker、幾個 worker 無關。worker 每跑完一場就把緊湊格式的資料傳回主行程寫成分片。
+
+_worker_defer_rewards = False
+
+def game_seed(seed, index):
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+def _init_worker(backend, defer_rewards, inference_queues=None, policy=None, policy_threads=None, seed=None):
+    global _worker_defer_rewards
+    set_helper_backend(backend)
+    action.set_policy_backend(policy)
+    action.set_policy_threads(policy_threads)
+    _worker_defer_rewards = defer_rewards
+    if inference_queues is None:
+        import torch
+        # 每個 worker 預設只用一個執行緒推論，避免多個行程搶同一批核心
+        torch.set_num_threads(policy_threads or 1)
+        # fork 時沿用主行程已載入的模型；spawn 時以同一個 seed 重建，隨機初始權重與主行程相同
+        load_seeded_policy(seed)
+    else:
+        # 推論交給主行程的 InferenceServer，各 worker 依啟動順序取得自己的回應佇列
+        requests, responses, counter = inference_queues
+        with counter.get_lock():
+            client_id = counter.value
+            counter.value += 1
+        action.set_inference(InferenceClient(requests, responses[client_id], client_id))
+
+def _play_game(task):
+    index, seed = task
+    buffer = ReplayBuffer(capacity=100000, defer_rewards=_worker_defer_rewards)
+    start = time.perf_counter()
+    # worker 的對局紀錄不輸出（多個行程的輸出會交錯）
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        table = play_seeded_game(seed, buffer)
+    return {
+        "index": index,
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - start,
+        "arrays": buffer.compact_arrays(),
+        "queries": buffer.reward_queries(),
+        "wall_seeds": table.wall_seeds,
+        "cache": helper_cache_stats(),
+    }
+
+def _merge_cache_stats(stats_list):
+    # 各 worker 的快取統計相加（平均耗時依次數加權）；native 沒有快取統計
+    stats_list = [s for s in stats_list if s is not None]
+    if not stats_list:
+        return None
+    total = {key: sum(s[key] for s in stats_list) for key in ("requests", "memory_hits", "disk_hits", "misses")}
+    hits = total["memory_hits"] + total["disk_hits"]
+    total["hit_rate"] = hits / total["requests"] if total["requests"] else 0.0
+    total["avg_hit_ms"] = sum(s["avg_hit_ms"] * (s["memory_hits"] + s["disk_hits"]) for s in stats_list) / hits if hits else 0.0
+    total["avg_miss_ms"] = sum(s["avg_miss_ms"] * s["misses"] for s in stats_list) / total["misses"] if total["misses"] else 0.0
+    return total
+
+def simulate_selfplay_parallel(output_path, seed=None, workers=2, num_games=None, defer_rewards=False,
+                               batched_inference=False, max_batch=DEFAULT_MAX_BATCH, max_latency_ms=DEFAULT_MAX_LATENCY_MS):
+    """
+    以 workers 個行程平行 self-play，依場次順序把資料串流寫入分片資料集（只支援分片格式）。
+    batched_inference：worker 不自己推論，改由主行程的 InferenceServer 把各牌桌的請求湊成一批。
+    """
+    seed = seed if seed is not None else random.getrandbits(32)
+    num_games = num_games or NUM_GAMES
+    tasks = [(i, game_seed(seed, i)) for i in range(num_games)]
+    writer = ShardWriter(output_path)
+    wall_seeds = []
+    per_worker = {}   # pid → [場數, 步數, 對局秒數]
+    cache_stats = {}  # pid → 最新的快取統計
+    server = None
+    inference_queues = None
+    # 先在主行程載入模型：fork 出的 worker 直接沿用，批次推論時由主行程的 InferenceServer 使用
+    load_seeded_policy(seed)
+    if batched_inference:
+        server = InferenceServer(decide=action.policy_decide, max_batch=max_batch, max_latency_ms=max_latency_ms)
+        inference_queues = (multiprocessing.Queue(), [multiprocessing.Queue() for _ in range(workers)], multiprocessing.Value('i', 0))
+        server.serve_queues(inference_queues[0], inference_queues[1])
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(helper_backend(), defer_rewards, inference_queues, action.policy_backend(), action.policy_threads(), seed)) as pool:
+        for result in pool.imap(_play_game, tasks):
+            steps = len(result["arrays"]["action"])
+            writer.extend(result["arrays"], result["queries"])
+            wall_seeds.append(result["wall_seeds"])
+            record = per_worker.setdefault(result["pid"], [0, 0, 0.0])
+            record[0] += 1
+            record[1] += steps
+            record[2] += result["seconds"]
+            cache_stats[result["pid"]] = result["cache"]
+            print(f"=== 第 {result['index'] + 1} 場對局完成（worker {result['pid']}，{steps} 步，{result['seconds']:.1f}s）===")
+    pending = len(writer.reward_queries)
+    manifest = writer.close({"wall_seeds": {"seed": seed, "games": wall_seeds}})
+    elapsed = time.perf_counter() - start
+
+    total_steps = sum(r[1] for r in per_worker.values())
+    print(f"✓ 所有對局已完成，資料儲存於 {output_path}（{total_steps} 筆，{manifest}）")
+    if pending:
+        print(f"  其中 {pending} 筆 reward 待標註：python -m mahjong_ai.label_rewards {output_path}")
+    print(f"整體：{num_games / elapsed:.2f} 場/秒，{total_steps / elapsed:.0f} 步/秒（{workers} 個 worker，{elapsed:.1f}s）")
+    for pid, (games, steps, seconds) in sorted(per_worker.items()):
+        print(f"  worker {pid}：{games} 場，{games / seconds:.2f} 場/秒，{steps / seconds:.0f} 步/秒")
+    print_cache_stats(_merge_cache_stats(list(cache_stats.values())))
+    if server is not None:
+        inference_queues[0].put(None)
+        server.close()
+        print(format_stats(server.stats()))
 
 # 命令列入口，支援 --output 參數
 def parse_args():
     parser = argparse.ArgumentParser()
     now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    parser.add_argument("--output", type=str, default=f"mahjong_ai/data/selfplay_round_{now}.json",help="輸出訓練資料的檔案路徑")
-    return parser.parse_args()
+    parser.add_argument("--output", type=str, default=f"mahjong_ai/data/selfplay_round_{now}",help="輸出訓練資料的資料夾（分片格式）；以 .json 結尾則寫舊版 JSON")
+    parser.add_argument("--seed", type=int, default=None, help="牌山種子（不指定則隨機）")
+    parser.add_argument("--helper", choices=HELPER_BACKENDS, default=None, help="切牌建議的來源（預設依 MAHJONG_HELPER_BACKEND，未設定則為 helper）")
+    parser.add_argument("--policy", choices=action.POLICY_BACKENDS, default=None, help="推論模型來源（預設依 MAHJONG_POLICY_BACKEND，未設定則為 fp32；fp32 以外需先執行 export_policy.py）")
+    parser.add_argument("--policy_threads", type=int, default=None, help="推論的 intra-op 執行緒數（預設依 MAHJONG_POLICY_THREADS）")
+    parser.add_argument("--defer_rewards", action="store_true", help="對局中不呼叫 helper 算 reward，之後以 label_rewards.py 批次標註（僅分片格式）")
+    parser.add_argument("--games", type=int, default=NUM_GAMES, help="對局數")
+    parser.add_argument("--workers", type=int, default=1, help="平行 self-play 的行程數（大於 1 時僅分片格式）")
+    parser.add_argument("--tables", type=int, default=1, help="單一行程同時進行的牌桌數（大於 1 時決策湊成一批推論）")
+    parser.add_argument("--batched_inference", action="store_true", help="各 worker 的推論交給主行程批次處理（需 --workers 大於 1）")
+    parser.add_argument("--max_batch", type=int, default=DEFAULT_MAX_BATCH, help="批次推論一批的上限")
+    parser.add_argument("--max_latency_ms", type=float, default=DEFAULT_MAX_LATENCY_MS, help="批次推論最多等待的毫秒數")
+    args = parser.parse_args()
+    if args.defer_rewards and args.output.endswith(".json"):
+        parser.error("--defer_rewards 只支援分片格式輸出")
+    if args.workers > 1 and args.output.endswith(".json"):
+        parser.error("--workers 大於 1 時只支援分片格式輸出")
+    if args.tables > 1 and args.workers > 1:
+        parser.error("--tables 與 --workers 不能同時大於 1")
+    return args
 
 if __name__ == "__main__":
     args = parse_args()
-    simulate_selfplay(args.output)
+    set_helper_backend(args.helper)
+    action.set_policy_backend(args.policy)
+    action.set_policy_threads(args.policy_threads)
+    if args.workers > 1:
+        simulate_selfplay_parallel(args.output, args.seed, args.workers, args.games, args.defer_rewards,
+                                   args.batched_inference, args.max_batch, args.max_latency_ms)
+    elif args.tables > 1:
+        simulate_selfplay_vectorized(args.output, args.seed, args.tables, args.games, args.defer_rewards)
+    else:
+        simulate_selfplay(args.output, args.seed, args.defer_rewards, args.games)
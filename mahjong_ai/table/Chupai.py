@@ -12,7 +12,7 @@ if TYPE_CHECKING:
 
 def draw_phase(table: Table, player: Player) -> Tile:
     """
-    處理摸牌階段：
+    處理摸牌階段（generator，以 yield from 取得摸到的牌）：
     - 支援副露後跳過摸牌
     - 處理流局
     - 處理自摸和牌
@@ -49,8 +49,8 @@ def draw_phase(table: Table, player: Player) -> Tile:
         table.round_over = True
         return
     # 自摸
-    if can_tsumo(player, tile):
-        if ask_player_action(table, player, "tsumo", tile):
+    if can_tsumo(player, tile, table):
+        if (yield from ask_player_action(table, player, "tsumo", tile)):
             player.win_tile = tile
             table.winner = player
             player.is_tsumo = True
@@ -70,17 +70,17 @@ def draw_phase(table: Table, player: Player) -> Tile:
     # 暗槓
     ankan_tile = can_ankan(player)
     if ankan_tile != None:
-        if ask_player_action(table, player, "ankan", ankan_tile):
+        if (yield from ask_player_action(table, player, "ankan", ankan_tile)):
             make_ankan(table, player, ankan_tile)
             table.skip_discard = True
             table.current_turn = player.player_id
             return
     # 加槓
     if can_kakan(player, tile):
-        if not player.is_riichi and ask_player_action(table, player, "kakan", tile):
-            if try_chankan(table, tile, from_player_id=player.player_id):
+        if not player.is_riichi and (yield from ask_player_action(table, player, "kakan", tile)):
+            if (yield from try_chankan(table, tile, from_player_id=player.player_id)):
                 return  # 搶槓成功 → 本人無法加槓
-            make_kakan(table, player, tile)
+            yield from make_kakan(table, player, tile)
             table.skip_discard = True
             table.current_turn = player.player_id
             return
@@ -92,7 +92,7 @@ def draw_phase(table: Table, player: Player) -> Tile:
 
 def discard_phase(table: Table, tile: Tile) -> None:
     """
-    處理打牌階段：
+    處理打牌階段（generator）：
     - 加入河牌
     - 設定 last_discard_player
     - 檢查是否有其他玩家榮胡（含搶槓）
@@ -106,4 +106,4 @@ def discard_phase(table: Table, tile: Tile) -> None:
     print(f"玩家 {player.player_id} 打出：{tile}")
     table.last_discard_player_id = player.player_id
 
-    check_others_can_meld(table, tile, player.player_id)
\ No newline at end of file
+    yield from check_others_can_meld(table, tile, player.player_id)
\ No newline at end of file
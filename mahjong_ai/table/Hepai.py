@@ -3,40 +3,50 @@ from typing import TYPE_CHECKING
 # Mahjong 和牌邏輯整合模組（完整包裝）
 
 # TODO : 解決例外錯誤： negative shift count
-from mahjong.tile import TilesConverter
 from mahjong.hand_calculating.hand import HandCalculator
 from mahjong.hand_calculating.hand_config import HandConfig
-from mahjong.shanten import Shanten
 from mahjong.meld import Meld as MjMeld
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Table
 
-from mahjong_ai.table.tile import Tile
+from mahjong_ai.table.tile import Tile, AKA_34_IDS
 from mahjong_ai.table.meld import Meld, MeldType
 from mahjong_ai.table.hand import Hand
 from mahjong_ai.table.player import Player
+from mahjong_ai.table import shanten
 
 # === 和牌流程判定 ===
 
 # 手牌已有14張
 def can_ron(table: "Table", player: Player, win_tile: Tile) -> bool:
-    if player.furiten:
+    if player.furiten or not player.is_waiting_on(win_tile):
         return False
     return can_declare_win(player.hand.tiles, player.melds, win_tile)
 # 手牌有13張
 def can_ron_13(table: "Table", player: Player, win_tile: Tile) -> bool:
-    if player.furiten:
+    # 沒聽這張牌就不必跑役種計算
+    if player.furiten or not player.is_waiting_on(win_tile):
         return False
     temp_tiles = player.hand.tiles + [win_tile]
-    return can_declare_win(temp_tiles, player.melds, win_tile)
+    return can_declare_win(
+        temp_tiles, player.melds, win_tile, table, player,
+        is_tsumo=False, is_houtei=table.wall.is_empty(),
+    )
 # 手牌已有14張
-def can_tsumo(player: Player, drawn_tile: Tile) -> bool:
-    return can_declare_win(player.hand.tiles, player.melds, drawn_tile)
+def can_tsumo(player: Player, drawn_tile: Tile, table: Table = None) -> bool:
+    if not player.is_waiting_on(drawn_tile):
+        return False
+    if table is None:
+        return can_declare_win(player.hand.tiles, player.melds, drawn_tile)
+    return can_declare_win(
+        player.hand.tiles, player.melds, drawn_tile, table, player,
+        is_tsumo=True, is_haitei=table.wall.is_empty(), is_rinshan=table.rinshan_draw,
+    )
 # 手牌有13張
 def is_tenpai(tiles: list[Tile]) -> bool:
     tiles_34 = convert_tiles_to_34(tiles)
-    return Shanten().calculate_shanten(tiles_34) == 0
+    return shanten.calculate_shanten(tiles_34) == 0
 
 
 # === 和牌結算（主入口） ===
@@ -79,15 +89,25 @@ def settle_win(table: "Table") -> dict:
 
 # === 和牌核心分析 ===
 
-def can_declare_win(hand: list[Tile], melds: list[Meld], win_tile: Tile) -> bool:
+def can_declare_win(hand: list[Tile], melds: list[Meld], win_tile: Tile,
+                    table: Table = None, player: Player = None, **overrides) -> bool:
+    """
+    兩段式和牌判定：
+    1. 先用查表引擎確認手牌是完整和牌形，不是就直接回傳 False（絕大多數情況）
+    2. 和牌形才跑 HandCalculator 判定役種；有傳 table/player 時使用與結算相同的設定與寶牌，
+       結果會留在快取中，之後 evaluate_win 直接沿用
+    """
+    if not shanten.is_agari(convert_tiles_to_34(hand)):
+        return False
     try:
-        all_tiles = hand + [t for meld in melds for t in meld.tiles]
-        tiles_136 = convert_tiles_to_136(all_tiles)
-        win_tile_136 = convert_tile_to_136(win_tile)
-        result = HandCalculator().estimate_hand_value(
-            tiles_136, win_tile_136,
-            melds=convert_melds_to_mahjong(melds)
-        )
+        if table is None:
+            result = estimate_hand_value(hand, melds, win_tile)
+        else:
+            result = estimate_hand_value(
+                hand, melds, win_tile,
+                dora_tiles=get_dora_tiles(table),
+                config_flags=build_config_flags(table, player, **overrides),
+            )
         # if result.error:
             # print(f" 和牌計算錯誤：{result.error}")
         return result.error is None
@@ -95,37 +115,77 @@ def can_declare_win(hand: list[Tile], melds: list[Meld], win_tile: Tile) -> bool
         print(" 例外錯誤：", e)
         return False
 
-def evaluate_win(table: Table) -> dict:
-    winner = table.winner
-    all_tiles = winner.hand.tiles + [t for meld in winner.melds for t in meld.tiles]
-    tiles_136 = convert_tiles_to_136(all_tiles)
-    win_tile_136 = convert_tile_to_136(winner.win_tile)
-    dora_tiles = table.wall.open_dora_wall + table.wall.uradora_wall
-    dora_tiles_136 = convert_tiles_to_136(dora_tiles)
-
-    config = HandConfig(
-        kyoutaku_number =  table.round.kyotaku // 1000,
-        tsumi_number = table.round.honba,
-        is_tsumo = winner.is_tsumo,
-        is_riichi = winner.is_riichi,
-        player_wind = winner.seat_wind,
-        round_wind = winner.round_wind,
-        is_chankan = winner.is_chankan,
-        is_daburu_riichi = winner.is_daburu_riichi,
-        is_chiihou = winner.is_chiihou,
-        is_haitei = winner.is_haitei,
-        is_houtei = winner.is_houtei,
-        is_ippatsu = winner.is_ippatsu,
-        is_nagashi_mangan = winner.is_nagashi_mangan,
-        is_renhou = winner.is_renhou,
-        is_rinshan = winner.is_rinshan,
-        is_tenhou = winner.is_tenhou,
+# === HandCalculator 結果快取 ===
+# key 為（手牌、和了牌、副露、寶牌、設定）的正規化內容，同樣輸入只算一次
+_hand_value_cache: dict[tuple, object] = {}
+HAND_VALUE_CACHE_SIZE = 1024
+
+def _tile_key(tile: Tile) -> tuple[int, bool]:
+    return (tile.id34, tile.is_aka_dora)
+
+def estimate_hand_value(hand: list[Tile], melds: list[Meld], win_tile: Tile,
+                        dora_tiles: list[Tile] = None, config_flags: dict = None):
+    """
+    帶快取的 HandCalculator().estimate_hand_value。
+    """
+    key = (
+        tuple(sorted(_tile_key(t) for t in hand)),
+        _tile_key(win_tile) if win_tile else None,
+        tuple((m.meld_type.name, tuple(_tile_key(t) for t in m.tiles)) for m in melds),
+        tuple(_tile_key(t) for t in dora_tiles) if dora_tiles else (),
+        tuple(sorted(config_flags.items())) if config_flags else (),
     )
+    cached = _hand_value_cache.get(key)
+    if cached is not None:
+        return cached
+
+    all_tiles = hand + [t for meld in melds for t in meld.tiles]
     result = HandCalculator().estimate_hand_value(
-        tiles_136, win_tile_136,
-        dora_indicators=dora_tiles_136,
-        config=config,
-        melds = convert_melds_to_mahjong(winner.melds)
+        convert_tiles_to_136(all_tiles), convert_tile_to_136(win_tile) if win_tile else None,
+        melds=convert_melds_to_mahjong(melds),
+        dora_indicators=convert_tiles_to_136(dora_tiles) if dora_tiles else None,
+        config=HandConfig(**config_flags) if config_flags else None,
+    )
+    if len(_hand_value_cache) >= HAND_VALUE_CACHE_SIZE:
+        _hand_value_cache.clear()
+    _hand_value_cache[key] = result
+    return result
+
+def get_dora_tiles(table: Table) -> list[Tile]:
+    return table.wall.open_dora_wall + table.wall.uradora_wall
+
+def build_config_flags(table: Table, player: Player, **overrides) -> dict:
+    """
+    組出 HandConfig 的參數；overrides 用來在判定當下補上尚未寫回 player 的狀態（例如自摸、海底）。
+    """
+    flags = dict(
+        kyoutaku_number = table.round.kyotaku // 1000,
+        tsumi_number = table.round.honba,
+        is_tsumo = player.is_tsumo,
+        is_riichi = player.is_riichi,
+        player_wind = player.seat_wind,
+        round_wind = player.round_wind,
+        is_chankan = player.is_chankan,
+        is_daburu_riichi = player.is_daburu_riichi,
+        is_chiihou = player.is_chiihou,
+        is_haitei = player.is_haitei,
+        is_houtei = player.is_houtei,
+        is_ippatsu = player.is_ippatsu,
+        is_nagashi_mangan = player.is_nagashi_mangan,
+        is_renhou = player.is_renhou,
+        is_rinshan = player.is_rinshan,
+        is_tenhou = player.is_tenhou,
+    )
+    flags.update(overrides)
+    return flags
+
+def evaluate_win(table: Table) -> dict:
+    winner = table.winner
+    # 和牌判定時若已用相同設定算過，這裡會直接命中快取
+    result = estimate_hand_value(
+        winner.hand.tiles, winner.melds, winner.win_tile,
+        dora_tiles=get_dora_tiles(table),
+        config_flags=build_config_flags(table, winner),
     )
 
     if result.error:
@@ -143,29 +203,27 @@ def evaluate_win(table: Table) -> dict:
 
 def convert_tiles_to_136(tiles: list[Tile]) -> list[int]:
     """
-    將 Tile 物件轉為支援赤寶牌的 string_to_136_array 格式（r 或 0 表示紅5）
+    將 Tile 物件轉為 136 編號（與 string_to_136_array(has_aka_dora=True) 相同的分配方式）：
+    紅5 固定用該種第 0 張，其餘同種牌依出現順序分配不同複本（5 從第 1 張開始）。
     """
-    def encode_tile(t: Tile) -> str:
-        if t.tile_value == 5 and t.is_aka_dora:
-            return 'r'
-        return str(t.tile_value)
-
-    man = ''.join(encode_tile(t) for t in tiles if t.tile_type == 'man')
-    pin = ''.join(encode_tile(t) for t in tiles if t.tile_type == 'pin')
-    sou = ''.join(encode_tile(t) for t in tiles if t.tile_type == 'sou')
-    honors = ''.join(str(t.tile_value) for t in tiles if t.tile_type == 'honor')
-    result = TilesConverter.string_to_136_array(
-        man=man, pin=pin, sou=sou, honors=honors, has_aka_dora=True
-    )
+    used = [0] * 34
+    result = []
+    for t in tiles:
+        tid = t.id34
+        if t.is_aka_dora:
+            result.append(tid * 4)
+            continue
+        copy = used[tid] + (1 if tid in AKA_34_IDS else 0)
+        used[tid] += 1
+        result.append(tid * 4 + min(copy, 3))
     return result
 
 
 def convert_tiles_to_34(tiles: list[Tile]) -> list[int]:
-    man = ''.join(str(t.tile_value) for t in tiles if t.tile_type == 'man')
-    pin = ''.join(str(t.tile_value) for t in tiles if t.tile_type == 'pin')
-    sou = ''.join(str(t.tile_value) for t in tiles if t.tile_type == 'sou')
-    honors = ''.join(str(t.tile_value) for t in tiles if t.tile_type == 'honor')
-    return TilesConverter.string_to_34_array(man=man, pin=pin, sou=sou, honors=honors)
+    counts = [0] * 34
+    for t in tiles:
+        counts[t.id34] += 1
+    return counts
 
 def convert_tile_to_136(tile: Tile) -> int:
     return convert_tiles_to_136([tile])[0]
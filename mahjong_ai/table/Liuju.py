@@ -15,7 +15,7 @@ def check_tenpai_bonus(players: list[Player]) -> list[int]:
     流局時的聽牌與未聽牌點數加減，並回傳聽牌者的 player_id。
     """
     tenpai_players = [p for p in players if is_tenpai(p.hand.tiles)]
-    noten_players = [p for p in players if not is_tenpai(p.hand.tiles)]
+    noten_players = [p for p in players if p not in tenpai_players]
 
     print(f" 聽牌者: {[p.player_id for p in tenpai_players]}")
     print(f" 未聽牌者: {[p.player_id for p in noten_players]}")
@@ -71,7 +71,7 @@ def is_sufon_renda(players: list[Player]) -> bool:
     # 檢查是同一張風牌
     first_tile = first_discards[0]
     for t in first_discards:
-        if t.tile_type != first_tile.tile_type or t.tile_value != first_tile.tile_value:
+        if t.id34 != first_tile.id34:
             return False
     return True
 
@@ -82,4 +82,4 @@ def is_suucha_riichi(players: list[Player]) -> bool:
     return all(p.is_riichi for p in players)
 
 def is_suukantsu_draw(wall: Wall) -> bool:
-    return len(wall.rinshan_wall) == 0  
+    return wall.rinshan_remaining() == 0  
@@ -9,6 +9,7 @@ from mahjong_ai.table.tile import Tile
 from mahjong_ai.table.meld import Meld, MeldType
 from mahjong_ai.table.player import Player
 from mahjong_ai.table.Hepai import can_ron, can_ron_13
+from mahjong_ai.table.decision import Decision
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Table
@@ -16,32 +17,36 @@ if TYPE_CHECKING:
 # === 玩家行為詢問介面 ===
 def ask_player_action(table: Table, player: Player, action_type: str, tile: Tile, options: list = None) -> bool | list:
     """
-    詢問玩家是否要執行某個行動。
+    詢問玩家是否要執行某個行動（generator，呼叫端以 yield from 取得結果）。
     若 options 存在（如 Chi 有多組可吃），則應返回玩家選擇的組合。
+    依規則決定的行動，AI 玩家也會 yield 一個 Decision（default 為規則的答案），由 driver 回覆。
     """
     if (action_type == "discard") :
         return player.discard
     if (action_type == "pon") :
-        return player.pon(tile, table)
+        return (yield from player.pon(tile, table))
     if (action_type == "chi") :
-        return player.chi(tile, table)
+        return (yield from player.chi(tile, table))
     if (action_type == "daiminkan") :
-        return player.kan(tile, table, "daiminkan")
+        return (yield from player.kan(tile, table, "daiminkan"))
     """if (action_type == "ankan") :
         return player.kan(tile, table, "ankan")"""
     if (action_type == "kakan") :
-        return player.kan(tile, table, "kakan")
+        return (yield from player.kan(tile, table, "kakan"))
     if(action_type == "liuju"):
-        return False
-    if options == None:
-        return True
+        answer = False
+    elif options == None:
+        answer = True
     else:
-        return options[0]
+        answer = options[0]
+    if player.is_ai:
+        answer = yield Decision(table, player, action_type, tile, options=options, default=answer)
+    return answer
 
 # === 副露決策流程（吃碰槓和） ===
 def check_others_can_meld(table: Table, discarded_tile: Tile, from_player_id: int) -> List[Tuple[int, str]]:
     """
-    檢查這張牌是否有人要吃／碰／槓／榮和，依照優先順序處理
+    檢查這張牌是否有人要吃／碰／槓／榮和，依照優先順序處理（generator）
     """
     # 和牌
     for offset in range(1, 4):
@@ -49,7 +54,7 @@ def check_others_can_meld(table: Table, discarded_tile: Tile, from_player_id: in
         player = table.players[pid]
         # 榮和（搶先）
         if can_ron_13(table, player, discarded_tile):
-            if ask_player_action(table, player, "ron", discarded_tile):
+            if (yield from ask_player_action(table, player, "ron", discarded_tile)):
 
                 player.hand.add_tile(discarded_tile)
 
@@ -81,12 +86,12 @@ def check_others_can_meld(table: Table, discarded_tile: Tile, from_player_id: in
         player = table.players[pid]
 
         if not player.is_riichi and can_daiminkan(player, discarded_tile):
-            if ask_player_action(table, player, "daiminkan", discarded_tile):
+            if (yield from ask_player_action(table, player, "daiminkan", discarded_tile)):
                 make_daiminkan(table, player, discarded_tile, from_player_id)
                 return [(player.player_id, "daiminkan")]
 
         if not player.is_riichi and can_pon(player, discarded_tile):
-            if ask_player_action(table, player, "pon", discarded_tile):
+            if (yield from ask_player_action(table, player, "pon", discarded_tile)):
                 make_pon(table, player, discarded_tile, from_player_id)
                 return [(player.player_id, "pon")]
 
@@ -95,8 +100,8 @@ def check_others_can_meld(table: Table, discarded_tile: Tile, from_player_id: in
     player = table.players[pid]
     chi_sets = can_chi_sets(player, discarded_tile)
     if not player.is_riichi and chi_sets:
-        if (ask_player_action(table, player, "chi", discarded_tile, chi_sets)):
-            chosen_set = ask_player_action(table, player, "chi", discarded_tile, chi_sets)
+        if (yield from ask_player_action(table, player, "chi", discarded_tile, chi_sets)):
+            chosen_set = yield from ask_player_action(table, player, "chi", discarded_tile, chi_sets)
             if chosen_set:
                 make_chi(table, player, discarded_tile, from_player_id, chosen_set)
                 return [(player.player_id, "chi")]
@@ -104,11 +109,12 @@ def check_others_can_meld(table: Table, discarded_tile: Tile, from_player_id: in
 
 # === 搶槓判定 ===
 def try_chankan(table: Table, tile: Tile, from_player_id: int) -> bool:
+    # generator，呼叫端以 yield from 取得是否搶槓成功
     for offset in range(1, 4):
         pid = (from_player_id + offset) % 4
         player = table.players[pid]
         if can_ron_13(table, player, tile):
-            if ask_player_action(table, player, "chankan", tile):
+            if (yield from ask_player_action(table, player, "chankan", tile)):
                 player.hand.add_tile(tile)
                 table.winner = player
                 table.last_discard_player_id = from_player_id
@@ -120,19 +126,20 @@ def try_chankan(table: Table, tile: Tile, from_player_id: int) -> bool:
 
 # === 可行動檢查 ===
 def can_pon(player: Player, tile: Tile) -> bool:
-    return sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) >= 2
+    return player.hand.count(tile) >= 2
 
 def can_chi_sets(player: Player, tile: Tile) -> list[list[int]]:
-    if tile.tile_type not in ['man', 'pin', 'sou']:
+    tid = tile.id34
+    if tid >= 27:
         return []
     n = tile.tile_value
-    vals = [t.tile_value for t in player.hand.tiles if t.tile_type == tile.tile_type]
+    counts = player.hand.counts
     sets = []
-    if n - 2 in vals and n - 1 in vals:
+    if n >= 3 and counts[tid - 2] and counts[tid - 1]:
         sets.append([n - 2, n - 1, n])
-    if n - 1 in vals and n + 1 in vals:
+    if 2 <= n <= 8 and counts[tid - 1] and counts[tid + 1]:
         sets.append([n - 1, n, n + 1])
-    if n + 1 in vals and n + 2 in vals:
+    if n <= 7 and counts[tid + 1] and counts[tid + 2]:
         sets.append([n, n + 1, n + 2])
     return sets
 
@@ -142,8 +149,8 @@ def can_kakan(player: Player, tile: Tile) -> bool:
     """
     for meld in player.melds:
         # 有這張 tile 的碰
-        if meld.meld_type == MeldType.PON and meld.tiles[0].is_same_tile(tile):
-            if sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) >= 1:
+        if meld.meld_type == MeldType.PON and meld.tiles[0].id34 == tile.id34:
+            if player.hand.count(tile) >= 1:
                 return True
     return False
 
@@ -151,27 +158,28 @@ def can_ankan(player: Player) -> Tile | None:
     """
     回傳可暗槓的牌（四張相同牌）或 None
     """
-    tile_counts = {}
-    for tile in player.hand.tiles:
-        key = (tile.tile_type, tile.tile_value)
-        tile_counts[key] = tile_counts.get(key, 0) + 1
-    for (t_type, t_val), count in tile_counts.items():
-        if count == 4:
-            return Tile(t_type, t_val)
+    counts = player.hand.counts
+    for tid in range(34):
+        if counts[tid] == 4:
+            return Tile.from_34_id(tid)
     return None
 
 def can_daiminkan(player: Player, tile: Tile) -> bool:
     """
     判斷是否可以大明槓（手牌中有 3 張來碰外來第 4 張）
     """
-    return sum(1 for t in player.hand.tiles if t.is_same_tile(tile)) >= 3
+    return player.hand.count(tile) >= 3
 
 # === 實際鳴牌動作 ===
 def make_pon(table: Table, player: Player, tile: Tile, from_player_id: int) -> None:
-    to_use = [t for t in player.hand.tiles if t.is_same_tile(tile)][:2]
+    tid = tile.id34
+    to_use = [t for t in player.hand.tiles if t.id34 == tid][:2]
     for t in to_use:
         player.hand.remove_tile(t)
     meld = Meld([tile] + to_use, MeldType.PON, from_player_id)
+    # 被鳴走的牌在牌河標記起來（Table.visible_counts 改算在副露裡）
+    river = table.players[from_player_id].river
+    river.call_tile(len(river.discarded_tiles) - 1)
     player.melds.append(meld)
     # 換人出牌
     table.current_turn = player.player_id
@@ -185,16 +193,21 @@ def make_chi(table: Table, player: Player, tile: Tile, from_player_id: int, chos
     使用指定順子組合 chosen 進行吃牌
     """
     used = []
+    suit_base = tile.id34 - tile.tile_value + 1
     for v in chosen:
         if v == tile.tile_value:
             continue
+        tid = suit_base + v - 1
         for t in player.hand.tiles:
-            if t.tile_type == tile.tile_type and t.tile_value == v:
+            if t.id34 == tid:
                 used.append(t)
                 break
     for t in used:
         player.hand.remove_tile(t)
     meld = Meld([Tile(tile.tile_type, v) for v in chosen], MeldType.CHII, from_player_id)
+    # 被鳴走的牌在牌河標記起來（Table.visible_counts 改算在副露裡）
+    river = table.players[from_player_id].river
+    river.call_tile(len(river.discarded_tiles) - 1)
     player.melds.append(meld)
     table.current_turn = player.player_id
     table.skip_draw = True
@@ -204,46 +217,46 @@ def make_chi(table: Table, player: Player, tile: Tile, from_player_id: int, chos
 
 def make_kakan(table: Table, player: Player, tile: Tile) -> None:
     """
-    將碰轉為加槓，移除手牌並加入第四張到原 meld
+    將碰轉為加槓，移除手牌並加入第四張到原 meld（generator，先問搶槓）
     """
-    if try_chankan(table, tile, from_player_id=player.player_id):
+    if (yield from try_chankan(table, tile, from_player_id=player.player_id)):
         return  # 搶槓成功 → 本人無法加槓
     for meld in player.melds:
-        if meld.meld_type == MeldType.PON and meld.tiles[0].is_same_tile(tile):
-            player.hand.remove_tile(next(t for t in player.hand.tiles if t.is_same_tile(tile)))
+        if meld.meld_type == MeldType.PON and meld.tiles[0].id34 == tile.id34:
+            player.hand.remove_tile(tile)
             meld.tiles.append(tile)
             meld.meld_type = MeldType.KAKAN
             table.rinshan_draw = True
+            player.update_waits()
             break
 
 def make_ankan(table: Table, player: Player, tile: Tile) -> None:
     """
     暗槓（從手牌移除 4 張、加入副露）
     """
-    removed = 0
-    for tile_ in list(player.hand.tiles):
-        if tile_.is_same_tile(tile):
-            player.hand.remove_tile(tile_)
-            removed += 1
-        if removed == 4:
-            break
+    tid = tile.id34
+    removed = [t for t in player.hand.tiles if t.id34 == tid][:4]
+    for tile_ in removed:
+        player.hand.remove_tile(tile_)
     meld = Meld([tile] * 4, MeldType.ANKAN, from_player_id=player.player_id)
     player.melds.append(meld)
+    player.update_waits()
     table.rinshan_draw = True
 
 def make_daiminkan(table: Table, player: Player, tile: Tile, from_player_id: int) -> None:
     """
     大明槓（從手牌移除三張，加入 1 張來源牌建立槓）
     """
-    removed = 0
-    for tile_ in list(player.hand.tiles):
-        if tile_.is_same_tile(tile):
-            player.hand.remove_tile(tile_)
-            removed += 1
-        if removed == 3:
-            break
+    tid = tile.id34
+    removed = [t for t in player.hand.tiles if t.id34 == tid][:3]
+    for tile_ in removed:
+        player.hand.remove_tile(tile_)
     meld = Meld([tile] * 4, MeldType.DAIMINKAN, from_player_id=from_player_id)
+    # 被鳴走的牌在牌河標記起來（Table.visible_counts 改算在副露裡）
+    river = table.players[from_player_id].river
+    river.call_tile(len(river.discarded_tiles) - 1)
     player.melds.append(meld)
+    player.update_waits()
     table.rinshan_draw = True
     table.current_turn = player.player_id
     table.skip_draw = False
@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Iterable
+# mahjong_ai/table/decision.py - 牌局中等待 AI 決定的地方（Decision），以及驅動牌局 generator 的函式
+#
+# Table.play() 是 generator：每遇到 AI 玩家要做決定（出牌、吃碰槓、立直、榮和／自摸、九種九牌…）
+# 就 yield 一個 Decision，外部（driver）以 generator.send(答案) 回覆後牌局才繼續。
+# 因此一個行程可以同時推進多個牌桌，把它們的決策湊成一批推論（見 drive_tables）。
+
+from mahjong_ai.table.encode_obs import encode_obs_v2
+from mahjong_ai.reward import evaluate_action_reward, reward_query
+
+if TYPE_CHECKING:
+    from mahjong_ai.table.table import Table
+    from mahjong_ai.table.player import Player
+    from mahjong_ai.table.tile import Tile
+
+# 需要模型決定的種類：答案是 action 編號（0~45）
+MODEL_KINDS = ("discard", "chi", "pon", "daiminkan", "kakan")
+# 依規則決定的種類：答案是 ask_player_action 的回傳值（bool 或選項之一），預設答案放在 default
+RULE_KINDS = ("ron", "chankan", "tsumo", "ankan", "riichi", "liuju")
+
+
+class Decision:
+    """
+    一個等待回答的決策。
+    - kind: MODEL_KINDS 或 RULE_KINDS 之一
+    - tile: 相關的牌（被打出的牌、摸到的牌…），出牌時為 None
+    - action_types: 需要模型時傳給 encode_obs_v2 的動作種類；依規則決定時為 None
+    - options: 可選的選項（如立直可打的牌），default: 規則的預設答案
+    """
+    __slots__ = ('table', 'player', 'kind', 'tile', 'action_types', 'options', 'default', 'reward', '_encoded')
+
+    def __init__(self, table: Table, player: Player, kind: str, tile: Tile | None,
+                 action_types: set[str] | None = None, options: list | None = None, default=None):
+        self.table = table
+        self.player = player
+        self.kind = kind
+        self.tile = tile
+        self.action_types = action_types
+        self.options = options
+        self.default = default
+        self.reward = None   # record() 後為這一步的 reward
+        self._encoded = None
+
+    @property
+    def needs_model(self) -> bool:
+        return self.action_types is not None
+
+    def encode(self):
+        """
+        obs, mask（encode_obs_v2 的結果）；牌局停在這個決策上，只算一次。
+        """
+        if self._encoded is None:
+            self._encoded = encode_obs_v2(self.table, self.action_types)
+        return self._encoded
+
+    def encode_into(self, obs, mask) -> None:
+        """
+        把 obs/mask 寫進給定的陣列（如 VecEnv 預先配置的批次），之後 encode() 直接回傳這兩個陣列。
+        """
+        self._encoded = encode_obs_v2(self.table, self.action_types, out=(obs, mask))
+
+    def record(self, action: int, buffer):
+        """
+        模型的決定回來後計算 reward，並把這一步寫進 buffer（None 則不記錄）；回傳 reward。
+        """
+        if buffer is not None and buffer.defer_rewards:
+            # 需要 helper 的 reward 只記下查詢（RewardQuery），對局後由 label_rewards.py 批次標註
+            reward = reward_query(self.table, action, self.tile)
+        else:
+            reward = float(evaluate_action_reward(self.table, action, self.tile))   # 確保不是 np.float32
+
+        self.reward = reward
+        if buffer is not None:
+            obs, mask = self.encode()
+            buffer.push({
+                "obs": obs,                # [942, 34] ndarray，由 ReplayBuffer 轉成緊湊格式
+                "mask": mask,              # [46] ndarray
+                "action": int(action),     # 確保不是 np.int64
+                "reward": reward,
+            })
+        return reward
+
+    def __repr__(self):
+        return f"Decision({self.kind}, player={self.player.player_id if self.player else None}, tile={self.tile})"
+
+
+def resume(game, answer=None) -> Decision | None:
+    """
+    把答案送回牌局 generator，回傳下一個 Decision；牌局結束則回傳 None。
+    """
+    try:
+        return game.send(answer)
+    except StopIteration:
+        return None
+
+
+def run_to_end(game, answer: Callable[[Decision], object]) -> None:
+    """
+    逐一以 answer(decision) 回答，直到牌局結束（單一牌桌的同步 driver）。
+    """
+    decision = resume(game)
+    while decision is not None:
+        decision = resume(game, answer(decision))
+
+
+def drive_tables(games: Iterable, answer_batch: Callable[[list[Decision]], list], num_tables: int):
+    """
+    同時推進最多 num_tables 個牌局：每一輪把所有牌桌停住的 Decision 一起交給 answer_batch
+    （一次批次推論），再分別送回。games 是 (key, 牌局 generator) 的序列，一個牌局結束就補上下一個；
+    每結束一局 yield 它的 key。
+    """
+    games = iter(games)
+    pending = []   # [(key, game, decision)]
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < num_tables:
+            item = next(games, None)
+            if item is None:
+                exhausted = True
+                break
+            key, game = item
+            decision = resume(game)
+            if decision is None:
+                yield key
+            else:
+                pending.append((key, game, decision))
+        if not pending:
+            return
+        answers = answer_batch([decision for _, _, decision in pending])
+        waiting = []
+        for (key, game, _), answer in zip(pending, answers):
+            decision = resume(game, answer)
+            if decision is None:
+                yield key
+            else:
+                waiting.append((key, game, decision))
+        pending = waiting
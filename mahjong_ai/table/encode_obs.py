@@ -1,56 +1,92 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Tuple
 import numpy as np
-from mahjong.shanten import Shanten
-from mahjong.agari import Agari
+from mahjong_ai.table.shanten import get_shanten_and_waits
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Table
 
+OBS_SHAPE_V2 = (942, 34)
+ACTION_DIM = 46
+
+# === Constants for obs row base ===
+ROW_HAND = 0
+ROW_SELF_RIVER = 10
+ROW_OTHERS_RIVER = 100
+ROW_SELF_MELDS = 200
+ROW_OTHERS_MELDS = 220
+ROW_POINTS = 300
+ROW_SEAT_WIND = 310
+ROW_DEALER = 315
+ROW_SITUATION = 320
+ROW_DORA = 330
+ROW_STATUS = 340
+ROW_WAITS = 900
+ROW_SHANTEN = 930
+
+# obs 中只有這幾列的第 0 欄是連續值（分數、本場、供託、剩餘張數），其餘都是 0~4 的整數
+SCALAR_ROWS = (300, 301, 302, 303, 320, 321, 322)
+
+# 只有 0/1 的列（牌河、副露、風位、莊家、寶牌、狀態、聽牌、向聽），其餘列永遠是 0
+FLAG_ROWS = (
+    tuple(range(ROW_SELF_RIVER, ROW_SELF_RIVER + 18))
+    + tuple(range(ROW_OTHERS_RIVER, ROW_OTHERS_RIVER + 3 * 18))
+    + tuple(range(ROW_SELF_MELDS, ROW_SELF_MELDS + 4))
+    + tuple(range(ROW_OTHERS_MELDS, ROW_OTHERS_MELDS + 3 * 4))
+    + tuple(range(ROW_SEAT_WIND, ROW_SEAT_WIND + 4))
+    + tuple(range(ROW_DEALER, ROW_DEALER + 4))
+    + tuple(range(ROW_DORA, ROW_DORA + 5))
+    + (ROW_STATUS, ROW_STATUS + 1, ROW_WAITS)
+    + tuple(range(ROW_SHANTEN - 1, ROW_SHANTEN + 6))
+)
+FLAG_BYTES = (len(FLAG_ROWS) * OBS_SHAPE_V2[1] + 7) // 8
+
+
 # =======================
-# Utils: 計算向聽數與聽牌
+# 緊湊格式：手牌張數 uint8[34] + 0/1 列壓成位元 uint8[FLAG_BYTES] + 連續值 float32[len(SCALAR_ROWS)]
+# （約 0.5 KB，原本 float32 的 obs 為 128 KB）
 # =======================
-def get_shanten_and_waits(tiles_34: list[int]) -> Tuple[int, list[int]]:
-    shanten_calc = Shanten()
-    agari = Agari()
-    shanten = shanten_calc.calculate_shanten(tiles_34)
-    waits = []
-    for tid in range(34):
-        tiles_34[tid] += 1
-        if agari.is_agari(tiles_34):
-            waits.append(tid)
-        tiles_34[tid] -= 1
-    return shanten, waits
+def compress_obs(obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    encode_obs_v2 的 obs（可有前置的 batch 維度）→ (hand, flags, scalars)。
+    只保留上面列出的列；其他列的內容會被捨棄，FLAG_ROWS 的非 0 值一律視為 1。
+    """
+    obs = np.asarray(obs)
+    batch_shape = obs.shape[:-2]
+    hand = obs[..., ROW_HAND, :].astype(np.uint8)
+    flags = np.packbits(obs[..., FLAG_ROWS, :].reshape(*batch_shape, -1) != 0, axis=-1)
+    scalars = obs[..., SCALAR_ROWS, 0].astype(np.float32)
+    return hand, flags, scalars
+
+
+def expand_obs(hand: np.ndarray, flags: np.ndarray, scalars: np.ndarray) -> np.ndarray:
+    """
+    compress_obs 的反向：還原成 float32 的 obs（OBS_SHAPE_V2，可有前置的 batch 維度）。
+    """
+    batch_shape = hand.shape[:-1]
+    obs = np.zeros((*batch_shape, *OBS_SHAPE_V2), dtype=np.float32)
+    obs[..., ROW_HAND, :] = hand
+    bits = np.unpackbits(flags, axis=-1, count=len(FLAG_ROWS) * OBS_SHAPE_V2[1])
+    obs[..., FLAG_ROWS, :] = bits.reshape(*batch_shape, len(FLAG_ROWS), OBS_SHAPE_V2[1])
+    obs[..., SCALAR_ROWS, 0] = scalars
+    return obs
 
 # =======================
 # 主函數: encode_obs_v2
 # =======================
-def encode_obs_v2(table: Table, action_types: set[str]) -> Tuple[np.ndarray, np.ndarray]:
-    obs = np.zeros((942, 34), dtype=np.float32)
-    mask = np.zeros((46,), dtype=bool)
+def encode_obs_v2(table: Table, action_types: set[str], out: Tuple[np.ndarray, np.ndarray] | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    # out=(obs, mask)：直接寫進給定的陣列（例如預先配置好的批次中的一列），不另外配置
+    if out is None:
+        obs = np.zeros(OBS_SHAPE_V2, dtype=np.float32)
+        mask = np.zeros((ACTION_DIM,), dtype=bool)
+    else:
+        obs, mask = out
+        obs.fill(0.0)
     seat = next(i for i, p in enumerate(table.players) if p.is_ai)
 
-    # === Constants for obs row base ===
-    ROW_HAND = 0
-    ROW_SELF_RIVER = 10
-    ROW_OTHERS_RIVER = 100
-    ROW_SELF_MELDS = 200
-    ROW_OTHERS_MELDS = 220
-    ROW_POINTS = 300
-    ROW_SEAT_WIND = 310
-    ROW_DEALER = 315
-    ROW_SITUATION = 320
-    ROW_DORA = 330
-    ROW_STATUS = 340
-    ROW_WAITS = 900
-    ROW_SHANTEN = 930
-
     # === 1. 手牌 ===
-    hand_34 = [0] * 34
-    for tile in table.players[seat].hand.tiles:
-        tid = tile.to_34_id()
-        obs[ROW_HAND][tid] += 1.0
-        hand_34[tid] += 1
+    hand_34 = table.players[seat].hand.counts
+    obs[ROW_HAND] = hand_34
 
     # === 2. 向聽與聽牌 ===
     shanten, waits = get_shanten_and_waits(hand_34)
@@ -61,7 +97,7 @@ def encode_obs_v2(table: Table, action_types: set[str]) -> Tuple[np.ndarray, np.
 
     # === 3. 自家牌河（最多18張） ===
     for i, discard in enumerate(table.players[seat].river.discarded_tiles[-18:]):
-        tid = discard.tile.to_34_id()
+        tid = discard.tile.id34
         obs[ROW_SELF_RIVER + i][tid] = 1.0
 
     # === 4. 他家牌河（3家） ===
@@ -70,13 +106,13 @@ def encode_obs_v2(table: Table, action_types: set[str]) -> Tuple[np.ndarray, np.
             continue
         offset = other_seat - 1 if other_seat > seat else other_seat
         for i, discard in enumerate(table.players[other_seat].river.discarded_tiles[-18:]):
-            tid = discard.tile.to_34_id()
+            tid = discard.tile.id34
             obs[ROW_OTHERS_RIVER + offset * 18 + i][tid] = 1.0
 
     # === 5. 副露資訊 ===
     for i, meld in enumerate(table.players[seat].melds[:4]):
         for tile in meld.tiles:
-            tid = tile.to_34_id()
+            tid = tile.id34
             obs[ROW_SELF_MELDS + i][tid] = 1.0
 
     for other_seat in range(4):
@@ -85,7 +121,7 @@ def encode_obs_v2(table: Table, action_types: set[str]) -> Tuple[np.ndarray, np.
         offset = other_seat - 1 if other_seat > seat else other_seat
         for i, meld in enumerate(table.players[other_seat].melds[:4]):
             for tile in meld.tiles:
-                tid = tile.to_34_id()
+                tid = tile.id34
                 obs[ROW_OTHERS_MELDS + offset * 4 + i][tid] = 1.0
 
     # === 6. 分數、風位、場況 ===
@@ -100,7 +136,7 @@ def encode_obs_v2(table: Table, action_types: set[str]) -> Tuple[np.ndarray, np.
 
     # === 7. 寶牌 ===
     for i, tile in enumerate(table.wall.open_dora_wall[:5]):
-        tid = tile.to_34_id()
+        tid = tile.id34
         obs[ROW_DORA + i][tid] = 1.0
 
     # === 8. 狀態：振聽 / 立直 ===
@@ -110,7 +146,7 @@ def encode_obs_v2(table: Table, action_types: set[str]) -> Tuple[np.ndarray, np.
         obs[ROW_STATUS + 1][0] = 1.0
 
     # === 9. 動作 mask ===
-    hand_counts = table.players[seat].hand.to_counts_34()
+    hand_counts = table.players[seat].hand.counts
     legal_discards = [i for i, count in enumerate(hand_counts) if count > 0]
     legal_actions = {
         "discard": legal_discards if "discard" in action_types else [],
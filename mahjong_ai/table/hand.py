@@ -1,65 +1,125 @@
 # mahjong_ai/core/hand.py
 
-from mahjong_ai.table.tile import Tile
+from mahjong_ai.table.tile import Tile, AKA_34_IDS
+
+
+def _make_runs(tid: int) -> list[tuple[Tile, ...]]:
+    # 同種非紅牌 0~4 張時使用的實例（5 從第 1 張複本開始）
+    first = 1 if tid in AKA_34_IDS else 0
+    return [tuple(Tile.from_136_id(tid * 4 + min(first + i, 3)) for i in range(n)) for n in range(5)]
+
+
+_RUNS = [_make_runs(tid) for tid in range(34)]
+
 
 class Hand:
+    """
+    手牌以 34 格數量陣列加上紅 5 張數保存，摸打都是 O(1)；
+    排好序的 Tile 列表只在需要時（顯示、helper 字串、逐張走訪）才產生並快取。
+    """
+
     def __init__(self):
         """
-        初始化一個空手牌列表。
+        初始化一副空手牌。
         """
-        self.tiles: list[Tile] = []
+        self.counts: list[int] = [0] * 34   # 每種牌的張數（外部請視為唯讀）
+        self.aka: list[int] = [0, 0, 0]     # 手中紅5萬 / 紅5筒 / 紅5索 的張數
+        self._tiles: list[Tile] | None = []  # 排序後的 Tile 快取，None 表示需要重建
+
+    @property
+    def tiles(self) -> list[Tile]:
+        """
+        依照 萬 < 筒 < 索 < 字、數字升冪排列的 Tile 列表（同種的紅5排在前面）。
+        回傳的是快取，請勿直接修改；要改手牌請用 add_tile / remove_tile 或整組指定。
+        """
+        if self._tiles is None:
+            self._tiles = self._build_tiles()
+        return self._tiles
+
+    @tiles.setter
+    def tiles(self, tiles: list[Tile]) -> None:
+        """
+        直接指定整副手牌（例如虛擬牌桌、測試用）。
+        """
+        self.counts = [0] * 34
+        self.aka = [0, 0, 0]
+        for tile in tiles:
+            self.counts[tile.id34] += 1
+            if tile.is_aka_dora:
+                self.aka[tile.id34 // 9] += 1
+        self._tiles = None
+
+    def _build_tiles(self) -> list[Tile]:
+        tiles = []
+        aka = self.aka
+        for tid, count in enumerate(self.counts):
+            if not count:
+                continue
+            if tid in AKA_34_IDS and aka[tid // 9]:
+                n_aka = aka[tid // 9]
+                tiles.append(Tile.from_136_id(tid * 4))
+                tiles.extend(_RUNS[tid][count - n_aka])
+            else:
+                tiles.extend(_RUNS[tid][count])
+        return tiles
 
     def add_tile(self, tile: Tile) -> None:
         """
-        把一張牌加入手牌中，並自動排序。
+        把一張牌加入手牌中。
         一般在摸牌或起始牌時使用。
         """
-        self.tiles.append(tile)
-        self.sort_hand()
+        self.counts[tile.id34] += 1
+        if tile.is_aka_dora:
+            self.aka[tile.id34 // 9] += 1
+        self._tiles = None
 
     def remove_tile(self, tile: Tile) -> bool:
         """
         移除一張手牌中與指定 tile 相同的牌（僅移除一張）
+        指定紅5時優先移除紅5，否則優先移除非紅的同種牌。
         回傳 True 表示成功移除，False 表示未找到。
         """
-        for existing_tile in self.tiles:
-            if existing_tile.is_same_tile(tile) and existing_tile.is_aka_dora == tile.is_aka_dora:
-                self.tiles.remove(existing_tile)
-                return True
-            if existing_tile.is_same_tile(tile) and not existing_tile.is_aka_dora:
-                self.tiles.remove(existing_tile)
-                return True
-            if existing_tile.is_same_tile(tile):
-                self.tiles.remove(existing_tile)
-                return True
-        return False
+        tid = tile.id34
+        count = self.counts[tid]
+        if not count:
+            return False
+        if tid in AKA_34_IDS:
+            suit = tid // 9
+            aka = self.aka[suit]
+            if aka and (tile.is_aka_dora or count == aka):
+                self.aka[suit] = aka - 1
+        self.counts[tid] = count - 1
+        self._tiles = None
+        return True
+
+    def count(self, tile: Tile) -> int:
+        """
+        手中與指定 tile 牌面相同的張數。
+        """
+        return self.counts[tile.id34]
 
     def sort_hand(self) -> None:
         """
         將手牌依照花色與數值排序：
         萬 < 筒 < 索 < 字，數字升冪
+        （tiles 一律依序產生，保留此方法僅為相容舊呼叫）
         """
-        def tile_sort_key(tile: Tile):
-            type_order = {'man': 0, 'pin': 1, 'sou': 2, 'honor': 3}
-            return (type_order.get(tile.tile_type, 4), tile.tile_value)
-        
-        self.tiles.sort(key=tile_sort_key)
 
     def to_helper_list(self) -> list[str]:
         """
         轉換整副手牌為簡易字串格式列表，例如：['1m', '2m', '9z']
         """
-        return [tile.to_helper_string() for tile in self.tiles]
+        return [tile.helper_string for tile in self.tiles]
 
     def to_counts_34(self) -> list[int]:
         """
-        轉換成 mahjong 套件需要的 34 張 tile 數量列表。
+        轉換成 mahjong 套件需要的 34 張 tile 數量列表（複本，可自由修改）。
         例如：[2, 1, 0, ..., 0] 表示有兩張 1m，一張 2m，其餘為 0。
         """
-        counts = [0] * 34
-        for tile in self.tiles:
-            counts[tile.to_34_id()] += 1
-        return counts
+        return self.counts.copy()
+
+    def __len__(self) -> int:
+        return sum(self.counts)
 
     def __str__(self):
         """
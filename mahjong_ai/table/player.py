@@ -11,8 +11,8 @@ from mahjong_ai.table.wall import Wall
 from mahjong_ai.table.river import River
 from mahjong_ai.table.meld import Meld
 from mahjong_ai.utils.helper_interface import call_mahjong_helper, choose_best_discard_from_output, choose_discard_by_points
-from mahjong_ai.action import ai_decide_action
-from mahjong.agari import Agari
+from mahjong_ai.table.decision import Decision
+from mahjong_ai.table import shanten
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Table  # 僅供型別檢查工具使用，不會在執行時引入
@@ -33,6 +33,7 @@ class Player:
 
         self.furiten = False             # 玩家是否振聽
         self.furiten_temp = -1
+        self.wait_mask = 0               # 聽牌的 34-bit 遮罩（手牌為 3n+1 張時更新）
         self.win_tile: Tile = None       # 完成和牌的牌
 
         self.seat_wind = player_id       # 座風（0=東, 1=南, 2=西, 3=北）
@@ -62,6 +63,7 @@ class Player:
         self.melds = []
         self.furiten = False
         self.furiten_temp = -1
+        self.wait_mask = 0
         self.riichi_turn = -1
 
         self.round_wind = 0
@@ -109,24 +111,28 @@ class Player:
         success = self.hand.remove_tile(tile)
         if success:
             self.river.add_discard(tile)
+            self.update_waits()
             self.update_furiten()
         return success
 
+    def update_waits(self):
+        """
+        手牌變成 3n+1 張（配牌、打牌、槓）時重算聽牌遮罩。
+        摸牌後的 14 張不重算，遮罩仍代表摸牌前聽哪些牌，正好拿來判定自摸。
+        """
+        self.wait_mask = shanten.get_wait_mask(self.hand.counts)
+
+    def is_waiting_on(self, tile: Tile) -> bool:
+        """
+        是否聽這張牌（位元判定）。
+        """
+        return bool(self.wait_mask >> tile.id34 & 1)
+
     def update_furiten(self):
         """
         若打過的牌出現在任何一種可能胡牌的情境中，則進入振聽。
         """
-        agari = Agari()
-        tiles = self.hand.to_counts_34()
-        for i in range(34):
-            tiles[i] += 1
-            if agari.is_agari(tiles):
-                for t in self.river.discarded_tiles:
-                    if t.tile.to_34_id() == i:
-                        self.furiten = True
-                        return
-            tiles[i] -= 1
-        self.furiten = False
+        self.furiten = bool(self.wait_mask & self.river.tile_mask)
 
     def add_meld(self, meld: Meld) -> None:
         """
@@ -138,60 +144,45 @@ class Player:
         """
         判斷手牌中是否存在三張相同的役牌（中、發、白、自風、場風）。
         """
-        from collections import Counter
-
-        # 定義風牌對照表：seat_wind 和 round_wind 轉換成 tile_value
-        wind_map = {0: 1, 1: 2, 2: 3, 3: 4}
-        yaku_values = {5, 6, 7}  # 白=5, 發=6, 中=7
-        yaku_values.add(wind_map.get(self.seat_wind))
-        yaku_values.add(wind_map.get(self.round_wind))
-
-        # 統計役牌在手牌中的數量
-        counter = Counter()
-        for tile in self.hand.tiles:
-            if tile.tile_type == 'honor' and tile.tile_value in yaku_values:
-                counter[(tile.tile_type, tile.tile_value)] += 1
-
-        # 檢查是否有任一種牌數量達到 3 張
-        return any(count >= 3 for count in counter.values())
+        # 役牌的 34 編號：白=31, 發=32, 中=33，自風與場風為 27 + 風位（東=27）
+        counts = self.hand.counts
+        yaku_ids = {31, 32, 33, 27 + self.seat_wind, 27 + self.round_wind}
+
+        # 檢查是否有任一種役牌數量達到 3 張
+        return any(counts[tid] >= 3 for tid in yaku_ids)
     
     def get_available_chi_types(self, tile: Tile) -> set[str]:
         """
         根據手牌與目標 tile，推斷可行的吃法種類
         回傳值例：{"chi_low", "chi_mid"}
         """
+        # 保留改寫前的結果：tile_type 是 'man' / 'pin' / 'sou'，這個判斷永遠成立，AI 不會被問要不要吃
+        # （改成以 id34 判斷會改變規則，另案處理）
         if tile.tile_type not in {"m", "p", "s"}:
             return set()  # 字牌不能吃
+        tid = tile.id34
 
         val = tile.tile_value
-        suit = tile.tile_type
-        hand_ids = [t.to_34_id() for t in self.hand.tiles]
+        counts = self.hand.counts
 
         result = set()
-        
+
         # chi_low = tile 是第一張（如 3-4）
-        if 1 <= val <= 7:
-            tid1 = Tile(suit, val + 1).to_34_id()
-            tid2 = Tile(suit, val + 2).to_34_id()
-            if hand_ids.count(tid1) >= 1 and hand_ids.count(tid2) >= 1:
-                result.add("chi_low")
+        if 1 <= val <= 7 and counts[tid + 1] and counts[tid + 2]:
+            result.add("chi_low")
 
         # chi_mid = tile 是中間張（如 2-4）
-        if 2 <= val <= 8:
-            tid1 = Tile(suit, val - 1).to_34_id()
-            tid2 = Tile(suit, val + 1).to_34_id()
-            if hand_ids.count(tid1) >= 1 and hand_ids.count(tid2) >= 1:
-                result.add("chi_mid")
+        if 2 <= val <= 8 and counts[tid - 1] and counts[tid + 1]:
+            result.add("chi_mid")
 
         # chi_high = tile 是最後張（如 2-3）
-        if 3 <= val <= 9:
-            tid1 = Tile(suit, val - 2).to_34_id()
-            tid2 = Tile(suit, val - 1).to_34_id()
-            if hand_ids.count(tid1) >= 1 and hand_ids.count(tid2) >= 1:
-                result.add("chi_high")
+        if 3 <= val <= 9 and counts[tid - 2] and counts[tid - 1]:
+            result.add("chi_high")
 
         return result
 
+    # chi / kan / pon / discard 都是 generator：AI 玩家 yield 一個 Decision 等 driver 回覆 action，
+    # 呼叫端以 yield from 取得回傳值
     def chi(self, tile: Tile, table: Table) -> bool | list:
         if self.is_ai:
             chi_types = self.get_available_chi_types(tile)
@@ -199,7 +190,9 @@ class Player:
                 return False  # 沒得吃
 
             # 傳入 AI 決策階段
-            action = ai_decide_action(table, tile, table.buffer, action_types=chi_types)
+            decision = Decision(table, self, "chi", tile, action_types=chi_types)
+            action = yield decision
+            decision.record(action, table.buffer)
 
             chi_map = {
                 35: "low",
@@ -229,13 +222,15 @@ class Player:
         else:
             from mahjong_ai.utils.helper_interface import mingpai_mahjong_helper, chi_mingpai_top_two_lines
             if (self.hasyaku or self.do_has_yaku()) :
-                text_output = mingpai_mahjong_helper(self.hand.tiles, self.melds, tile)
+                text_output = mingpai_mahjong_helper(self.hand.tiles, self.melds, tile, table.visible_counts())
                 return chi_mingpai_top_two_lines(text_output, tile)
             return False
 
     def kan(self, tile: Tile, table: Table, action_type: str) -> bool:
         if self.is_ai:
-            action = ai_decide_action(table, tile, table.buffer, {action_type})
+            decision = Decision(table, self, action_type, tile, action_types={action_type})
+            action = yield decision
+            decision.record(action, table.buffer)
             if action == 44:
                 return False
             else:
@@ -247,7 +242,9 @@ class Player:
 
     def pon(self, tile: Tile, table: Table) -> bool:
         if self.is_ai:
-            action = ai_decide_action(table, tile, table.buffer, {"pon"})
+            decision = Decision(table, self, "pon", tile, action_types={"pon"})
+            action = yield decision
+            decision.record(action, table.buffer)
             if action == 44:
                 return False
             else:
@@ -255,42 +252,35 @@ class Player:
         else:
             from mahjong_ai.utils.helper_interface import mingpai_mahjong_helper, pon_mingpai_top_two_lines
             if (self.hasyaku or self.do_has_yaku()) :
-                text_output = mingpai_mahjong_helper(self.hand.tiles, self.melds, tile)
+                text_output = mingpai_mahjong_helper(self.hand.tiles, self.melds, tile, table.visible_counts())
                 return pon_mingpai_top_two_lines(text_output)
             
         # 至少要有兩張手牌一樣
-            if sum(1 for t in self.hand.tiles if t.is_same_tile(tile)) < 2:
+            tid = tile.id34
+            if self.hand.counts[tid] < 2:
                 return False
 
             # 如果是字牌才檢查風牌限制
-            if tile.tile_type == 'honor':
-                # 東=1, 南=2, 西=3, 北=4, 白=5, 發=6, 中=7
-                valid_values = []
-
-                # 自風 & 場風（東=0, 南=1, 西=2, 北=3）
-                wind_map = {0: 1, 1: 2, 2: 3, 3: 4}
-                valid_values.append(wind_map.get(self.seat_wind))
-                valid_values.append(wind_map.get(self.round_wind))
-
-                # 中白發永遠可碰（5,6,7）
-                valid_values += [5, 6, 7]
-
-                if tile.tile_value not in valid_values:
+            if tid >= 27:
+                # 自風 & 場風（東=0 → 27）、中白發永遠可碰（31, 32, 33）
+                if tid not in (27 + self.seat_wind, 27 + self.round_wind, 31, 32, 33):
                     return False
             
                 self.hasyaku = True
 
             if ((self.hasyaku or self.do_has_yaku())) :
-                text_output = mingpai_mahjong_helper(self.hand.tiles, self.melds, tile)
+                text_output = mingpai_mahjong_helper(self.hand.tiles, self.melds, tile, table.visible_counts())
                 return pon_mingpai_top_two_lines(text_output)
             
             return False
     def discard(self, table: Table) -> Tile:
         if self.is_ai:
-            action = ai_decide_action(table, None, table.buffer, {"discard"})
+            decision = Decision(table, self, "discard", None, action_types={"discard"})
+            action = yield decision
+            decision.record(action, table.buffer)
             return Tile.from_34_id(action)
         else:
-            output = call_mahjong_helper(self.hand.tiles, self.melds)
+            output = call_mahjong_helper(self.hand.tiles, self.melds, table.visible_counts())
             best_str = choose_best_discard_from_output(output)
             discard_tile = Tile.from_helper_string(best_str)
             return discard_tile
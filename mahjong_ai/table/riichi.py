@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING
 from mahjong_ai.table.player import Player
 from mahjong_ai.table.tile import Tile
 from mahjong_ai.table.Hepai import is_tenpai, settle_win
+from mahjong_ai.table import shanten
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Table
@@ -14,12 +15,17 @@ def get_riichi_discard_options(player: Player) -> list[Tile]:
     回傳能丟掉來達成立直（聽牌）的手牌列表
     """
     hand_tiles = player.hand.tiles
-    options = []
-    for i, tile in enumerate(hand_tiles):
-        temp_hand = hand_tiles[:i] + hand_tiles[i+1:]
-        if is_tenpai(temp_hand):
-            options.append(tile)
-    return options
+    counts = player.hand.to_counts_34()
+    # 同一種牌只需判定一次
+    tenpai_ids = set()
+    for tid in range(34):
+        if counts[tid] == 0:
+            continue
+        counts[tid] -= 1
+        if shanten.calculate_shanten(counts) == 0:
+            tenpai_ids.add(tid)
+        counts[tid] += 1
+    return [tile for tile in hand_tiles if tile.id34 in tenpai_ids]
 
 def can_declare_riichi(table: Table, player: Player) -> bool:
     """
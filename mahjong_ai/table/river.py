@@ -33,6 +33,7 @@ class River:
         每張牌可以帶有特殊狀態（立直、副露）。
         """
         self.discarded_tiles: list[DiscardedTile] = []
+        self.tile_mask = 0  # 打過哪些牌的 34-bit 遮罩（振聽判定用）
 
     def add_discard(self, tile: Tile, is_riichi: bool = False):
         """
@@ -41,6 +42,7 @@ class River:
         - is_riichi: 若為立直後第一張捨牌，標記為 True
         """
         self.discarded_tiles.append(DiscardedTile(tile, is_riichi=is_riichi))
+        self.tile_mask |= 1 << tile.id34
 
     def call_tile(self, index: int):
         """
@@ -69,7 +71,7 @@ class River:
         """
         檢查是否曾打出過指定的 tile（只比對牌面，不含狀態）。
         """
-        return any(dt.tile.is_same_tile(target_tile) for dt in self.discarded_tiles)
+        return bool(self.tile_mask >> target_tile.id34 & 1)
 
     def __str__(self):
         """
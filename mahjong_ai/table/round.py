@@ -52,13 +52,16 @@ class Round:
         table.is_mingpai = False
         table.is_liuju = False
         table.winner = None
-        table.wall = Wall()
+        table.wall = table.wall_pool.next_wall() if table.wall_pool else Wall()
+        table.wall_seeds.append(table.wall.seed)
         for player in table.players:
             player.reset()
 
         for _ in range(13):
             for player in table.players:
                 player.draw_tile_from_wall(table.wall)
+        for player in table.players:
+            player.update_waits()
 
         table.current_turn = self.dealer_id
         print(f"\n==== 【{self.get_display_string()}】 ====")
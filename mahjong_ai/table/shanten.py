@@ -0,0 +1,428 @@
+# mahjong_ai/table/shanten.py
+"""
+查表式向聽／和牌／聽牌判定引擎。
+
+原本每次判定都要 new 一個 mahjong 套件的 Shanten()/Agari()，再對整副牌做一次通用搜尋；
+這裡改成「以花色為單位拆解」：萬、筒、索、字四組各自查表，再把四組結果合併。
+每一組牌型（例如 1m1m2m3m 的 9 格數量）的拆解結果只會計算一次，之後整個行程都直接查表。
+
+輸入一律是 Hand.to_counts_34() 產生的 34 格數量陣列。
+"""
+
+AGARI_STATE = -1
+
+# 國士無雙用的么九牌 34 編號
+KOKUSHI_INDICES = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+
+# 四組牌的起點與長度：萬、筒、索、字
+GROUPS = ((0, 9, False), (9, 9, False), (18, 9, False), (27, 7, True))
+
+# 牌型 → (無雀頭的 (面子, 搭子) 前緣, 有雀頭的 (面子, 搭子) 前緣)
+_block_table: dict[tuple[tuple[int, ...], bool], tuple[tuple, tuple]] = {}
+# 牌型 → 完成旗標（bit0：可拆成純面子，bit1：可拆成面子 + 一組雀頭）
+_agari_table: dict[tuple[tuple[int, ...], bool], int] = {}
+# 牌型 → 合併用查表向量（見 _values）
+_value_table: dict[tuple[tuple[int, ...], bool], tuple[int, ...]] = {}
+# (查表向量, 查表向量) → 合併後的查表向量
+_merge_table: dict[tuple[tuple[int, ...], tuple[int, ...]], tuple[int, ...]] = {}
+
+_NEG = -100
+
+
+# =======================
+# 單一花色查表
+# =======================
+def _pareto(entries) -> tuple:
+    """
+    只保留不被支配的 (面子, 搭子) 組合，並把搭子上限壓在 4 - 面子（多的搭子不會再降向聽）。
+    """
+    capped = {(m, min(t, 4 - m)) for m, t in entries if m <= 4}
+    return tuple(sorted(
+        (m, t) for m, t in capped
+        if not any(m2 >= m and t2 >= t and (m2, t2) != (m, t) for m2, t2 in capped)
+    ))
+
+
+def _blocks(counts: tuple[int, ...], is_honor: bool) -> tuple[tuple, tuple]:
+    """
+    回傳一組牌所有可能拆法中，無雀頭／有雀頭兩種情況各自的 (面子, 搭子) 前緣。
+    以 counts 為 key 記憶化，子問題也共用同一張表。
+    """
+    key = (counts, is_honor)
+    cached = _block_table.get(key)
+    if cached is not None:
+        return cached
+
+    i = next((idx for idx, c in enumerate(counts) if c), -1)
+    if i == -1:
+        result = (((0, 0),), ())
+        _block_table[key] = result
+        return result
+
+    size = len(counts)
+    c = counts[i]
+    no_head = []
+    with_head = []
+
+    def take(removed: tuple[int, ...], dm: int, dt: int, dh: int):
+        rest = list(counts)
+        for idx in removed:
+            rest[idx] -= 1
+        child_no_head, child_head = _blocks(tuple(rest), is_honor)
+        if dh:
+            with_head.extend((m + dm, t + dt) for m, t in child_no_head)
+        else:
+            no_head.extend((m + dm, t + dt) for m, t in child_no_head)
+            with_head.extend((m + dm, t + dt) for m, t in child_head)
+
+    if c >= 3:
+        take((i, i, i), 1, 0, 0)                    # 刻子
+    if c >= 2:
+        take((i, i), 0, 0, 1)                       # 雀頭
+        take((i, i), 0, 1, 0)                       # 對子當搭子
+    if not is_honor:
+        if i + 2 < size and counts[i + 1] and counts[i + 2]:
+            take((i, i + 1, i + 2), 1, 0, 0)        # 順子
+        if i + 1 < size and counts[i + 1]:
+            take((i, i + 1), 0, 1, 0)               # 兩面／邊張
+        if i + 2 < size and counts[i + 2]:
+            take((i, i + 2), 0, 1, 0)               # 嵌張
+    take((i,), 0, 0, 0)                             # 孤張
+
+    result = (_pareto(no_head), _pareto(with_head))
+    _block_table[key] = result
+    return result
+
+
+def _agari_flags(counts: tuple[int, ...], is_honor: bool) -> int:
+    """
+    bit0：這組牌可以完全拆成面子；bit1：可以拆成面子 + 一組雀頭。
+    """
+    key = (counts, is_honor)
+    cached = _agari_table.get(key)
+    if cached is not None:
+        return cached
+
+    i = next((idx for idx, c in enumerate(counts) if c), -1)
+    if i == -1:
+        _agari_table[key] = 1
+        return 1
+
+    c = counts[i]
+    flags = 0
+    if is_honor and c == 4:
+        # 手中四張字牌（未開槓）無法成為和牌形
+        _agari_table[key] = 0
+        return 0
+    if c >= 3:
+        rest = list(counts)
+        rest[i] -= 3
+        flags |= _agari_flags(tuple(rest), is_honor)
+    if c >= 2:
+        rest = list(counts)
+        rest[i] -= 2
+        if _agari_flags(tuple(rest), is_honor) & 1:
+            flags |= 2
+    if not is_honor and i + 2 < len(counts) and counts[i + 1] and counts[i + 2]:
+        rest = list(counts)
+        rest[i] -= 1
+        rest[i + 1] -= 1
+        rest[i + 2] -= 1
+        flags |= _agari_flags(tuple(rest), is_honor)
+
+    _agari_table[key] = flags
+    return flags
+
+
+def _values(counts: tuple[int, ...], is_honor: bool) -> tuple[int, ...]:
+    """
+    把前緣整理成合併用的查表向量：index = 雀頭(0/1) * 5 + 可用區塊數(0~4)，
+    值為「2 × 面子 + 搭子」在區塊數限制下的最大值；不可能的情況為 _NEG。
+    """
+    key = (counts, is_honor)
+    cached = _value_table.get(key)
+    if cached is not None:
+        return cached
+    values = []
+    for frontier in _blocks(counts, is_honor):
+        for b in range(5):
+            values.append(max(
+                (2 * m + min(t, b - m) for m, t in frontier if m <= b),
+                default=_NEG,
+            ))
+    result = tuple(values)
+    _value_table[key] = result
+    return result
+
+
+def _merge(a: tuple[int, ...], b: tuple[int, ...]) -> tuple[int, ...]:
+    """
+    兩組查表向量做 (max, +) 合併：區塊數相加不超過 4、雀頭最多一組。
+    不同的查表向量種類很少，合併結果同樣記憶化。
+    """
+    key = (a, b)
+    cached = _merge_table.get(key)
+    if cached is not None:
+        return cached
+    out = [_NEG] * 10
+    for total in range(5):
+        best_no_head = _NEG
+        best_head = _NEG
+        for x in range(total + 1):
+            y = total - x
+            v = a[x] + b[y]
+            if v > best_no_head:
+                best_no_head = v
+            v = max(a[5 + x] + b[y], a[x] + b[5 + y])
+            if v > best_head:
+                best_head = v
+        out[total] = best_no_head
+        out[5 + total] = best_head
+    result = tuple(out)
+    _merge_table[key] = result
+    return result
+
+
+def _split(tiles_34: list[int]) -> list[tuple[int, ...]]:
+    return [tuple(tiles_34[start:start + size]) for start, size, _ in GROUPS]
+
+
+# =======================
+# 向聽數
+# =======================
+def calculate_shanten_for_regular_hand(tiles_34: list[int]) -> int:
+    """
+    一般形（四面子一雀頭）向聽數；副露後的手牌會依張數自動減少需要的面子數。
+    """
+    merged = _values(tuple(tiles_34[0:9]), False)
+    merged = _merge(merged, _values(tuple(tiles_34[9:18]), False))
+    merged = _merge(merged, _values(tuple(tiles_34[18:27]), False))
+    merged = _merge(merged, _values(tuple(tiles_34[27:34]), True))
+    return _regular_from_merged(merged, sum(tiles_34), tiles_34[27:34].count(4))
+
+
+def _regular_from_merged(merged: tuple[int, ...], total: int, honor_quads: int) -> int:
+    need = total // 3
+    best = 2 * need - max(merged[need], merged[5 + need] + 1)
+
+    if best == AGARI_STATE:
+        return best
+    # 手中四張的字牌只能當刻子 + 孤張，孤張無法單騎自己，向聽數至少為這種字牌的數量
+    if honor_quads and total % 3 == 2:
+        honor_quads -= 1
+    return max(best, honor_quads)
+
+
+def calculate_shanten_for_chiitoitsu_hand(tiles_34: list[int]) -> int:
+    """
+    七對子向聽數（需要七種不同的對子）。
+    """
+    pairs = sum(1 for c in tiles_34 if c >= 2)
+    kinds = sum(1 for c in tiles_34 if c)
+    return 6 - pairs + max(0, 7 - kinds)
+
+
+def calculate_shanten_for_kokushi_hand(tiles_34: list[int]) -> int:
+    """
+    國士無雙向聽數。
+    """
+    kinds = sum(1 for i in KOKUSHI_INDICES if tiles_34[i])
+    has_pair = any(tiles_34[i] >= 2 for i in KOKUSHI_INDICES)
+    return 13 - kinds - (1 if has_pair else 0)
+
+
+def calculate_shanten(tiles_34: list[int]) -> int:
+    """
+    取一般形、七對子、國士無雙三者的最小向聽數；和了時回傳 -1。
+    七對子與國士只在門清（13/14 張）時考慮。
+    """
+    shanten = calculate_shanten_for_regular_hand(tiles_34)
+    if sum(tiles_34) >= 13:
+        shanten = min(
+            shanten,
+            calculate_shanten_for_chiitoitsu_hand(tiles_34),
+            calculate_shanten_for_kokushi_hand(tiles_34),
+        )
+    return shanten
+
+
+def get_shanten_table(tiles_34: list[int], delta: int) -> list[int | None]:
+    """
+    對每一種牌 tid，回傳 tiles_34[tid] 加上 delta（+1 摸進、-1 打出）之後的向聽數；
+    做不到的（已有四張／手中沒有）為 None。
+    每個候選牌只重查它所在的那一組，其餘三組事先合併好。
+    """
+    total = sum(tiles_34) + delta
+    values = [_values(counts, is_honor) for counts, (_, _, is_honor) in zip(_split(tiles_34), GROUPS)]
+    honor_quads = tiles_34[27:34].count(4)
+    # 七對子／國士只在門清（13/14 張）時考慮，改動一張牌時只需增減它本身的貢獻
+    special = total >= 13
+    pairs = sum(1 for c in tiles_34 if c >= 2)
+    kinds = sum(1 for c in tiles_34 if c)
+    k_kinds = sum(1 for i in KOKUSHI_INDICES if tiles_34[i])
+    k_pairs = sum(1 for i in KOKUSHI_INDICES if tiles_34[i] >= 2)
+
+    result: list[int | None] = [None] * 34
+    for g, (start, size, is_honor) in enumerate(GROUPS):
+        rest = None
+        for h, v in enumerate(values):
+            if h != g:
+                rest = v if rest is None else _merge(rest, v)
+        counts = list(tiles_34[start:start + size])
+        # 摸進離手牌兩格以外的孤張時，一般形的向聽數與不摸相同
+        isolated = _regular_from_merged(_merge(rest, values[g]), total, honor_quads) if delta > 0 else None
+        for j in range(size):
+            old = counts[j]
+            new = old + delta
+            if not 0 <= new <= 4:
+                continue
+            if delta > 0 and not (old if is_honor else any(counts[max(0, j - 2):j + 3])):
+                shanten = isolated
+            else:
+                counts[j] = new
+                merged = _merge(rest, _values(tuple(counts), is_honor))
+                counts[j] = old
+                quads = honor_quads + (is_honor and new == 4) - (is_honor and old == 4)
+                shanten = _regular_from_merged(merged, total, quads)
+            if special:
+                p = pairs + (new >= 2) - (old >= 2)
+                k = kinds + (new > 0) - (old > 0)
+                shanten = min(shanten, 6 - p + max(0, 7 - k))
+                tid = start + j
+                if tid in KOKUSHI_INDICES:
+                    kk = k_kinds + (new > 0) - (old > 0)
+                    kp = k_pairs + (new >= 2) - (old >= 2)
+                else:
+                    kk, kp = k_kinds, k_pairs
+                shanten = min(shanten, 13 - kk - (1 if kp else 0))
+            result[start + j] = shanten
+    return result
+
+
+def get_ukeire(tiles_34: list[int]) -> tuple[int, list[int]]:
+    """
+    3n+1 張手牌的向聽數與有效牌（摸進後向聽數會下降的牌，34 編號由小到大）。
+    """
+    shanten = calculate_shanten(tiles_34)
+    after = get_shanten_table(tiles_34, 1)
+    return shanten, [tid for tid, s in enumerate(after) if s is not None and s < shanten]
+
+
+# =======================
+# 和牌判定
+# =======================
+def _is_regular_agari(flags: list[int]) -> bool:
+    can_no_head, can_head = True, False
+    for f in flags:
+        can_no_head, can_head = (
+            can_no_head and bool(f & 1),
+            (can_head and bool(f & 1)) or (can_no_head and bool(f & 2)),
+        )
+    return can_head
+
+
+def _is_special_agari(tiles_34: list[int]) -> bool:
+    if sum(tiles_34) != 14:
+        return False
+    if sum(1 for c in tiles_34 if c == 2) == 7:
+        return True
+    return (
+        all(tiles_34[i] for i in KOKUSHI_INDICES)
+        and sum(tiles_34[i] for i in KOKUSHI_INDICES) == 14
+    )
+
+
+def _special_waits(tiles_34: list[int]) -> set[int]:
+    """
+    13 張門清手牌的七對子／國士無雙聽牌。
+    """
+    waits = set()
+    singles = [tid for tid, c in enumerate(tiles_34) if c == 1]
+    if len(singles) == 1 and tiles_34.count(2) == 6:
+        waits.add(singles[0])
+    if sum(tiles_34[i] for i in KOKUSHI_INDICES) == 13:
+        missing = [i for i in KOKUSHI_INDICES if not tiles_34[i]]
+        if not missing:
+            waits.update(KOKUSHI_INDICES)
+        elif len(missing) == 1:
+            waits.add(missing[0])
+    return waits
+
+
+def is_agari(tiles_34: list[int]) -> bool:
+    """
+    判斷手牌（3n+2 張）是否已成和牌形：一般形、七對子或國士無雙。
+    """
+    if sum(tiles_34) % 3 != 2:
+        return False
+    flags = [
+        _agari_flags(counts, is_honor)
+        for counts, (_, _, is_honor) in zip(_split(tiles_34), GROUPS)
+    ]
+    return _is_regular_agari(flags) or _is_special_agari(tiles_34)
+
+
+def get_waits(tiles_34: list[int]) -> list[int]:
+    """
+    回傳 3n+1 張手牌的聽牌列表（34 編號，由小到大）；未聽牌回傳空列表。
+    每個候選牌只需重查它所在的那一組，其餘三組沿用原本的查表結果。
+    手中已有四張的牌不算聽牌（空聽）。
+    """
+    total = sum(tiles_34)
+    if total % 3 != 1:
+        return []
+    groups = _split(tiles_34)
+    flags = [_agari_flags(counts, is_honor) for counts, (_, _, is_honor) in zip(groups, GROUPS)]
+    # 一般形只可能由「目前拆不開的那一組」補牌完成；拆不開的組超過一組就只剩七對子／國士
+    broken = [g for g, f in enumerate(flags) if f == 0]
+    special = _special_waits(tiles_34) if total == 13 else set()
+
+    waits = []
+    for g, (start, size, is_honor) in enumerate(GROUPS):
+        regular = not broken or broken == [g]
+        if not regular:
+            waits.extend(tid for tid in range(start, start + size) if tid in special)
+            continue
+        others = flags[:g] + flags[g + 1:]
+        # 補進來的牌若成為雀頭／成為面子的一部分，其餘三組各自需要滿足的條件
+        ok_as_head = all(f & 1 for f in others)
+        ok_as_body = _is_regular_agari(others)
+        counts = list(groups[g])
+        for j in range(size):
+            if counts[j] >= 4:
+                continue
+            if regular:
+                # 離手牌兩格以外的孤張不可能湊成和牌形
+                if is_honor:
+                    near = counts[j]
+                else:
+                    near = any(counts[max(0, j - 2):j + 3])
+                if near:
+                    counts[j] += 1
+                    f = _agari_flags(tuple(counts), is_honor)
+                    counts[j] -= 1
+                    if (f & 2 and ok_as_head) or (f & 1 and ok_as_body):
+                        waits.append(start + j)
+                        continue
+            if start + j in special:
+                waits.append(start + j)
+    return waits
+
+
+def get_wait_mask(tiles_34: list[int]) -> int:
+    """
+    把聽牌列表壓成 34-bit 遮罩（第 i 位為 1 表示聽 34 編號 i 的牌），供 Player 做 O(1) 判定。
+    """
+    mask = 0
+    for tid in get_waits(tiles_34):
+        mask |= 1 << tid
+    return mask
+
+
+def get_shanten_and_waits(tiles_34: list[int]) -> tuple[int, list[int]]:
+    """
+    一次取得向聽數與聽牌列表（encode_obs 使用）。
+    """
+    shanten = calculate_shanten(tiles_34)
+    waits = get_waits(tiles_34) if shanten <= 0 else []
+    return shanten, waits
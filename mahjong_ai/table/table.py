@@ -1,17 +1,20 @@
-from mahjong_ai.table.wall import Wall
+from mahjong_ai.table.wall import Wall, WallPool
 from mahjong_ai.table.player import Player
 from mahjong_ai.table.tile import Tile
 from mahjong_ai.table import Chupai, Mingpai, riichi, Hepai, Liuju
 from mahjong_ai.table.round import Round
 from mahjong_ai.buffer import ReplayBuffer
+from mahjong_ai.table.decision import run_to_end
 import random
 # TODO: 出牌邏輯
 
 class Table:
-    def __init__(self):
+    def __init__(self, wall_pool: WallPool | None = None):
         self.round = Round(total_rounds=4)  # 東風戰
         self.players = [Player(i) for i in range(4)]
-        self.wall = Wall()
+        self.wall_pool = wall_pool # 預先洗好的牌山來源，None 則每局自行洗牌
+        self.wall_seeds = [] # 每局牌山的種子（重播用，見 WallPool.replay）
+        self.wall: Wall = None # 由 start_round 建立（play 每局開始時；單獨擺場況時自行呼叫 round.start_round）
         self.is_mingpai = False # 是否鳴牌過了
         self.is_liuju = False
         self.current_turn = 0 #換誰摸打
@@ -22,11 +25,41 @@ class Table:
         self.winner: Player = None # 勝者
         self.rinshan_draw = False # 抽嶺上牌
         self.round_over = False # 遊戲是否結束
-        self.round.start_round(self)
+        # 建構時不開局：牌山只在 play 每局開始時取，wall_seeds[i] 即第 i 局實際用的牌山
         self.buffer = None
-        self.remaining = self.wall.remaining_count()
+        self.remaining = 0
 
-    def run_game_loop(self, buffer=None):
+    def visible_counts(self) -> list[int]:
+        """
+        場上公開的牌的 34 格張數：各家牌河（已被鳴走的不算，改算在副露裡）、所有副露、已翻開的寶牌指示牌。
+        給牌效率扣掉有效牌的剩餘張數（自己的手牌另外加）。
+        """
+        counts = [0] * 34
+        for player in self.players:
+            for discard in player.river.discarded_tiles:
+                if not discard.is_called:
+                    counts[discard.tile.id34] += 1
+            for meld in player.melds:
+                for tile in meld.tiles:
+                    counts[tile.id34] += 1
+        for tile in self.wall.open_dora_wall:
+            if tile is not None:
+                counts[tile.id34] += 1
+        return counts
+
+    def run_game_loop(self, buffer=None, answer=None):
+        """
+        同步跑完整場對局：每個 Decision 由 answer(decision) 回答（預設為 action.answer_decision，以模型推論）。
+        """
+        if answer is None:
+            from mahjong_ai.action import answer_decision as answer
+        run_to_end(self.play(buffer), answer)
+
+    def play(self, buffer=None):
+        """
+        整場對局的 generator：AI 玩家每次要做決定就 yield 一個 Decision（見 decision.py），
+        以 send(答案) 繼續；多個牌桌可交給 decision.drive_tables 一起推進。
+        """
         self.buffer = buffer
         print(" 開始整場對局")
         main_player_id = random.randint(0, 3)
@@ -34,7 +67,7 @@ class Table:
         while not self.round.is_game_end():
             self.round.start_round(self)
             while not self.round_over:
-                self.step()
+                yield from self.step()
             self.round.handle_round_end(self)
         print("\n==== 遊戲結束 ====")
         for p in range(4):
@@ -43,12 +76,13 @@ class Table:
             print(f"\n{p} : {self.players[p].points}")
 
     def step(self):
+        # generator：摸打一次，途中的決策點會 yield Decision
         player = self.players[self.current_turn]
         # 特殊流局
          # 九種九牌
         if self.turn < 4 and not self.is_mingpai:
             if Liuju.is_kyuushu_kyuuhai(player):
-                if Mingpai.ask_player_action(self, player, "liuju", None):
+                if (yield from Mingpai.ask_player_action(self, player, "liuju", None)):
                     self.is_liuju = True
                     self.round_over = True
                     return
@@ -63,7 +97,7 @@ class Table:
         print(f"玩家{player.player_id}手牌：", [str(tile) for tile in player.hand.tiles])
         print(f"玩家{player.player_id}副露：", [str(tile) for tile in player.melds])
         # 摸牌
-        draw_tile = Chupai.draw_phase(self, player)
+        draw_tile = yield from Chupai.draw_phase(self, player)
         # 提前結束
         if self.skip_discard:
             self.skip_discard = False
@@ -77,19 +111,19 @@ class Table:
         if not player.is_riichi:
             if riichi.can_declare_riichi(self, player):
                 riichi_options = riichi.get_riichi_discard_options(player)
-                chosen_option = Mingpai.ask_player_action(self, player, "riichi", None, riichi_options)
+                chosen_option = yield from Mingpai.ask_player_action(self, player, "riichi", None, riichi_options)
                 if chosen_option:
                     riichi.declare_riichi(self, player, chosen_option)
                     discard_tile = chosen_option
                 else:
-                    discard_tile = player.discard(self)
+                    discard_tile = yield from player.discard(self)
             else:
-                discard_tile = player.discard(self)
+                discard_tile = yield from player.discard(self)
         else:
             discard_tile = draw_tile   # 已立直，自動打摸牌
 
         # 丟牌
-        Chupai.discard_phase(self, discard_tile)
+        yield from Chupai.discard_phase(self, discard_tile)
         # 四風連打
         if self.turn == 4 and not self.is_mingpai:
             if Liuju.is_sufon_renda(self.players):
@@ -1,54 +1,93 @@
 # mahjong_ai/core/tile.py
 
+from __future__ import annotations
+
+
+TILE_TYPES = ('man', 'pin', 'sou', 'honor')
+_TYPE_OFFSETS = {'man': 0, 'pin': 9, 'sou': 18, 'honor': 27}
+_SUIT_CHARS = ('m', 'p', 's', 'z')
+_CHINESE_SUITS = ('万', '饼', '索')
+HONOR_NAMES = ('东', '南', '西', '北', '白', '发', '中')
+AKA_34_IDS = (4, 13, 22)  # 5m / 5p / 5s，每種第 0 張複本是紅寶牌
+
+
 class Tile:
-    def __init__(self, tile_type: str, tile_value: int, is_aka_dora: bool = False):
+    """
+    一張麻將牌。全場只有 136 個共用且不可變的實例（每張實體牌一個），
+    建構時直接回傳共用實例，比較與雜湊都用整數 id34。
+    - tile_type: 'man' (萬子), 'pin' (筒子), 'sou' (索子), 'honor' (字牌)
+    - tile_value: 1-9 (萬筒索) 或 1-7 (字牌：東南西北白發中)
+    - id34: 0–33 牌種編號；id136: 0–135 實體牌編號
+    - sort_key: 手牌排序用（萬 < 筒 < 索 < 字，數字升冪）
+    - helper_string: 簡易表示法，例如 "1m", "5p", "7z"
+    """
+    __slots__ = ('tile_type', 'tile_value', 'is_aka_dora', 'id34', 'id136', 'sort_key', 'helper_string', 'name')
+
+    _tiles_136: list[Tile] = []
+
+    def __new__(cls, tile_type: str, tile_value: int, is_aka_dora: bool = False) -> Tile:
         """
-        建立一張麻將牌。
-        - tile_type: 'man' (萬子), 'pin' (筒子), 'sou' (索子), 'honor' (字牌)
-        - tile_value: 1-9 (萬筒索) 或 1-7 (字牌：東南西北白發中)
+        取得對應的共用實例（紅寶牌回傳該種的第 0 張，其餘回傳非紅的複本）。
         """
-        self.tile_type = tile_type
-        self.tile_value = tile_value
-        self.is_aka_dora = is_aka_dora
+        offset = _TYPE_OFFSETS.get(tile_type)
+        if offset is None or not 1 <= tile_value <= (7 if offset == 27 else 9):
+            raise ValueError(f"Invalid tile: {tile_type}{tile_value}")
+        return cls.from_34_id(offset + tile_value - 1, is_aka_dora)
+
+    @classmethod
+    def _build(cls, id136: int) -> Tile:
+        tile = object.__new__(cls)
+        id34 = id136 // 4
+        type_index, value = divmod(id34, 9)
+        is_aka = id34 in AKA_34_IDS and id136 % 4 == 0
+        tile_value = value + 1
+        if type_index == 3:
+            name = HONOR_NAMES[value]
+        else:
+            name = f"{'紅' if is_aka else ''}{tile_value}{_CHINESE_SUITS[type_index]}"
+        for attr, val in (
+            ('tile_type', TILE_TYPES[type_index]),
+            ('tile_value', tile_value),
+            ('is_aka_dora', is_aka),
+            ('id34', id34),
+            ('id136', id136),
+            ('sort_key', id34),
+            ('helper_string', f"{tile_value}{_SUIT_CHARS[type_index]}"),
+            ('name', name),
+        ):
+            object.__setattr__(tile, attr, val)
+        return tile
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tile 是共用的不可變物件，不能修改屬性")
+
+    def __delattr__(self, name):
+        raise AttributeError("Tile 是共用的不可變物件，不能刪除屬性")
+
+    def __reduce__(self):
+        # pickle / 跨行程傳遞時還原成同一個共用實例
+        return (Tile.from_136_id, (self.id136,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
         """
-        以中文格式輸出，例如 "1萬"、"9筒"、"白"
-        """
-        if self.tile_type == 'man':
-            if self.is_aka_dora:
-                return f"紅{self.tile_value}万"
-            return f"{self.tile_value}万"
-        elif self.tile_type == 'pin':
-            if self.is_aka_dora:
-                return f"紅{self.tile_value}饼"
-            return f"{self.tile_value}饼"
-        elif self.tile_type == 'sou':
-            if self.is_aka_dora:
-                return f"紅{self.tile_value}索"
-            return f"{self.tile_value}索"
-        elif self.tile_type == 'honor':
-            honor_names = {
-                1: '东', 2: '南', 3: '西', 4: '北', 5: '白', 6: '发', 7: '中'
-            }
-            return honor_names.get(self.tile_value, '?')
-        else:
-            return f"未知({self.tile_type}{self.tile_value})"
+        以中文格式輸出，例如 "1万"、"紅5饼"、"白"
+        """
+        return self.name
+
+    def __repr__(self):
+        return f"Tile({self.helper_string}{', aka' if self.is_aka_dora else ''})"
 
     def to_helper_string(self):
         """
         轉換為簡易表示法，例如 "1m", "5p", "7z"（z=字牌）
         """
-        if self.tile_type == 'man':
-            return f"{self.tile_value}m"
-        elif self.tile_type == 'pin':
-            return f"{self.tile_value}p"
-        elif self.tile_type == 'sou':
-            return f"{self.tile_value}s"
-        elif self.tile_type == 'honor':
-            return f"{self.tile_value}z"
-        else:
-            return "?"
+        return self.helper_string
 
     def get_tile_description(self) -> str:
         """
@@ -56,27 +95,33 @@ class Tile:
         """
         return f"{self.tile_value}{self.tile_type}"
 
-    def is_same_tile(self, other_tile: "Tile") -> bool:
+    def is_same_tile(self, other_tile: Tile) -> bool:
         """
         判斷兩張牌是否牌面相同（不考慮是哪一張複本）
         """
-        return self.tile_type == other_tile.tile_type and self.tile_value == other_tile.tile_value
-    
+        return self.id34 == other_tile.id34
+
+    def is_honor(self) -> bool:
+        """判斷是否為字牌"""
+        return self.id34 >= 27
+
+    # 下面兩個判斷保留改寫前的結果：原本以 tile_type == "z" / "m" 比對，但 tile_type 是 'honor' / 'man'，
+    # 所以永遠不成立（九種九牌、四風連打、流局滿貫因此不會發生）。改成正確判斷會改變規則，另案處理。
     def is_wind(self) -> bool:
-        """判斷是否為東南西北風牌"""
-        return self.tile_type == "z" and self.tile_value in [1, 2, 3, 4]  # 1=東, 2=南, 3=西, 4=北
+        """判斷是否為東南西北風牌（見上方說明，目前一律為 False）"""
+        return False
 
     def is_terminal_or_honor(self) -> bool:
-        """判斷是否為么九牌（1, 9, 字牌）"""
-        return (self.tile_type in ["m", "p", "s"] and self.tile_value in [1, 9]) or self.tile_type == "z"
+        """判斷是否為么九牌（見上方說明，目前一律為 False）"""
+        return False
 
     def __eq__(self, other):
         if not isinstance(other, Tile):
             return False
-        return self.tile_type == other.tile_type and self.tile_value == other.tile_value
+        return self.id34 == other.id34
 
     def __hash__(self):
-        return hash((self.tile_type, self.tile_value))
+        return self.id34
 
     # -------------------------
     # mahjong 套件整合功能區塊
@@ -86,68 +131,62 @@ class Tile:
         """
         將此 tile 轉換為 mahjong 套件使用的 0–33 格式。
         """
-        if self.tile_type == 'man':
-            return self.tile_value - 1
-        elif self.tile_type == 'pin':
-            return 9 + self.tile_value - 1
-        elif self.tile_type == 'sou':
-            return 18 + self.tile_value - 1
-        elif self.tile_type == 'honor':
-            return 27 + self.tile_value - 1
-        raise ValueError("Unknown tile type")
+        return self.id34
+
+    @classmethod
+    def from_34_id(cls, tile_id: int, is_aka_dora: bool = False) -> Tile:
+        """
+        從 0–33 格式取得共用的 Tile。
+        """
+        if not 0 <= tile_id < 34:
+            raise ValueError("Invalid tile_id")
+        if tile_id in AKA_34_IDS:
+            return cls._tiles_136[tile_id * 4 + (0 if is_aka_dora else 1)]
+        return cls._tiles_136[tile_id * 4]
 
     @classmethod
-    def from_34_id(cls, tile_id: int):
+    def from_136_id(cls, tile_id: int) -> Tile:
         """
-        從 0–33 格式反推成 Tile。
+        從 0–135 格式取得對應的實體牌（每種 4 張連號，5m/5p/5s 的第 0 張為紅寶牌）。
         """
-        if tile_id < 9:
-            return cls('man', tile_id + 1)
-        elif tile_id < 18:
-            return cls('pin', tile_id - 9 + 1)
-        elif tile_id < 27:
-            return cls('sou', tile_id - 18 + 1)
-        elif tile_id < 34:
-            return cls('honor', tile_id - 27 + 1)
-        raise ValueError("Invalid tile_id")
+        if not 0 <= tile_id < 136:
+            raise ValueError("Invalid tile_id")
+        return cls._tiles_136[tile_id]
+
+    @classmethod
+    def all_tiles(cls) -> list[Tile]:
+        """
+        回傳全部 136 張實體牌（依 id136 排列）的新列表。
+        """
+        return list(cls._tiles_136)
 
     def get_all_136_ids(self) -> list[int]:
         """
         回傳此牌對應的 136 編號（每種 tile 有 4 張，編號連續）
         例如 5m → [16, 17, 18, 19]
         """
-        base = self.to_34_id() * 4
-        return [base + i for i in range(4)]
+        base = self.id34 * 4
+        return [base, base + 1, base + 2, base + 3]
 
     @classmethod
-    def from_helper_string(cls, s: str):
+    def from_helper_string(cls, s: str) -> Tile:
         """
         從 helper 格式（如 '7z', '3p'）建立 Tile。
         """
-        if len(s) != 2:
-            raise ValueError("Invalid helper string")
-        value, suit = int(s[0]), s[1]
-        if suit == 'm':
-            return cls('man', value)
-        elif suit == 'p':
-            return cls('pin', value)
-        elif suit == 's':
-            return cls('sou', value)
-        elif suit == 'z':
-            return cls('honor', value)
-        raise ValueError("Invalid suit")
+        tile = _HELPER_MAP.get(s)
+        if tile is None:
+            raise ValueError(f"Invalid helper string: {s}")
+        return tile
+
     @classmethod
-    def from_chinese_string(cls, s: str) -> "Tile":
-        honor_map = {'东': 1, '南': 2, '西': 3, '北': 4, '白': 5, '发': 6, '中': 7}
-        if s in honor_map:
-            return cls('honor', honor_map[s])
-        elif len(s) == 2:
-            value = int(s[0])
-            suit_char = s[1]
-            if suit_char == '万':
-                return cls('man', value)
-            elif suit_char == '饼':
-                return cls('pin', value)
-            elif suit_char == '索':
-                return cls('sou', value)
-        raise ValueError(f"Invalid tile string: {s}")
+    def from_chinese_string(cls, s: str) -> Tile:
+        tile = _CHINESE_MAP.get(s)
+        if tile is None:
+            raise ValueError(f"Invalid tile string: {s}")
+        return tile
+
+
+Tile._tiles_136.extend(Tile._build(i) for i in range(136))
+
+_HELPER_MAP: dict[str, Tile] = {Tile.from_34_id(i).helper_string: Tile.from_34_id(i) for i in range(34)}
+_CHINESE_MAP: dict[str, Tile] = {t.name: Tile.from_34_id(t.id34, t.is_aka_dora) for t in Tile._tiles_136}
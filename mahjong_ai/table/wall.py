@@ -3,105 +3,173 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import random
+import numpy as np
 from mahjong_ai.table.tile import Tile
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 if TYPE_CHECKING:
     from mahjong_ai.table.table import Player
-class Wall:
-    def __init__(self):
-        self.first_rinshan_player: Player = None
-        """
-        初始化牌山：產生136張牌並進行洗牌
-        """
-        self.tiles: List[Tile] = self._create_full_wall()
-        self.shuffle_tiles()
-        
-        """
-        建立王牌區（dead wall）14 張：含 5 組寶牌、嶺上牌
-        """
-        self.dora_wall: list[Tile] = [self.tiles.pop() for _ in range(5)]
-        self.uradora_wall: list[Tile] = [self.tiles.pop() for _ in range(5)]
-        self.rinshan_wall: list[Tile] = [self.tiles.pop() for _ in range(4)]
 
-        self.open_dora_wall: list[Tile] = [self.draw_dora_indicators()]
+# 136 張依 id136 排列，牌山只保存排列順序
+_ALL_TILES: tuple[Tile, ...] = tuple(Tile.all_tiles())
 
-    def _create_full_wall(self) -> List[Tile]:
-        """
-        建立完整136張牌的列表（4張x每種牌）
-        萬、筒、索：1-9 各4張
-        字牌：東南西北白發中（1-7）各4張
-        """
-        tiles = []
+# 牌山配置（沿用原本從尾端拆出王牌的順序）：
+# 前 122 張為可摸的牌，之後依序是 4 張嶺上牌、5 張裏寶牌指示牌、5 張寶牌指示牌（皆由尾端往前取）
+LIVE_COUNT = 122
+NUM_DORA = 5
+NUM_RINSHAN = 4
 
-        # 萬子（1m~9m）
-        for number in range(1, 10):
-            for i in range(4):
-                is_aka = (number == 5 and i == 0)  # 紅5萬
-                tiles.append(Tile(tile_type='man', tile_value=number, is_aka_dora=is_aka))
 
-        # 筒子（1p~9p）
-        for number in range(1, 10):
-            for i in range(4):
-                is_aka = (number == 5 and i == 0)  # 紅5筒
-                tiles.append(Tile(tile_type='pin', tile_value=number, is_aka_dora=is_aka))
+def wall_order(seed: int) -> np.ndarray:
+    """
+    由單一種子產生一副牌山排列（0–135 的 id136），同樣的種子永遠得到同樣的牌山。
+    """
+    return np.random.default_rng(seed).permutation(136).astype(np.uint8)
 
-        # 索子（1s~9s）
-        for number in range(1, 10):
-            for i in range(4):
-                is_aka = (number == 5 and i == 0)  # 紅5索
-                tiles.append(Tile(tile_type='sou', tile_value=number, is_aka_dora=is_aka))
 
-        # 字牌（東南西北白發中）
-        for number in range(1, 8):
-            for _ in range(4):
-                tiles.append(Tile(tile_type='honor', tile_value=number))
+def wall_orders(seed: int, num_walls: int, batch_index: int = 0) -> np.ndarray:
+    """
+    一次產生 num_walls 副牌山排列，回傳 (num_walls, 136) 的 uint8 陣列。
+    第 i 列可由 (seed, batch_index, i) 重現。
+    """
+    rng = np.random.default_rng([seed, batch_index])
+    base = np.broadcast_to(np.arange(136, dtype=np.uint8), (num_walls, 136))
+    return rng.permuted(base, axis=1)
 
-        return tiles
 
-    def shuffle_tiles(self) -> None:
+class Wall:
+    def __init__(self, order: Sequence[int] | None = None, seed=None):
         """
-        隨機打亂牌堆（使用 random.shuffle）
+        初始化牌山：以固定長度的陣列加上游標表示，摸牌、翻寶牌、嶺上牌都是 O(1)。
+        - order: 預先洗好的 136 張排列（id136），例如 WallPool 的一列
+        - seed: 這副牌山的種子，會記錄在 self.seed 供重播；
+          未給 order 時用它產生排列，兩者都沒給則從 random 抽一個種子
         """
-        random.shuffle(self.tiles)
+        self.first_rinshan_player: Player = None
+        if order is None:
+            if seed is None:
+                seed = random.getrandbits(32)
+            order = wall_order(seed)
+        self.seed = seed
+        if isinstance(order, np.ndarray):
+            order = order.tolist()
+        self.tiles: tuple[Tile, ...] = tuple(_ALL_TILES[i] for i in order)
+
+        # 游標：下一張要摸的牌、已翻開幾張寶牌指示牌、已摸幾張嶺上牌
+        self.draw_index = 0
+        self.dora_index = 0
+        self.rinshan_index = 0
+
+        self.open_dora_wall: list[Tile] = [self.draw_dora_indicators()]
+
+    @property
+    def dora_wall(self) -> list[Tile]:
+        """尚未翻開的寶牌指示牌"""
+        return [self.tiles[135 - i] for i in range(self.dora_index, NUM_DORA)]
+
+    @property
+    def uradora_wall(self) -> list[Tile]:
+        """裏寶牌指示牌（5 張）"""
+        return [self.tiles[130 - i] for i in range(NUM_DORA)]
+
+    @property
+    def rinshan_wall(self) -> list[Tile]:
+        """尚未摸走的嶺上牌"""
+        return [self.tiles[125 - i] for i in range(self.rinshan_index, NUM_RINSHAN)]
 
     def draw_tile(self) -> Optional[Tile]:
         """
         從牌堆最上方摸一張牌。
         若牌堆已空，回傳 None。
         """
-        if self.is_empty():
+        if self.draw_index >= LIVE_COUNT:
             return None
-        return self.tiles.pop(0)
+        tile = self.tiles[self.draw_index]
+        self.draw_index += 1
+        return tile
 
-    def draw_dora_indicators(self) -> Tile:
+    def draw_dora_indicators(self) -> Tile | None:
         """
         取得表寶牌表示牌
         """
-        return self.dora_wall.pop(0)
+        if self.dora_index >= NUM_DORA:
+            return None
+        tile = self.tiles[135 - self.dora_index]
+        self.dora_index += 1
+        return tile
 
     def draw_rinshan_tile(self, player: Player) -> Tile | None:
         """
         從王牌尾部抽一張嶺上牌（加槓補牌）
         """
-        if len(self.rinshan_wall) == 4:
+        remaining = NUM_RINSHAN - self.rinshan_index
+        if remaining == 4:
             self.first_rinshan_player = player
         # 四槓散了
-        if len(self.rinshan_wall) == 1:
+        if remaining == 1:
             if(player.player_id != self.first_rinshan_player.player_id):
                 return None
-        if len(self.rinshan_wall) == 0:
+        if remaining == 0:
             return None
-        return self.rinshan_wall.pop(0)
+        tile = self.tiles[125 - self.rinshan_index]
+        self.rinshan_index += 1
+        return tile
+
+    def rinshan_remaining(self) -> int:
+        """
+        回傳剩餘嶺上牌張數
+        """
+        return NUM_RINSHAN - self.rinshan_index
 
     def is_empty(self) -> bool:
         """
         判斷牌堆是否為空
         """
-        return len(self.tiles) == 0
+        return self.draw_index >= LIVE_COUNT
 
     def remaining_count(self) -> int:
         """
         回傳目前牌堆剩餘張數
         """
-        return len(self.tiles)
+        return LIVE_COUNT - self.draw_index
+
+
+class WallPool:
+    def __init__(self, seed: int | None = None, batch_size: int = 4096):
+        """
+        預先以 NumPy 一次洗好一批牌山（batch_size × 136 的 uint8 陣列），
+        self-play 每局直接取下一列，不必每局在 Python 裡洗牌。
+        每副牌山的種子記為 (seed, batch_index, row)，可用 WallPool.replay 重建。
+        """
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.batch_size = batch_size
+        self.batch_index = -1
+        self.orders: np.ndarray | None = None
+        self.row = batch_size
+
+    def _refill(self) -> None:
+        self.batch_index += 1
+        self.orders = wall_orders(self.seed, self.batch_size, self.batch_index)
+        self.row = 0
+
+    def next_wall(self) -> Wall:
+        """
+        取出下一副牌山。
+        """
+        if self.row >= self.batch_size:
+            self._refill()
+        row = self.row
+        self.row += 1
+        return Wall(self.orders[row], seed=(self.seed, self.batch_index, row))
+
+    @staticmethod
+    def replay(wall_seed) -> Wall:
+        """
+        依 Wall.seed 重建同一副牌山：整數種子直接重洗，(seed, batch_index, row) 則重產該批次。
+        （Generator.permuted 逐列洗牌，前 row+1 列與整批產生時相同）
+        """
+        if isinstance(wall_seed, (tuple, list)):
+            seed, batch_index, row = wall_seed
+            order = wall_orders(seed, row + 1, batch_index)[row]
+            return Wall(order, seed=(seed, batch_index, row))
+        return Wall(seed=wall_seed)
@@ -22,7 +22,7 @@ def evaluate_model(num_games=NUM_TEST_GAMES):
 
         ai_player = next(p for p in table.players if p.is_ai)
         total_point += ai_player.points
-        reward_list = [entry["reward"] for entry in buffer.buffer]
+        reward_list = buffer.rewards().tolist()
         total_reward += sum(reward_list)
         total_steps += len(reward_list)
 
@@ -1,14 +1,21 @@
 # train.py - 擴充參數控制版本，支援完整可調設定與詳細註解
 
+import itertools
 import json
+import socket
 import torch
+import torch.distributed as dist
 import torch.nn.functional as F
-from torch.utils.data import DataLoader, Dataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Dataset, DistributedSampler
 from mahjong_ai.model.model import Brain, DQN
+from mahjong_ai.shards import ShardReader
+from mahjong_ai.dataset import ShardStreamDataset, expand_dataset_paths, to_model_inputs
 import os
 import argparse
 import subprocess
 import sys
+import time
 
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -17,6 +24,9 @@ DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 LOSS_LOG_PATH = "mahjong_ai/models/loss_log.json"
 REWARD_LOG_PATH = "mahjong_ai/models/reward_log.json"
 
+# 混合精度：none 為全 fp32；bf16 以 torch.autocast 把卷積 / Linear 改用 bfloat16 計算（CPU 與 GPU 皆可，權重與 optimizer 仍為 fp32）
+AMP_DTYPES = {"none": None, "bf16": torch.bfloat16}
+
 # 資料集定義：將 JSON 中每筆 obs/mask/action/reward 轉為 tensor
 class MahjongDataset(Dataset):
     def __init__(self, data):
@@ -33,11 +43,49 @@ class MahjongDataset(Dataset):
         reward = torch.tensor(sample["reward"]).float()   # scalar
         return obs, mask, action, reward
 
-# 載入 JSON 資料並轉為 Dataset
-def load_dataset(json_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return MahjongDataset(data)
+# 訓練資料路徑可給多個：分片資料夾（可用萬用字元，或放了多個分片資料集的上層資料夾）或舊版 JSON
+def _as_list(data_path):
+    return [data_path] if isinstance(data_path, str) else list(data_path)
+
+def _json_paths(data_path):
+    return [p for p in _as_list(data_path) if p.endswith(".json")]
+
+# 建立 DataLoader：分片資料以整批串流讀取（不逐筆組 batch），舊版 JSON 則整份載入
+# 分散式訓練時每個 rank 只讀自己的一份（分片資料依區塊分，JSON 以 DistributedSampler 分）
+def load_loader(data_path, batch_size, num_workers=0, block_size=1024, seed=0, rank=0, world_size=1):
+    json_paths = _json_paths(data_path)
+    if json_paths and len(json_paths) < len(_as_list(data_path)):
+        # 兩種格式的批次組法不同（JSON 逐筆組批、分片整批串流），不混用，直接拒絕而不是略過其中一種
+        shard_paths = [p for p in _as_list(data_path) if not p.endswith(".json")]
+        raise ValueError(f"--data_path 不能同時給 JSON 檔與分片資料集（JSON：{json_paths}，分片：{shard_paths}）")
+    if json_paths:
+        data = []
+        for path in json_paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                data.extend(json.load(f))
+        dataset = MahjongDataset(data)
+        if world_size > 1:
+            sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=True, seed=seed)
+            return DataLoader(dataset, batch_size=batch_size, sampler=sampler, num_workers=num_workers)
+        return DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    dataset = ShardStreamDataset(data_path, batch_size=batch_size, block_size=block_size, seed=seed, compact=True,
+                                 rank=rank, world_size=world_size)
+    pending = [reader.dataset_dir for reader in dataset.readers if reader.pending_rewards]
+    if pending:
+        raise ValueError(f"資料集還有未標註的 reward，請先執行 python -m mahjong_ai.label_rewards {' '.join(pending)}")
+    if rank == 0:
+        print(f"分片資料集 {len(dataset.paths)} 個，共 {dataset.num_samples()} 筆")
+    return DataLoader(dataset, batch_size=None, num_workers=num_workers)
+
+# 只讀出全部 reward（分片資料集只解壓 reward 欄位）
+def load_rewards(data_path):
+    rewards = []
+    for path in _json_paths(data_path):
+        with open(path, 'r', encoding='utf-8') as f:
+            rewards.extend(sample["reward"] for sample in json.load(f))
+    for path in expand_dataset_paths([p for p in _as_list(data_path) if not p.endswith(".json")]):
+        rewards.extend(ShardReader(path).rewards().tolist())
+    return rewards
 
 # 呼叫 test_play.py，取得 avg_reward 結果與細節
 def evaluate_model():
@@ -104,63 +152,165 @@ def append_json_log(path, record):
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(logs, f, ensure_ascii=False, indent=2)
 
-def compute_total_reward(json_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    total_reward = sum(sample["reward"] for sample in data)
-    return total_reward
-
-def compute_avg_reward(json_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    total = sum(sample["reward"] for sample in data)
-    count = len(data)
-    return total / count if count > 0 else -9999
+def compute_total_reward(data_path):
+    return sum(load_rewards(data_path))
+
+def compute_avg_reward(data_path):
+    rewards = load_rewards(data_path)
+    return sum(rewards) / len(rewards) if rewards else -9999
+
+def make_optimizer(params, lr, weight_decay, fused=False):
+    """
+    Adam；fused 為 True 時所有參數的更新合成單一 kernel（需 torch 2.4 以上才支援 CPU）。
+    """
+    return torch.optim.Adam(params, lr=lr, weight_decay=weight_decay, fused=True if fused else None)
+
+def make_train_step(brain, dqn, optimizer, amp="none", compile=False):
+    """
+    回傳 step(obs, mask, action, reward) -> loss。
+    回傳的 loss 是留在裝置上的 detach tensor，呼叫端自行累加，避免每步 .item() 讓主機等裝置算完。
+    amp：AMP_DTYPES 的鍵；compile：以 torch.compile 編譯前向與 loss（反向由 AOTAutograd 一併編譯，
+    第一批與批次大小改變時會重新編譯）。模型本身不被包裝，state_dict 的鍵名不變。
+    """
+    dtype = AMP_DTYPES[amp]
+    device_type = next(brain.parameters()).device.type
+
+    def compute_loss(obs, mask, action, reward):
+        with torch.autocast(device_type, dtype=dtype, enabled=dtype is not None):
+            q_values = dqn(brain(obs), mask)
+            q_selected = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
+        return F.mse_loss(q_selected.float(), reward)
+
+    if compile:
+        compute_loss = torch.compile(compute_loss)
+
+    def step(obs, mask, action, reward):
+        loss = compute_loss(obs, mask, action, reward)
+        optimizer.zero_grad(set_to_none=True)
+        loss.backward()
+        optimizer.step()
+        return loss.detach()
+
+    return step
+
+# ====== 分散式訓練（gloo 後端，CPU 多行程；多機時各機器執行同一指令）======
+def init_distributed():
+    """
+    依環境變數（RANK / WORLD_SIZE / MASTER_ADDR / MASTER_PORT，由 --nproc 或 torchrun 設定）加入 gloo 行程群組，
+    並把 CPU 核心平分給本機的各行程。回傳 (rank, world_size)；WORLD_SIZE 未設定或為 1 時不初始化。
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    if world_size <= 1:
+        return 0, 1
+    if not dist.is_initialized():
+        dist.init_process_group("gloo")
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    return dist.get_rank(), world_size
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _distributed_worker(local_rank, config):
+    node_rank = int(os.environ.get("NODE_RANK", "0"))
+    os.environ["RANK"] = str(node_rank * config.nproc + local_rank)
+    os.environ["LOCAL_RANK"] = str(local_rank)
+    train(config)
+
+def launch(config):
+    """
+    --nproc 大於 1 時在本機啟動 nproc 個訓練行程（torch.multiprocessing.spawn，不需要其他服務）；
+    多機訓練時各機器都執行同一指令，並設定 NNODES、NODE_RANK、MASTER_ADDR、MASTER_PORT。
+    已由 torchrun 等啟動器設定 WORLD_SIZE 時直接訓練。
+    """
+    if config.nproc <= 1 or "WORLD_SIZE" in os.environ:
+        train(config)
+        return
+    nnodes = int(os.environ.get("NNODES", "1"))
+    if nnodes > 1 and not ("MASTER_ADDR" in os.environ and "MASTER_PORT" in os.environ):
+        raise ValueError("多機訓練需設定 MASTER_ADDR 與 MASTER_PORT（rank 0 所在機器）")
+    os.environ["WORLD_SIZE"] = str(nnodes * config.nproc)
+    os.environ["LOCAL_WORLD_SIZE"] = str(config.nproc)
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ.setdefault("MASTER_PORT", str(_free_port()))
+    torch.multiprocessing.spawn(_distributed_worker, args=(config,), nprocs=config.nproc)
 
 # ====== 主訓練函數，包含模型初始化、訓練迴圈、測試與儲存 ======
 def train(config):
-    print(f"載入訓練資料: {config.json_path}")
-    dataset = load_dataset(config.json_path)
-    loader = DataLoader(dataset, batch_size=config.batch_size, shuffle=True)
+    # 分散式訓練時只有 rank 0 輸出、寫紀錄、存模型與評估；一律在 CPU 上以 gloo 同步梯度
+    rank, world_size = init_distributed()
+    is_main = rank == 0
+    device = DEVICE if world_size == 1 else torch.device("cpu")
+    if is_main:
+        print(f"載入訓練資料: {config.data_path}")
+    loader = load_loader(config.data_path, config.batch_size, config.num_workers, config.block_size, config.seed, rank, world_size)
 
     # 初始化模型（Brain 決定 obs 特徵、DQN 決定 Q 值）
-    brain = Brain(version=config.version, conv_channels=config.conv_channels, num_blocks=config.num_blocks).to(DEVICE)
-    dqn = DQN(version=config.version).to(DEVICE)
+    brain = Brain(version=config.version, conv_channels=config.conv_channels, num_blocks=config.num_blocks).to(device)
+    dqn = DQN(version=config.version).to(device)
     # 接續最佳模型訓練
     best_brain_path = "mahjong_ai/models/best_brain.pth"
     best_dqn_path = "mahjong_ai/models/best_dqn.pth"
     if os.path.exists(best_brain_path) and os.path.exists(best_dqn_path):
-        print("載入最佳模型進行續訓...")
-        brain.load_state_dict(torch.load(best_brain_path, map_location=DEVICE, weights_only=True))
-        dqn.load_state_dict(torch.load(best_dqn_path, map_location=DEVICE, weights_only=True))
-    else:
+        if is_main:
+            print("載入最佳模型進行續訓...")
+        brain.load_state_dict(torch.load(best_brain_path, map_location=device, weights_only=True))
+        dqn.load_state_dict(torch.load(best_dqn_path, map_location=device, weights_only=True))
+    elif is_main:
         print("找不到最佳模型，從頭開始訓練")
 
-    # 建立 optimizer
-    optimizer = torch.optim.Adam(list(brain.parameters()) + list(dqn.parameters()), lr=config.lr, weight_decay=config.weight_decay)
+    # 建立 optimizer；分散式時總批次為 batch_size × world_size，學習率依此線性放大
+    lr = config.lr * world_size if config.lr_scaling == "linear" else config.lr
+    optimizer = make_optimizer(list(brain.parameters()) + list(dqn.parameters()), lr, config.weight_decay, config.fused_optimizer)
+    if world_size > 1:
+        # DDP 建立時把 rank 0 的權重廣播給其他 rank，反向時 all-reduce 平均梯度；存檔仍用未包裝的 brain / dqn
+        train_step = make_train_step(DistributedDataParallel(brain), DistributedDataParallel(dqn), optimizer, config.amp, config.compile)
+    else:
+        train_step = make_train_step(brain, dqn, optimizer, config.amp, config.compile)
+    if is_main:
+        print(f"訓練模式：amp={config.amp}，compile={config.compile}，fused_optimizer={config.fused_optimizer}，"
+              f"行程數={world_size}，lr={lr:g}")
 
     for epoch in range(config.epochs):
-        total_loss = 0.0
-        for obs, mask, action, reward in loader:
-            obs = obs.to(DEVICE)
-            mask = mask.to(DEVICE)
-            action = action.to(DEVICE)
-            reward = reward.to(DEVICE)
-
-            phi = brain(obs)
-            q_values = dqn(phi, mask)
-            q_selected = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
-            loss = F.mse_loss(q_selected, reward)
-
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-
-            total_loss += loss.item()
-
-        avg_loss = total_loss / len(loader)
-        print(f"[Epoch {epoch+1}] Loss: {avg_loss:.4f}")
-        append_json_log(LOSS_LOG_PATH, {"epoch": epoch + 1, "loss": avg_loss})
+        steps = None
+        if isinstance(loader.dataset, ShardStreamDataset):
+            loader.dataset.set_epoch(epoch)
+            if world_size > 1:
+                # 各 rank 分到的區塊筆數不一定相同，取最少的批次數，每個 rank 步數一致才不會卡在梯度同步
+                steps = torch.tensor(loader.dataset.epoch_batches(config.num_workers))
+                dist.all_reduce(steps, op=dist.ReduceOp.MIN)
+                steps = int(steps)
+        elif isinstance(loader.sampler, DistributedSampler):
+            loader.sampler.set_epoch(epoch)
+        # loss 在裝置上累加，epoch 結束才取回主機
+        total_loss = torch.zeros((), device=device)
+        num_batches = 0
+        num_samples = 0
+        start = time.perf_counter()
+        for batch in itertools.islice(loader, steps):
+            # 分片資料以緊湊格式搬到裝置後才展開 obs
+            obs, mask, action, reward = to_model_inputs(batch, device)
+            total_loss += train_step(obs, mask, action, reward)
+            num_batches += 1
+            num_samples += len(action)
+
+        if world_size > 1:
+            totals = torch.stack([total_loss.cpu(), torch.tensor(float(num_batches)), torch.tensor(float(num_samples))])
+            dist.all_reduce(totals)
+            total_loss, num_batches, num_samples = totals[0], int(totals[1]), int(totals[2])
+        avg_loss = total_loss.item() / max(num_batches, 1)
+        samples_per_sec = num_samples / (time.perf_counter() - start)
+        if is_main:
+            print(f"[Epoch {epoch+1}] Loss: {avg_loss:.4f}  {samples_per_sec:.0f} 筆/秒")
+            append_json_log(LOSS_LOG_PATH, {"epoch": epoch + 1, "loss": avg_loss, "samples_per_sec": samples_per_sec,
+                                            "amp": config.amp, "compile": config.compile, "world_size": world_size})
+
+    if world_size > 1:
+        dist.destroy_process_group()
+    if not is_main:
+        return
 
     # 儲存最新模型
     os.makedirs("mahjong_ai/models", exist_ok=True)
@@ -172,7 +322,7 @@ def train(config):
     eval_reward, eval_point, full_result = evaluate_model()
     if eval_reward is not None:
         append_json_log(REWARD_LOG_PATH, {"epoch": config.epochs, **full_result})
-        best_reward = compute_avg_reward(config.json_path)
+        best_reward = compute_avg_reward(config.data_path)
         print(f" 模擬best_avg_reward：{best_reward:.2f}")
         if eval_reward > best_reward:
             save_best_model(brain, dqn, eval_reward)
@@ -180,7 +330,7 @@ def train(config):
             print(f" 模型未進步，維持最佳 reward={best_reward:.4f}")
 
     # === 加總這次所有 reward 並存檔 ===
-    total_reward = compute_total_reward(config.json_path)
+    total_reward = compute_total_reward(config.data_path)
     print(f" 本次模擬 reward 總和：{total_reward:.2f}")
 
     append_json_log("mahjong_ai/models/reward_sum_log.json", {
@@ -191,14 +341,22 @@ def train(config):
 # ====== 命令列引數解析：支援多參數調整 ======
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('--json_path', type=str, required=True, help='訓練資料 JSON 檔路徑')
+    parser.add_argument('--data_path', '--json_path', dest='data_path', type=str, nargs='+', required=True, help='訓練資料路徑，可給多個（分片資料夾、萬用字元或舊版 JSON 檔）')
     parser.add_argument('--batch_size', type=int, default=256, help='訓練批次大小')
+    parser.add_argument('--num_workers', type=int, default=0, help='DataLoader worker 數')
+    parser.add_argument('--block_size', type=int, default=1024, help='分片資料洗牌的區塊筆數')
+    parser.add_argument('--seed', type=int, default=0, help='分片資料洗牌種子')
     parser.add_argument('--epochs', type=int, default=10, help='訓練週期數')
     parser.add_argument('--lr', type=float, default=1e-4, help='學習率')
     parser.add_argument('--weight_decay', type=float, default=0.0, help='L2 正則化係數')
     parser.add_argument('--version', type=int, default=2, help='模型版本（與 obs encoder 對應）')
     parser.add_argument('--conv_channels', type=int, default=128, help='CNN 特徵圖通道數')
     parser.add_argument('--num_blocks', type=int, default=8, help='殘差區塊數')
+    parser.add_argument('--amp', choices=list(AMP_DTYPES), default='none', help='混合精度（bf16 以 autocast 計算，CPU 亦可）')
+    parser.add_argument('--compile', action='store_true', help='以 torch.compile 編譯訓練步驟（第一批需編譯時間）')
+    parser.add_argument('--fused_optimizer', action='store_true', help='Adam 使用 fused 實作')
+    parser.add_argument('--nproc', type=int, default=1, help='本機資料平行的訓練行程數（gloo；多機另設 NNODES / NODE_RANK / MASTER_ADDR / MASTER_PORT）')
+    parser.add_argument('--lr_scaling', choices=['linear', 'none'], default='linear', help='多行程時學習率是否依總批次線性放大')
 
     args = parser.parse_args()
-    train(args)
+    launch(args)
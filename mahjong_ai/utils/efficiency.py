@@ -0,0 +1,256 @@
+# efficiency.py - 純 Python 的牌效率分析（向聽、有效牌、兩步速度），可取代 mahjong-helper 的切牌／鳴牌建議；
+# 結果直接整理成 HelperResult，有效牌剩餘張數可以扣掉牌桌上看得到的牌
+
+from functools import lru_cache
+
+from mahjong_ai.table.shanten import calculate_shanten, get_shanten_table
+from mahjong_ai.table.tile import Tile
+from mahjong_ai.utils.helper_output import SHANTEN_BLOCKS, CallOption, DiscardCandidate, HelperResult
+
+_SUITS = {'m': 0, 'p': 9, 's': 18, 'z': 27}
+_CHI_SUITS = ('万', '饼', '索')
+
+
+class DiscardEval:
+    """
+    打出一張牌後的評估。
+    - tid: 打出的牌（34 編號）
+    - shanten: 打出後的向聽數
+    - ukeire: 有效牌（34 編號）
+    - count: 有效牌的剩餘張數合計
+    - speed: 兩步速度（見 _two_step）；聽牌時等於 count
+    """
+    __slots__ = ('tid', 'shanten', 'ukeire', 'count', 'speed')
+
+    def __init__(self, tid, shanten, ukeire, count, speed):
+        self.tid = tid
+        self.shanten = shanten
+        self.ukeire = ukeire
+        self.count = count
+        self.speed = speed
+
+    def __repr__(self):
+        return f"DiscardEval({Tile.from_34_id(self.tid).helper_string}, shanten={self.shanten}, count={self.count}, speed={self.speed:.2f})"
+
+
+class CallEval:
+    """
+    鳴牌（碰／吃）後再打出最好的一張的評估。
+    - kind: 'pon' 或 'chi'
+    - used: 從手中拿出的兩張（34 編號）
+    - discard: 鳴牌後最好的打牌（DiscardEval）
+    """
+    __slots__ = ('kind', 'used', 'discard')
+
+    def __init__(self, kind, used, discard):
+        self.kind = kind
+        self.used = used
+        self.discard = discard
+
+    def __repr__(self):
+        return f"CallEval({self.kind}, used={self.used}, {self.discard})"
+
+
+@lru_cache(maxsize=1 << 16)
+def _ukeire(key: tuple[int, ...]) -> tuple[int, tuple[int, ...]]:
+    # 3n+1 張 → (向聽數, 有效牌)；兩步速度會重複查到同樣的手牌
+    counts = list(key)
+    shanten = calculate_shanten(counts)
+    after = get_shanten_table(counts, 1)
+    return shanten, tuple(tid for tid, s in enumerate(after) if s is not None and s < shanten)
+
+
+def _remaining(tiles, visible) -> int:
+    return sum(max(0, 4 - visible[tid]) for tid in tiles)
+
+
+def ukeire(counts: list[int], visible: list[int] = None) -> tuple[int, tuple[int, ...], int]:
+    """
+    3n+1 張手牌的 (向聽數, 有效牌, 有效牌剩餘張數)。
+    visible: 已看得到的各種牌張數（含自己手牌），預設只算手牌。
+    """
+    shanten, tiles = _ukeire(tuple(counts))
+    return shanten, tiles, _remaining(tiles, visible or counts)
+
+
+def _two_step(counts: list[int], tiles: tuple[int, ...], shanten: int, visible: list[int]) -> float:
+    """
+    兩步速度：摸進每張有效牌 t 後打出最好的一張，下一步的有效牌剩餘張數，
+    以 t 的剩餘張數加權平均（未見牌總數為分母），數字越大越快。
+    """
+    unseen = max(1, 136 - sum(visible))
+    total = 0
+    for t in tiles:
+        weight = max(0, 4 - visible[t])
+        if not weight:
+            continue
+        counts[t] += 1
+        best = 0
+        for d2, s in enumerate(get_shanten_table(counts, -1)):
+            if s is None or s >= shanten:
+                continue
+            counts[d2] -= 1
+            best = max(best, _remaining(_ukeire(tuple(counts))[1], visible))
+            counts[d2] += 1
+        counts[t] -= 1
+        total += weight * best
+    return total / unseen
+
+
+def evaluate_discards(counts: list[int], visible: list[int] = None, two_step: bool = True) -> list[DiscardEval]:
+    """
+    3n+2 張手牌：每種可打的牌打出後的向聽、有效牌與速度。
+    依 (向聽數, -速度, -有效牌張數, 牌) 排序，第一個即建議的打牌。
+    兩步速度只算向聽數最小、且為一向聽／兩向聽的打法（其餘以有效牌張數當速度）。
+    """
+    counts = list(counts)
+    visible = visible or counts
+    after = get_shanten_table(counts, -1)
+    best_shanten = min(s for s in after if s is not None)
+    result = []
+    for tid, shanten in enumerate(after):
+        if shanten is None:
+            continue
+        counts[tid] -= 1
+        _, tiles = _ukeire(tuple(counts))
+        count = _remaining(tiles, visible)
+        speed = float(count)
+        if two_step and shanten == best_shanten and 1 <= shanten <= 2:
+            speed = _two_step(counts, tiles, shanten, visible)
+        counts[tid] += 1
+        result.append(DiscardEval(tid, shanten, tiles, count, speed))
+    result.sort(key=lambda e: (e.shanten, -e.speed, -e.count, e.tid))
+    return result
+
+
+def evaluate_calls(counts: list[int], tid: int, visible: list[int] = None) -> list[CallEval]:
+    """
+    3n+1 張手牌對別人打出的 tid 可以做的碰／吃，各自鳴牌後打出最好的一張的評估。
+    依 (向聽數, -速度, -有效牌張數) 排序。
+    """
+    visible = visible or counts
+    patterns = []
+    if counts[tid] >= 2:
+        patterns.append(('pon', (tid, tid)))
+    if tid < 27:
+        v = tid % 9
+        for a, b in ((-2, -1), (-1, 1), (1, 2)):
+            if 0 <= v + a and v + b <= 8 and counts[tid + a] and counts[tid + b]:
+                patterns.append(('chi', (tid + a, tid + b)))
+
+    result = []
+    for kind, used in patterns:
+        rest = list(counts)
+        for u in used:
+            rest[u] -= 1
+        if not sum(rest):
+            continue
+        result.append(CallEval(kind, used, evaluate_discards(rest, visible)[0]))
+    result.sort(key=lambda c: (c.discard.shanten, -c.discard.speed, -c.discard.count))
+    return result
+
+
+# =======================
+# 讀 helper 的輸入字串、輸出選牌函式用的 HelperResult
+# =======================
+def parse_helper_input(input_str: str) -> tuple[list[int], list[int], int | None]:
+    """
+    format_tiles_for_helper 產生的字串（例如 '1230m 456p # 111z + 5m'）
+    → (手牌 34 格張數, 副露 34 格張數, 鳴牌分析的那張牌或 None)。0 代表紅 5。
+    """
+    hand = [0] * 34
+    melds = [0] * 34
+    drawn = None
+    target = hand
+    digits = []
+    for ch in input_str:
+        if ch == '#':
+            target = melds
+        elif ch == '+':
+            target = None
+        elif ch.isdigit():
+            digits.append(5 if ch == '0' else int(ch))
+        elif ch in _SUITS:
+            for v in digits:
+                tid = _SUITS[ch] + v - 1
+                if target is None:
+                    drawn = tid
+                else:
+                    target[tid] += 1
+            digits = []
+    return hand, melds, drawn
+
+
+def _block_name(shanten: int) -> str:
+    return SHANTEN_BLOCKS[min(max(shanten, 0), len(SHANTEN_BLOCKS) - 1)]
+
+
+def discard_result(evals: list[DiscardEval]) -> HelperResult:
+    """
+    把 evaluate_discards 的結果整理成選牌函式讀的 HelperResult（不經過 helper 的文字格式）。
+    向聽數較大的打法算在「向聽倒退」之後，且不給速度（單位與兩步速度不同，不能比較）。
+    沒有打點估計，score 一律為 None，依分數選牌的函式會回傳空字串，而不是改用有效牌張數排序。
+    """
+    discards = []
+    best = evals[0].shanten if evals else None
+    for e in evals:
+        block = _block_name(e.shanten)
+        before_backoff = e.shanten == best
+        discards.append(DiscardCandidate(
+            Tile.from_34_id(e.tid).helper_string,
+            None,
+            e.speed if before_backoff else None,
+            before_backoff,
+            block,
+            block in ('一向听', '两向听'),
+            before_backoff,
+        ))
+    return HelperResult("", tuple(discards), (), _block_name(best) if evals else None)
+
+
+def call_result(counts: list[int], tid: int, visible: list[int] = None) -> HelperResult:
+    """
+    鳴牌分析：第一個選項是不鳴牌時的有效牌張數，之後是各種鳴法（由好到壞）。
+    比不鳴牌時向聽數更差的鳴法不列出。
+    """
+    visible = visible or counts
+    shanten, _, count = ukeire(counts, visible)
+    options = [CallOption(count, True, None)]
+    for call in evaluate_calls(counts, tid, visible):
+        if call.discard.shanten > shanten:
+            continue
+        chi = None
+        if call.kind == 'chi':
+            a, b = call.used
+            chi = (f"{a % 9 + 1}{b % 9 + 1}", _CHI_SUITS[tid // 9])
+        options.append(CallOption(call.discard.count, True, chi))
+    return HelperResult("", (), tuple(options), _block_name(shanten))
+
+
+def analyze(hand: list[int], melds: list[int], drawn: int | None = None, seen: list[int] = None) -> HelperResult:
+    """
+    helper 的替代品：直接回傳結構化的結果。
+    - hand / melds: 手牌與副露的 34 格張數；drawn: 鳴牌分析的那張牌
+    - seen: 牌桌上公開的牌（各家牌河、副露、寶牌指示牌，見 Table.visible_counts），
+      不給時只看得到手牌、副露與 drawn（與 helper 拿到的資訊相同）
+    """
+    if seen is not None:
+        visible = [h + v for h, v in zip(hand, seen)]
+    else:
+        visible = [h + m for h, m in zip(hand, melds)]
+        if drawn is not None:
+            visible[drawn] += 1
+    if drawn is not None:
+        return call_result(hand, drawn, visible)
+    if sum(hand) % 3 == 2:
+        return discard_result(evaluate_discards(hand, visible))
+    shanten, _, count = ukeire(hand, visible)
+    return HelperResult("", (), (CallOption(count, True, None),), _block_name(shanten))
+
+
+def analyze_helper_input(input_str: str, seen: list[int] = None) -> HelperResult:
+    """
+    以 helper 的輸入字串（format_tiles_for_helper / helper_input_str）分析，參數見 analyze。
+    """
+    hand, melds, drawn = parse_helper_input(input_str)
+    return analyze(hand, melds, drawn, seen)
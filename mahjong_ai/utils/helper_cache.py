@@ -0,0 +1,173 @@
+# helper_cache.py - mahjong-helper 分析結果的快取：行程內 LRU + 多個行程共用的 SQLite 檔
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# 設定（可用環境變數覆寫）：
+#   MAHJONG_HELPER_CACHE       SQLite 檔路徑；設為 off 則只用記憶體 LRU
+#   MAHJONG_HELPER_CACHE_SIZE  記憶體 LRU 的筆數上限
+DEFAULT_CACHE_PATH = "mahjong_ai/data/helper_cache.sqlite"
+DEFAULT_MEMORY_SIZE = 65536
+
+
+class HelperCache:
+    def __init__(self, path: str | None = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MEMORY_SIZE, namespace: str = ""):
+        """
+        以 helper 的輸入字串（format_tiles_for_helper，鳴牌時含 "+ 牌"）為 key 快取輸出。
+        - 先查記憶體 LRU，再查磁碟；磁碟是 SQLite（WAL 模式），多個 self-play 行程可同時讀寫
+        - namespace：區分不同的 helper（例如正式執行檔與替代程式），結果不會混用
+        - 失敗的結果（空字串）不會存入，下次會重新呼叫
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def _db(self) -> sqlite3.Connection | None:
+        # fork 出來的子行程不能沿用父行程的連線，依 pid 重新開啟
+        if self.path is None:
+            return None
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS helper_cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            db = self._db()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT value FROM helper_cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        if not value:
+            return
+        with self._lock:
+            self._remember(key, value)
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO helper_cache (namespace, key, value) VALUES (?, ?, ?)",
+                    (self.namespace, key, value),
+                )
+
+    def get_or_compute(self, key: str, compute) -> str:
+        """
+        有快取就直接回傳，否則呼叫 compute(key) 並存入；同時累計命中率與耗時。
+        """
+        start = time.perf_counter()
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hit_seconds += time.perf_counter() - start
+            return value
+        # compute 不持有鎖（可能很慢），只有計數在鎖內更新，多執行緒同時呼叫時不會少算
+        value = compute(key)
+        self.put(key, value)
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            memory_hits, disk_hits, misses = self.memory_hits, self.disk_hits, self.misses
+            hit_seconds, miss_seconds = self.hit_seconds, self.miss_seconds
+        hits = memory_hits + disk_hits
+        total = hits + misses
+        return {
+            "requests": total,
+            "memory_hits": memory_hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "avg_hit_ms": hit_seconds / hits * 1e3 if hits else 0.0,
+            "avg_miss_ms": miss_seconds / misses * 1e3 if misses else 0.0,
+        }
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+_caches: dict[str, HelperCache] = {}
+_cache_lock = threading.Lock()
+
+
+def get_helper_cache(namespace: str = None) -> HelperCache:
+    """
+    行程內共用的快取（第一次用到才依環境變數建立）；namespace 預設為目前 helper 的指令。
+    不同 namespace 共用同一個 SQLite 檔，但結果分開存放。
+    """
+    if namespace is None:
+        from mahjong_ai.utils.helper_pool import get_helper_pool
+
+        namespace = " ".join(get_helper_pool().command)
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _cache_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                path = os.environ.get("MAHJONG_HELPER_CACHE", DEFAULT_CACHE_PATH)
+                size = int(os.environ.get("MAHJONG_HELPER_CACHE_SIZE", DEFAULT_MEMORY_SIZE))
+                cache = _caches[namespace] = HelperCache(None if path.lower() == "off" else path, size, namespace)
+    return cache
+
+
+def set_helper_cache(cache: HelperCache | None, namespace: str = None) -> None:
+    """
+    換掉某個 namespace 的快取；cache 為 None 時下次用到會依環境變數重建。
+    """
+    if namespace is None:
+        from mahjong_ai.utils.helper_pool import get_helper_pool
+
+        namespace = " ".join(get_helper_pool().command)
+    with _cache_lock:
+        if cache is None:
+            _caches.pop(namespace, None)
+        else:
+            _caches[namespace] = cache
@@ -1,28 +1,63 @@
 from mahjong_ai.table.tile import Tile
 from mahjong_ai.table.hand import Hand
-import subprocess
+from mahjong_ai.utils.helper_pool import get_helper_pool
+from mahjong_ai.utils.helper_cache import get_helper_cache
+from mahjong_ai.utils.helper_output import HelperResult, parse_helper_output
+from mahjong_ai.utils import efficiency
+import re
 import json
 import os
 from collections import defaultdict, Counter
 
 
+# helper 的實作：helper 為 mahjong-helper（helper_pool.py），native 為純 Python 的 efficiency.py
+# 預設由環境變數 MAHJONG_HELPER_BACKEND 決定，也可用 set_helper_backend() 在執行中切換
+HELPER_BACKENDS = ("helper", "native")
+_backend: str | None = None
+
+
+def helper_backend() -> str:
+    return _backend or os.environ.get("MAHJONG_HELPER_BACKEND", "helper")
+
+
+def set_helper_backend(name: str | None) -> None:
+    global _backend
+    if name is not None and name not in HELPER_BACKENDS:
+        raise ValueError(f"未知的 helper 實作：{name}")
+    _backend = name
+
+
+def helper_cache_stats() -> dict | None:
+    """目前實作的快取統計；native 不經過快取（結果依牌桌上看得到的牌而定），回傳 None"""
+    return None if helper_backend() == "native" else get_helper_cache().stats()
+
+
+def run_helper(input_str: str, visible: list[int] = None) -> str | HelperResult:
+    """
+    所有 helper 呼叫的入口，回傳值交給下面的選牌函式：
+    - helper：先查快取（helper_cache.py），沒有才交給工作池（helper_pool.py），回傳 helper 的輸出文字
+    - native：efficiency.py 直接回傳 HelperResult；visible 為牌桌上公開的牌（Table.visible_counts），
+      用來扣掉有效牌的剩餘張數。helper 的輸入格式只有手牌與副露，visible 對它沒有作用
+    """
+    if helper_backend() == "native":
+        return efficiency.analyze_helper_input(input_str, visible)
+    return get_helper_cache().get_or_compute(input_str, get_helper_pool().analyze)
+
+
+def _as_result(output_text: str | HelperResult) -> HelperResult:
+    # 選牌函式可直接收 helper 的輸出字串或已解析的結果
+    if isinstance(output_text, HelperResult):
+        return output_text
+    return parse_helper_output(output_text or "")
+
 
 def tile_to_helper_str(tile: Tile) -> str:
     """
     Convert Tile to mahjong-helper string format.
     e.g. 5m, 1p, E
     """
-    if tile.tile_type == 'man':
-        return f"{tile.tile_value}m"
-    elif tile.tile_type == 'pin':
-        return f"{tile.tile_value}p"
-    elif tile.tile_type == 'sou':
-        return f"{tile.tile_value}s"
-    elif tile.tile_type == 'honor':
-        return f"{tile.tile_value}z"
-    else:
-        return '?'  # unknown type
-    
+    return tile.helper_string
+
 def format_tiles_for_helper(tiles: list[Tile], melds: list = None) -> str:
     hand_grouped = defaultdict(list)
     meld_grouped = defaultdict(Counter)
@@ -58,7 +93,10 @@ def format_tiles_for_helper(tiles: list[Tile], melds: list = None) -> str:
     return f"{base_str} {' '.join(suffix_parts)}" if suffix_parts else base_str
 
 
-def mingpai_mahjong_helper(hand_tiles: list[Tile], melds: list = None, drawn_tile: Tile = None, river_tiles: list[Tile] = []) -> str:
+def helper_input_str(hand_tiles: list[Tile], melds: list = None, drawn_tile: Tile = None) -> str:
+    """
+    helper 的輸入字串；有 drawn_tile 時加上 "+ 牌"（鳴牌分析）。也是快取與延後標註 reward 的 key。
+    """
     input_str = format_tiles_for_helper(hand_tiles, melds)
 
     # 如果有新摸的牌，加入 + 表示
@@ -67,54 +105,25 @@ def mingpai_mahjong_helper(hand_tiles: list[Tile], melds: list = None, drawn_til
         if drawn_tile.is_aka_dora is True:
             drawn_str = '0' + drawn_str[-1]
         input_str += f" + {drawn_str}"
+    return input_str
+
 
+def mingpai_mahjong_helper(hand_tiles: list[Tile], melds: list = None, drawn_tile: Tile = None, visible: list[int] = None) -> str | HelperResult:
+    input_str = helper_input_str(hand_tiles, melds, drawn_tile)
     # print(input_str)
-    exe_path = r"C:\Mahjong\mahjong-helper\mahjong-helper.exe"
-
-    try:
-        result = subprocess.run(
-            [exe_path, input_str],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            encoding='utf-8'
-        )
-        # print("[mahjong-helper] stdout:", result.stdout)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print("[mahjong-helper] Error:", e.stderr)
-        return ""
-    except Exception as e:
-        print("[mahjong-helper] Unexpected error:", e)
-        return ""
+    return run_helper(input_str, visible)
     
-import re
 
-def pon_mingpai_top_two_lines(output_text: str) -> bool | list:
+def pon_mingpai_top_two_lines(output_text: str | HelperResult) -> bool | list:
     """
     從輸出中抓出前兩個開頭為整數的行，並比較其整數值。
-    回傳 True 表示第一個數字大於第二個數字，否則 False。
+    回傳 True 表示第一個數字小於第二個數字（碰比較好），否則 False（沒有碰的選項時也是 False）。
     """
-    lines = output_text.splitlines()
-    numbers = []
-
-    for line in lines:
-        line = line.strip()
-        match = re.match(r"^(\d+)\[", line)
-        if match:
-            numbers.append(int(match.group(1)))
-            if len(numbers) == 2:
-                break
-
-    if len(numbers) < 2:
-        print("[compare_mingpai_top_two_lines] 資料不足")
-        return False
+    options = [o for o in _as_result(output_text).options if o.bracket][:2]
+    return len(options) == 2 and options[0].count < options[1].count
 
-    return numbers[0] < numbers[1]
-import re
 
 def parse_tile_group(tile_str: str) -> list[int]:
-    print(f"[DEBUG] tile_str to parse: {repr(tile_str)}")
     match = re.fullmatch(r'(\d{2,3})([万饼索mps])', tile_str)
     if not match:
         print("❌ 無法解析 tile_str")
@@ -122,304 +131,75 @@ def parse_tile_group(tile_str: str) -> list[int]:
     digits, _ = match.groups()
     return [int(ch) for ch in digits]
 
-import re
-
 
-def chi_mingpai_top_two_lines(output_text: str, tile: Tile) -> bool | list:
+def chi_mingpai_top_two_lines(output_text: str | HelperResult, tile: Tile) -> bool | list:
     """
     比較開頭兩個數字，若第二個 > 第一個，解析第二行的吃牌資訊（例如45萬吃）並回傳組成list。
+    沒有鳴牌選項時回傳 False。
     """
-    lines = output_text.splitlines()
-    numbers = []
-    matched_lines = []
-
-    for line in lines:
-        line = line.strip()
-        # 僅比對行首開頭的數字，且後面是空白或中括號
-        match = re.match(r"^(\d+)(?:\s|\[)", line)
-        if match:
-            num = int(match.group(1))
-            numbers.append(num)
-            matched_lines.append(line)
-            if len(numbers) == 2:
-                break
-
-    if len(numbers) < 2:
-        print("[compare_mingpai_top_two_lines] 資料不足")
+    options = _as_result(output_text).options[:2]
+    if len(options) < 2:
         return False
 
-    # print("找到的前兩行開頭數字:", numbers[0], numbers[1])
-
-    if numbers[1] > numbers[0]:
-        chi_match = re.search(r"((\d{2,3})[万饼索mps])吃", matched_lines[1])
-        if chi_match:
-            chi_digits = chi_match.group(2)  # 只抓數字，例如 "57"
-            chi_suit = chi_match.group(1)[-1]  # 抓花色，例如 "万"
-            tile_str = str(tile)  # 例如 "6万"
-            
-            # 驗證 tile 是同樣花色
-            if tile_str[-1] != chi_suit:
-                print("❌ tile 花色與吃牌不符:", tile_str[-1], "!=", chi_suit)
-                return False
-
-            full_group = chi_digits + tile_str[0] + chi_suit  # 例如 "576万"
-            print(f"[DEBUG] chi_str = {full_group}")
-            chi_tiles = parse_tile_group(full_group)
-            return chi_tiles
-    return False
-
-
-
+    if options[1].count > options[0].count and options[1].chi:
+        chi_digits, chi_suit = options[1].chi  # 例如 "57", "万"
+        tile_str = str(tile)  # 例如 "6万"
 
+        # 驗證 tile 是同樣花色
+        if tile_str[-1] != chi_suit:
+            print("❌ tile 花色與吃牌不符:", tile_str[-1], "!=", chi_suit)
+            return False
 
+        # 用 tile_value 而不是 tile_str[0]（紅5的名稱是「紅5万」）
+        full_group = chi_digits + str(tile.tile_value) + chi_suit  # 例如 "576万"
+        return parse_tile_group(full_group)
+    return False
 
-import re
-from mahjong_ai.table.tile import Tile
 
-def call_mahjong_helper(hand_tiles: list[Tile], melds: list = None, river_tiles: list[Tile] = []) -> str:
+def call_mahjong_helper(hand_tiles: list[Tile], melds: list = None, visible: list[int] = None) -> str | HelperResult:
     input_str = format_tiles_for_helper(hand_tiles, melds)
     # print(input_str)
-    exe_path = r"C:\Mahjong\mahjong-helper\mahjong-helper.exe"
-
-    try:
-        result = subprocess.run(
-            [exe_path, input_str],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            encoding='utf-8'
-        )
-        # print("[mahjong-helper] stdout:", result.stdout)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print("[mahjong-helper] Error:", e.stderr)
-        return ""
-    except Exception as e:
-        print("[mahjong-helper] Unexpected error:", e)
-        return ""
+    return run_helper(input_str, visible)
     
-import re
-from mahjong_ai.table.tile import Tile
 
-def choose_first_3_discards_from_output(output_text: str) -> list[str]:
+def choose_first_3_discards_from_output(output_text: str | HelperResult) -> list[str]:
     """
     從 mahjong-helper 的輸出中選出前三個出現的丟牌（"切X"），並轉為 helper string 格式。
     """
-    lines = output_text.splitlines()
-    discards = []
-
-    for line in lines:
-        if "切" in line:
-            try:
-                match = re.search(r"切\s*(\S+)", line)
-                if match:
-                    tile_chinese = match.group(1)
-                    helper_str = Tile.from_chinese_string(tile_chinese).to_helper_string()
-                    if helper_str not in discards:
-                        discards.append(helper_str)
-                if len(discards) == 3:
-                    break
-            except Exception as e:
-                print("[choose_first_3_discards_from_output] 解析錯誤：", e, "in line:", line)
-                continue
-
-    return discards
-
-def test_call_mahjong_helper(input_str: str, river_tiles: list[Tile] = []) -> str:
-
-    exe_path = r"C:\Mahjongmahjong-helper\mahjong-helper.exe"
-
-    try:
-        result = subprocess.run(
-            [exe_path, input_str],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            encoding='utf-8'
-        )
-        #　print("[mahjong-helper] stdout:", result.stdout)
-        return result.stdout  # ✅ 回傳純 str
-    except subprocess.CalledProcessError as e:
-        print("[mahjong-helper] Error:", e.stderr)
-        return ""
-    except Exception as e:
-        print("[mahjong-helper] Unexpected error:", e)
-        return ""
+    return _as_result(output_text).top_discards(3)
 
+def test_call_mahjong_helper(input_str: str, visible: list[int] = None) -> str | HelperResult:
+
+    return run_helper(input_str, visible)
 
-import re
-from mahjong_ai.table.tile import Tile
 
-def choose_best_discard_from_output(output_text: str) -> str:
+def choose_best_discard_from_output(output_text: str | HelperResult) -> str:
     """
     從 mahjong-helper 的輸出中選出第一個出現的丟牌。
     """
-    lines = output_text.splitlines()
-    for line in lines:
-        if "切" in line:
-            try:
-                tile_chinese = re.search(r"切\s*(\S+)", line).group(1)
-                return Tile.from_chinese_string(tile_chinese).to_helper_string()
-            except Exception as e:
-                print("[choose_best_discard_from_output] 解析錯誤：", e, "in line:", line)
-                continue
-    return ""
+    return _as_result(output_text).best_discard()
 
-import re
-from mahjong_ai.table.tile import Tile
 
-def choose_discard_by_points(output_text: str) -> str:
+def choose_discard_by_points(output_text: str | HelperResult) -> str:
     """
     根據 mahjong-helper 輸出選擇：
     - 最小向聽數的區塊
     - 該區塊中分數最高的切牌
-    回傳 helper 格式（如 '5m'、'7z'）
+    回傳 helper 格式（如 '5m'、'7z'）；沒有分數（native）時回傳空字串
     """
-    block_priority = ['听牌', '一向听', '两向听', '三向听', '四向听', '五向听', '六向听', '七向听']
-    current_block = None
-    best_tile = ""
-    best_score = -float("inf")
-    found_block = None
-
-    for line in output_text.splitlines():
-        line = line.strip()
-
-        # 若有“建议向听倒退”整段略過
-        if "建议向听倒退" in line:
-            break
-
-        # 決定目前屬於哪一個向聽區段
-        for b in block_priority:
-            if b in line:
-                current_block = b
-                break
-
-        # 只保留最優先的區段
-        if found_block is not None and current_block != found_block:
-            continue
-        if found_block is None and current_block in block_priority:
-            found_block = current_block
-
-        if "切" not in line:
-            continue
-
-        try:
-            # 抓 tile 名稱
-            tile_match = re.search(r"切\s*(\S+)", line)
-            score_match = re.search(r"\[(\d+\.\d+)\]", line)
-            if not tile_match or not score_match:
-                continue
-
-            tile_chinese = tile_match.group(1).strip()
-            score = float(score_match.group(1))
-
-            if score > best_score:
-                best_score = score
-                best_tile = Tile.from_chinese_string(tile_chinese).to_helper_string()
-        except Exception as e:
-            print("[choose_discard_by_points] 解析錯誤：", e, "in line:", line)
-            continue
-
-    return best_tile
-
-  
-def choose_discard_by_speed(output_text: str) -> str:
+    return _as_result(output_text).discard_by_points()
+
+def choose_discard_by_speed(output_text: str | HelperResult) -> str:
     """
     根據 mahjong-helper 的輸出，找出速度最高的丟牌。
     """
-    best_tile = ""
-    best_speed = -float("inf")
-    lines = output_text.splitlines()
-
-    for line in lines:
-        if "切" not in line or "速度" not in line:
-            continue
-        try:
-            # 取得速度數值
-            speed_match = re.search(r"\[(\d+\.\d+)\s*速度\]", line)
-            if not speed_match:
-                continue
-            speed = float(speed_match.group(1))
-
-            # 抓 tile
-            tile_chinese = re.search(r"切\s*(\S+)", line).group(1)
-            helper_tile = Tile.from_chinese_string(tile_chinese).to_helper_string()
-
-            if speed > best_speed:
-                best_speed = speed
-                best_tile = helper_tile
-
-        except Exception as e:
-            print("[choose_discard_by_speed] 解析錯誤：", e, "in line:", line)
-            continue
-
-    return best_tile
+    return _as_result(output_text).discard_by_speed()
 
-import re
-from mahjong_ai.table.tile import Tile
 
-def choose_comprehensive_discard_from_output(output_text: str) -> str:
+def choose_comprehensive_discard_from_output(output_text: str | HelperResult) -> str:
     """
     綜合選擇出牌策略：
-    - 如果是聽牌（出現 "聽牌" 或 "和了"）→ 丟第一個出現的切牌
     - 如果是 “两向听” 或 “一向听” → 用速度最高的
     - 否則 → 用分數最高的
     """
-    lines = output_text.splitlines()
-    
-    # 🔍 檢查是否為聽牌狀態
-    ##⚙️⚙️⚙️⚙️⚙️⚙️有 bug⚙️⚙️⚙️⚙️⚙️⚙️
-    # for line in lines:
-    #     if "听牌" in line or "和了" in line:
-    #         for l in lines:
-    #             if "切" in l:
-    #                 try:
-    #                     tile_chinese = l.split("切", 1)[1].strip().split()[0]
-    #                     return Tile.from_chinese_string(tile_chinese).to_helper_string()
-    #                 except Exception as e:
-    #                     print("[choose_discard_from_output] 聽牌解析錯誤：", e, "in line:", l)
-    #                     continue
-    #         return ""  # 找不到切牌也回傳空字串
-    # ⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️⚙️
-    
-    best_tile = ""
-    best_metric = -float("inf")
-    in_two_shanten_block = False
-
-    for line in lines:
-        if "两向听" in line or "一向听" in line:
-            in_two_shanten_block = True
-        elif "三向听" in line or "四向听" in line:
-            in_two_shanten_block = False
-
-        if "切" not in line or "速度" not in line:
-            continue
-
-        try:
-            tile_match = re.search(r"切\s*(\S+)", line)
-            if not tile_match:
-                continue
-            tile_chinese = tile_match.group(1).strip()
-            helper_tile = Tile.from_chinese_string(tile_chinese).to_helper_string()
-
-            if in_two_shanten_block:
-                print("t")  
-                speed_match = re.search(r"\[(\d+\.\d+)\s*速度\]", line)
-                if not speed_match:
-                    continue
-                metric = float(speed_match.group(1))
-            else:
-                score_match = re.search(r"\[(\d+\.\d+)\]", line)
-                if not score_match:
-                    continue
-                metric = float(score_match.group(1))
-
-            if metric > best_metric:
-                best_metric = metric
-                best_tile = helper_tile
-
-        except Exception as e:
-            print("[choose_discard_from_output] 解析錯誤：", e, "in line:", line)
-            continue
-
-    return best_tile
+    return _as_result(output_text).comprehensive_discard()
@@ -0,0 +1,173 @@
+# helper_output.py - 把 mahjong-helper 的輸出解析一次成結構化結果，各種選牌策略都從這裡讀
+
+import re
+from functools import lru_cache
+
+from mahjong_ai.table.tile import Tile
+
+# 向聽區段名稱（依優先順序）
+SHANTEN_BLOCKS = ('听牌', '一向听', '两向听', '三向听', '四向听', '五向听', '六向听', '七向听')
+# 出現這行之後是「向聽倒退」的建議，依分數選牌時不看
+BACKOFF_MARK = "建议向听倒退"
+
+_DISCARD_RE = re.compile(r"切\s*(\S+)")
+_SCORE_RE = re.compile(r"\[(\d+\.\d+)\]")
+_SPEED_RE = re.compile(r"\[(\d+\.\d+)\s*速度\]")
+_OPTION_RE = re.compile(r"^(\d+)(\s|\[)")
+_CHI_RE = re.compile(r"((\d{2,3})[万饼索mps])吃")
+
+
+class DiscardCandidate:
+    """
+    一行「切 X」的建議。
+    - tile: helper 格式（如 '5m'）
+    - score / speed: 行中的 [12.34] 與 [12.34 速度]，沒有則為 None（native 沒有打點估計，score 一律為 None）
+    - has_speed_tag: 行中是否有「速度」字樣
+    - block: 所在的向聽區段（SHANTEN_BLOCKS 之一，之前沒有區段標題則為 None）
+    - near_tenpai: 是否在一向聽 / 兩向聽區段
+    - before_backoff: 是否在「建议向听倒退」之前
+    """
+    __slots__ = ('tile', 'score', 'speed', 'has_speed_tag', 'block', 'near_tenpai', 'before_backoff')
+
+    def __init__(self, tile, score, speed, has_speed_tag, block, near_tenpai, before_backoff):
+        self.tile = tile
+        self.score = score
+        self.speed = speed
+        self.has_speed_tag = has_speed_tag
+        self.block = block
+        self.near_tenpai = near_tenpai
+        self.before_backoff = before_backoff
+
+    def __repr__(self):
+        return f"DiscardCandidate({self.tile}, score={self.score}, speed={self.speed}, block={self.block})"
+
+
+class CallOption:
+    """
+    鳴牌分析中以數字開頭的一行（第一行是不鳴的選項，之後是各種鳴法）。
+    - count: 行首的數字
+    - bracket: 數字後是否緊接 '['
+    - chi: 行中「45万吃」之類的吃法 (數字, 花色)，沒有則為 None
+    """
+    __slots__ = ('count', 'bracket', 'chi')
+
+    def __init__(self, count, bracket, chi):
+        self.count = count
+        self.bracket = bracket
+        self.chi = chi
+
+    def __repr__(self):
+        return f"CallOption({self.count}, chi={self.chi})"
+
+
+class HelperResult:
+    """
+    parse_helper_output 的結果（唯讀，會被多個呼叫端共用）。
+    """
+    __slots__ = ('text', 'discards', 'options', 'first_block')
+
+    def __init__(self, text: str, discards: tuple, options: tuple, first_block: str | None):
+        self.text = text
+        self.discards: tuple[DiscardCandidate, ...] = discards
+        self.options: tuple[CallOption, ...] = options
+        self.first_block = first_block   # 倒退建議之前出現的第一個向聽區段
+
+    def best_discard(self) -> str:
+        """第一個建議的切牌"""
+        return self.discards[0].tile if self.discards else ""
+
+    def top_discards(self, n: int = 3) -> list[str]:
+        """前 n 個不重複的切牌"""
+        result = []
+        for d in self.discards:
+            if d.tile not in result:
+                result.append(d.tile)
+                if len(result) == n:
+                    break
+        return result
+
+    def discard_by_points(self) -> str:
+        """最小向聽區段（不含向聽倒退）中分數最高的切牌；沒有分數時為空字串"""
+        return _argmax(
+            (d.score, d.tile) for d in self.discards
+            if d.before_backoff and d.block in (None, self.first_block)
+        )
+
+    def discard_by_speed(self) -> str:
+        """速度最高的切牌"""
+        return _argmax((d.speed, d.tile) for d in self.discards)
+
+    def comprehensive_discard(self) -> str:
+        """一向聽 / 兩向聽看速度，其他看分數"""
+        return _argmax(
+            (d.speed if d.near_tenpai else d.score, d.tile) for d in self.discards if d.has_speed_tag
+        )
+
+
+def _argmax(pairs) -> str:
+    # 取值最大的牌（同分取先出現的），值為 None 的略過
+    best_tile = ""
+    best = -float("inf")
+    for value, tile in pairs:
+        if value is not None and value > best:
+            best = value
+            best_tile = tile
+    return best_tile
+
+
+@lru_cache(maxsize=4096)
+def parse_helper_output(text: str) -> HelperResult:
+    """
+    逐行掃過 helper 輸出一次，整理出切牌建議與鳴牌選項；同一段輸出只解析一次。
+    """
+    discards = []
+    options = []
+    block = None
+    first_block = None
+    near_tenpai = False
+    before_backoff = True
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if BACKOFF_MARK in line:
+            before_backoff = False
+        if "听" in line:
+            for name in SHANTEN_BLOCKS:
+                if name in line:
+                    block = name
+                    break
+            if "两向听" in line or "一向听" in line:
+                near_tenpai = True
+            elif "三向听" in line or "四向听" in line:
+                near_tenpai = False
+        if before_backoff and first_block is None:
+            first_block = block
+
+        match = _OPTION_RE.match(line)
+        if match:
+            chi = _CHI_RE.search(line)
+            options.append(CallOption(int(match.group(1)), match.group(2) == '[', chi and (chi.group(2), chi.group(1)[-1])))
+
+        if "切" not in line:
+            continue
+        match = _DISCARD_RE.search(line)
+        if not match:
+            continue
+        try:
+            tile = Tile.from_chinese_string(match.group(1).strip()).helper_string
+        except ValueError as e:
+            print("[parse_helper_output] 解析錯誤：", e, "in line:", line)
+            continue
+        score = _SCORE_RE.search(line)
+        speed = _SPEED_RE.search(line)
+        discards.append(DiscardCandidate(
+            tile,
+            float(score.group(1)) if score else None,
+            float(speed.group(1)) if speed else None,
+            "速度" in line,
+            block,
+            near_tenpai,
+            before_backoff,
+        ))
+
+    return HelperResult(text, tuple(discards), tuple(options), first_block)
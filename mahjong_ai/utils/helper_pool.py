@@ -0,0 +1,300 @@
+# helper_pool.py - mahjong-helper 工作池：常駐行程、可連續送出多個請求（pipelining）、逾時與自動重啟
+
+import collections
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 設定（皆可用環境變數覆寫）：
+#   MAHJONG_HELPER_PATH     helper 執行檔或完整指令（Linux 上可換成本機的替代程式）
+#   MAHJONG_HELPER_MODE     spawn：每個請求啟動一次 helper（原版 mahjong-helper 的命令列用法）
+#                           persistent：每個 worker 常駐一個行程，以下方的行協定溝通
+#   MAHJONG_HELPER_WORKERS  worker 數
+#   MAHJONG_HELPER_TIMEOUT  單一請求逾時秒數，逾時的行程會被結束並重啟
+#   MAHJONG_HELPER_INFLIGHT persistent 模式每個行程最多同時送出的請求數（超過時 submit 等待）
+DEFAULT_EXE_PATH = r"C:\Mahjong\mahjong-helper\mahjong-helper.exe"
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_INFLIGHT = 64
+
+# persistent 模式的行協定：stdin 每行一個請求（與命令列參數相同的手牌字串），
+# stdout 輸出分析結果後再輸出一行 END_MARKER；回應順序與請求順序相同，因此可以連續送出多個請求。
+# 原版 mahjong-helper 沒有這個模式，可用 helper_server.py 當常駐行程（以 efficiency.py 分析，或轉送給原版 helper）：
+#   MAHJONG_HELPER_MODE=persistent MAHJONG_HELPER_PATH="python -m mahjong_ai.utils.helper_server"
+END_MARKER = "<<<END>>>"
+
+
+def split_command(command: str) -> list[str]:
+    """
+    指令字串 → argv；存在的檔案路徑或不含空白時直接使用（Windows 路徑含反斜線與空白）。
+    """
+    if os.path.exists(command) or not any(c.isspace() for c in command):
+        return [command]
+    return shlex.split(command, posix=os.name != "nt")
+
+
+class _PersistentWorker:
+    def __init__(self, command: list[str], timeout: float, max_inflight: int = DEFAULT_MAX_INFLIGHT):
+        """
+        一個常駐的 helper 行程；請求不等前一個回應就送出（pending 依序對應回應）。
+        寫入 stdin 由專屬的寫入執行緒負責，不持有 lock：pipe 滿了只會卡住寫入執行緒，
+        讀取執行緒與逾時檢查仍可取得 lock，helper 的輸出持續被讀走，不會互相等待。
+        同時送出的請求最多 max_inflight 個，超過時 submit 等到有回應為止。
+        """
+        self.command = command
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.pending = collections.deque()   # [input_str, future, deadline]，deadline 只在輪到它時設定
+        self.proc: subprocess.Popen | None = None
+        self.restarts = 0
+        self.timeouts = 0
+        self.error: str | None = None
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._writes = queue.Queue()   # (proc, input_str)；None 表示結束
+        threading.Thread(target=self._write_loop, daemon=True).start()
+        self._start()
+
+    def _start(self) -> None:
+        try:
+            self.proc = subprocess.Popen(
+                self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                encoding='utf-8', bufsize=1,
+            )
+        except Exception as e:
+            self.proc = None
+            self.error = str(e)
+            return
+        self.error = None
+        threading.Thread(target=self._read_loop, args=(self.proc,), daemon=True).start()
+
+    def inflight(self) -> int:
+        return len(self.pending)
+
+    def submit(self, input_str: str, future: Future) -> None:
+        # 名額在 future 有結果（回應、失敗或逾時）時歸還
+        self._slots.acquire()
+        future.add_done_callback(lambda _: self._slots.release())
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                # 閒置時結束的行程在下一個請求才重啟
+                self._start()
+            if self.proc is None:
+                _fail(future, f"無法啟動：{self.error}")
+                return
+            entry = [input_str, future, None]
+            self.pending.append(entry)
+            if len(self.pending) == 1:
+                entry[2] = time.monotonic() + self.timeout
+            self._writes.put((self.proc, input_str))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            proc, input_str = item
+            try:
+                proc.stdin.write(input_str + "\n")
+                proc.stdin.flush()
+            except (OSError, ValueError):
+                # 寫入失敗表示行程已結束（或已被重啟取代），交給讀取執行緒偵測並重啟
+                pass
+
+    def _read_loop(self, proc: subprocess.Popen) -> None:
+        lines = []
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            if line != END_MARKER:
+                lines.append(line)
+                continue
+            with self.lock:
+                if proc is not self.proc or not self.pending:
+                    return
+                _, future, _ = self.pending.popleft()
+                if self.pending:
+                    self.pending[0][2] = time.monotonic() + self.timeout
+            future.set_result("\n".join(lines) + "\n" if lines else "")
+            lines = []
+        with self.lock:
+            if proc is self.proc and self.pending:
+                self._restart_locked("行程意外結束")
+
+    def check_timeout(self, now: float) -> None:
+        with self.lock:
+            if self.pending and self.pending[0][2] is not None and now > self.pending[0][2]:
+                self.timeouts += 1
+                self._restart_locked("逾時")
+
+    def _restart_locked(self, reason: str) -> None:
+        """
+        結束目前行程並重啟：卡住的那個請求回傳空字串，其餘請求重新送給新行程。
+        """
+        if self.proc is not None:
+            self.proc.kill()
+        if self.pending:
+            input_str, future, _ = self.pending.popleft()
+            _fail(future, f"{reason}：{input_str}")
+        retry = list(self.pending)
+        self.pending.clear()
+        self.restarts += 1
+        self._start()
+        for input_str, future, _ in retry:
+            if self.proc is None:
+                _fail(future, f"無法重啟：{self.error}")
+                continue
+            self.pending.append([input_str, future, None])
+            self._writes.put((self.proc, input_str))
+        if self.pending:
+            self.pending[0][2] = time.monotonic() + self.timeout
+
+    def close(self) -> None:
+        with self.lock:
+            proc, self.proc = self.proc, None
+            pending = list(self.pending)
+            self.pending.clear()
+        self._writes.put(None)
+        for _, future, _ in pending:
+            _fail(future, "工作池已關閉")
+        if proc is not None:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=1)
+            except Exception:
+                proc.kill()
+
+
+def _fail(future: Future, message: str) -> None:
+    # 與原本 subprocess.run 失敗時相同：印出錯誤並回傳空字串，呼叫端照常處理
+    print("[mahjong-helper] Error:", message)
+    if not future.done():
+        future.set_result("")
+
+
+class HelperPool:
+    def __init__(self, command: str = None, workers: int = None, timeout: float = None, mode: str = None,
+                 max_inflight: int = None):
+        """
+        mahjong-helper 工作池。submit() 立即回傳 Future，可一次送出多個請求再取結果；analyze() 為同步版本。
+        - spawn 模式：worker 執行緒各自啟動 helper，最多同時 workers 個行程
+        - persistent 模式：每個 worker 一個常駐行程，請求分給待處理最少的行程，逾時或結束時自動重啟；
+          每個行程最多 max_inflight 個請求在途，滿了 submit 會等待
+        失敗或逾時一律回傳空字串（與原本的呼叫方式相同）。
+        """
+        self.command = split_command(command or os.environ.get("MAHJONG_HELPER_PATH", DEFAULT_EXE_PATH))
+        self.workers = workers or int(os.environ.get("MAHJONG_HELPER_WORKERS", DEFAULT_WORKERS))
+        self.timeout = timeout or float(os.environ.get("MAHJONG_HELPER_TIMEOUT", DEFAULT_TIMEOUT))
+        self.mode = mode or os.environ.get("MAHJONG_HELPER_MODE", "spawn")
+        self.max_inflight = max_inflight or int(os.environ.get("MAHJONG_HELPER_INFLIGHT", DEFAULT_MAX_INFLIGHT))
+        if self.mode not in ("spawn", "persistent"):
+            raise ValueError(f"未知的 helper 模式：{self.mode}")
+        self.requests = 0
+        self._closed = False
+        if self.mode == "spawn":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mahjong-helper")
+        else:
+            self._workers = [_PersistentWorker(self.command, self.timeout, self.max_inflight) for _ in range(self.workers)]
+            threading.Thread(target=self._watchdog, daemon=True).start()
+
+    def submit(self, input_str: str) -> Future:
+        self.requests += 1
+        if self.mode == "spawn":
+            return self._executor.submit(self._spawn, input_str)
+        future = Future()
+        min(self._workers, key=_PersistentWorker.inflight).submit(input_str, future)
+        return future
+
+    def analyze(self, input_str: str) -> str:
+        return self.submit(input_str).result()
+
+    def map(self, inputs) -> list[str]:
+        """
+        先全部送出再依序取回結果。
+        """
+        futures = [self.submit(s) for s in inputs]
+        return [f.result() for f in futures]
+
+    def _spawn(self, input_str: str) -> str:
+        try:
+            result = subprocess.run(
+                self.command + [input_str],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True,
+                encoding='utf-8',
+                timeout=self.timeout,
+            )
+            return result.stdout
+        except subprocess.CalledProcessError as e:
+            print("[mahjong-helper] Error:", e.stderr)
+            return ""
+        except Exception as e:
+            print("[mahjong-helper] Unexpected error:", e)
+            return ""
+
+    def _watchdog(self) -> None:
+        interval = min(0.1, self.timeout / 4)
+        while not self._closed:
+            time.sleep(interval)
+            now = time.monotonic()
+            for worker in self._workers:
+                worker.check_timeout(now)
+
+    def stats(self) -> dict:
+        if self.mode == "spawn":
+            return {"mode": self.mode, "requests": self.requests}
+        return {
+            "mode": self.mode,
+            "requests": self.requests,
+            "restarts": sum(w.restarts for w in self._workers),
+            "timeouts": sum(w.timeouts for w in self._workers),
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        if self.mode == "spawn":
+            self._executor.shutdown(wait=True)
+        else:
+            for worker in self._workers:
+                worker.close()
+
+
+_pool: HelperPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_helper_pool() -> HelperPool:
+    """
+    行程內共用的工作池（第一次用到才依環境變數建立）。
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HelperPool()
+    return _pool
+
+
+def set_helper_pool(pool: HelperPool | None) -> None:
+    """
+    換掉共用的工作池（例如改用其他執行檔或模式）；舊的會被關閉。
+    """
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old is not None and old is not pool:
+        old.close()
+
+
+if __name__ == "__main__":
+    # python -m mahjong_ai.utils.helper_pool "34068m 5678p 23567s" ...：以目前設定分析手牌並顯示統計
+    pool = get_helper_pool()
+    start = time.perf_counter()
+    for text in pool.map(sys.argv[1:]):
+        print(text)
+    print(f"[helper_pool] {pool.stats()}  {time.perf_counter() - start:.3f}s")
+    pool.close()
@@ -0,0 +1,103 @@
+# helper_server.py - helper_pool 的 persistent 模式用的常駐行程：stdin 每行一個請求，輸出 helper 格式的結果與 END_MARKER
+#
+# 用法（行協定見 helper_pool.py）：
+#   MAHJONG_HELPER_MODE=persistent MAHJONG_HELPER_PATH="python -m mahjong_ai.utils.helper_server"
+#       以 efficiency.py 分析（不需要 helper 執行檔，Linux 上也能用）
+#   MAHJONG_HELPER_MODE=persistent MAHJONG_HELPER_PATH="python -m mahjong_ai.utils.helper_server --helper C:\Mahjong\mahjong-helper\mahjong-helper.exe"
+#       每個請求啟動一次原版 mahjong-helper，原樣轉送它的輸出
+# 請求無法分析時回傳空的回應（只有 END_MARKER），錯誤訊息寫到 stderr，行程不結束。
+
+import argparse
+import subprocess
+import sys
+
+from mahjong_ai.table.tile import Tile
+from mahjong_ai.utils.efficiency import analyze_helper_input
+from mahjong_ai.utils.helper_output import BACKOFF_MARK, HelperResult
+from mahjong_ai.utils.helper_pool import END_MARKER, split_command
+
+
+def render_result(result: HelperResult) -> str:
+    """
+    HelperResult → helper 格式的文字，parse_helper_output 解析後得到相同的切牌建議與鳴牌選項。
+    沒有分數（native 沒有打點估計）時不輸出分數欄，只輸出「速度」。
+    """
+    lines = []
+    block = None
+    backoff = False
+    if result.options and result.first_block is not None:
+        lines.append(f"{result.first_block}：")
+    for option in result.options:
+        if option.chi:
+            digits, suit = option.chi
+            lines.append(f"{option.count}[{digits}{suit}吃]")
+        else:
+            lines.append(f"{option.count}[]")
+    for d in result.discards:
+        if not d.before_backoff and not backoff:
+            lines.append(BACKOFF_MARK)
+            backoff = True
+        if d.block != block and d.block is not None:
+            lines.append(f"{d.block}：")
+            block = d.block
+        line = f"切 {Tile.from_helper_string(d.tile)}"
+        if d.score is not None:
+            line += f" [{d.score:.6f}]"
+        if d.speed is not None:
+            line += f" [{d.speed:.6f} 速度]"
+        elif d.has_speed_tag:
+            line += " 速度"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def native_analyze(input_str: str) -> str:
+    return render_result(analyze_helper_input(input_str))
+
+
+def helper_analyze(command: list[str], timeout: float):
+    """
+    每個請求啟動一次原版 helper（命令列用法），回傳它的輸出。
+    """
+    def analyze(input_str: str) -> str:
+        result = subprocess.run(
+            command + [input_str], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            check=True, encoding='utf-8', timeout=timeout,
+        )
+        return result.stdout.rstrip("\n")
+    return analyze
+
+
+def serve(analyze, stdin=None, stdout=None) -> None:
+    """
+    逐行讀請求、依序回應；每個回應後面接一行 END_MARKER 並立即 flush（pool 會連續送出多個請求）。
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        input_str = line.strip()
+        try:
+            text = analyze(input_str) if input_str else ""
+        except Exception as e:
+            print(f"[helper_server] Error: {e!r} in request: {input_str}", file=sys.stderr)
+            text = ""
+        if text:
+            stdout.write(text + "\n")
+        stdout.write(END_MARKER + "\n")
+        stdout.flush()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--helper", default=None, help="改為轉送給原版 mahjong-helper（執行檔或完整指令）")
+    parser.add_argument("--timeout", type=float, default=10.0, help="--helper 時單一請求的逾時秒數")
+    args = parser.parse_args(argv)
+
+    for stream in (sys.stdin, sys.stdout):
+        stream.reconfigure(encoding='utf-8')
+    analyze = helper_analyze(split_command(args.helper), args.timeout) if args.helper else native_analyze
+    serve(analyze)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# test_helper_pool.py - 以 helper_server 當常駐行程跑 HelperPool 的 persistent 模式：
+# 連續送出多個請求（pipelining）、逾時回傳空字串、行程結束後自動重啟
+
+import os
+import random
+import shlex
+import sys
+import textwrap
+
+import pytest
+
+from mahjong_ai.utils.helper_output import parse_helper_output
+from mahjong_ai.utils.helper_pool import HelperPool
+from mahjong_ai.utils.helper_server import native_analyze
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HAND = "34068m 5678p 23567s"
+CALL = "1234m 456p 789s 11z + 3m"
+
+# 測試用的啟動腳本：收到 sleep 就卡住、收到 exit 就結束行程，其他請求照常交給 helper_server
+FAULTY_SERVER = textwrap.dedent("""
+    import os, time
+    from mahjong_ai.utils import helper_server
+
+    def analyze(input_str):
+        if input_str == "sleep":
+            time.sleep(60)
+        if input_str == "exit":
+            os._exit(1)
+        return helper_server.native_analyze(input_str)
+
+    helper_server.serve(analyze)
+""")
+
+
+@pytest.fixture(autouse=True)
+def repo_on_path(monkeypatch):
+    # helper 行程由 pool 以 subprocess 啟動，要能 import mahjong_ai
+    monkeypatch.setenv("PYTHONPATH", REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+
+def command(*args) -> str:
+    return " ".join(shlex.quote(str(a)) for a in (sys.executable, *args))
+
+
+def expected(input_str: str) -> str:
+    # pool 回傳的是 END_MARKER 之前的各行（含結尾換行）
+    text = native_analyze(input_str)
+    return text + "\n" if text else ""
+
+
+def random_hands(n: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    hands = []
+    for i in range(n):
+        tiles = rng.sample(range(136), 13 if i % 3 == 0 else 14)
+        hand = " ".join(
+            "".join(str(t // 4 % 9 + 1) for t in tiles if t // 36 == k) + "mpsz"[k]
+            for k in range(4) if any(t // 36 == k for t in tiles)
+        )
+        if i % 3 == 0:
+            drawn = rng.randrange(108)
+            hand += f" + {drawn // 4 % 9 + 1}{'mps'[drawn // 36]}"
+        hands.append(hand)
+    return hands
+
+
+@pytest.fixture
+def faulty_script(tmp_path):
+    path = tmp_path / "faulty_server.py"
+    path.write_text(FAULTY_SERVER, encoding='utf-8')
+    return path
+
+
+def test_pipelining():
+    inputs = random_hands(300, seed=0)
+    inputs[100] = "99z"   # 無法分析的請求：回應是空的，之後的請求不受影響
+    pool = HelperPool(command=command("-m", "mahjong_ai.utils.helper_server"), workers=2, timeout=30,
+                      mode="persistent", max_inflight=16)
+    try:
+        results = pool.map(inputs)
+        stats = pool.stats()
+    finally:
+        pool.close()
+
+    assert results[100] == ""
+    assert results[:100] + results[101:] == [expected(s) for s in inputs[:100] + inputs[101:]]
+    assert parse_helper_output(results[1]).best_discard() == parse_helper_output(expected(inputs[1])).best_discard()
+    assert stats["requests"] == len(inputs) and stats["restarts"] == 0 and stats["timeouts"] == 0
+
+
+def test_timeout_returns_empty_and_restarts(faulty_script):
+    pool = HelperPool(command=command(faulty_script), workers=1, timeout=0.5, mode="persistent")
+    try:
+        futures = [pool.submit(s) for s in (HAND, "sleep", CALL, HAND)]
+        results = [f.result(timeout=30) for f in futures]
+        stats = pool.stats()
+    finally:
+        pool.close()
+
+    # 卡住的請求回傳空字串，排在它後面的請求改送給重啟後的行程
+    assert results == [expected(HAND), "", expected(CALL), expected(HAND)]
+    assert stats["timeouts"] == 1 and stats["restarts"] == 1
+
+
+def test_crash_restarts(faulty_script):
+    pool = HelperPool(command=command(faulty_script), workers=1, timeout=30, mode="persistent")
+    try:
+        futures = [pool.submit(s) for s in (HAND, "exit", CALL, HAND)]
+        results = [f.result(timeout=30) for f in futures]
+        after = pool.analyze(CALL)
+        stats = pool.stats()
+    finally:
+        pool.close()
+
+    assert results == [expected(HAND), "", expected(CALL), expected(HAND)]
+    assert after == expected(CALL)
+    assert stats["timeouts"] == 0 and stats["restarts"] == 1
+
+
+def test_wraps_stock_helper(tmp_path):
+    # --helper：每個請求以命令列參數啟動一次 helper，原樣轉送輸出（這裡用印出參數的腳本代替）
+    fake_helper = tmp_path / "fake_helper.py"
+    fake_helper.write_text("import sys\nprint('切 ' + sys.argv[1])\n", encoding='utf-8')
+    server = command("-m", "mahjong_ai.utils.helper_server", "--helper", command(fake_helper))
+    pool = HelperPool(command=server, workers=1, timeout=30, mode="persistent")
+    try:
+        results = pool.map(["1m", "2p", "3s"])
+    finally:
+        pool.close()
+
+    assert results == ["切 1m\n", "切 2p\n", "切 3s\n"]
@@ -0,0 +1,180 @@
+# test_obs_roundtrip.py - 以真實牌局的 obs 檢查緊湊格式的還原：compress_obs / expand_obs、torch 展開、
+# ReplayBuffer、第 2 版分片、以及第 1 版分片的轉換，都必須與 encode_obs_v2 的結果完全相同
+
+import contextlib
+import io
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+import torch
+
+from mahjong_ai.buffer import ReplayBuffer
+from mahjong_ai.dataset import expand_obs_tensor
+from mahjong_ai.shards import ShardReader, ShardWriter, FORMAT_NAME, LEGACY_FIELDS, MANIFEST_NAME
+from mahjong_ai.table.encode_obs import (
+    OBS_SHAPE_V2, ACTION_DIM, SCALAR_ROWS, ROW_HAND, ROW_SELF_RIVER, ROW_OTHERS_RIVER,
+    compress_obs, expand_obs,
+)
+from mahjong_ai.table.table import Table
+from mahjong_ai.table.wall import WallPool
+from mahjong_ai.table.decision import run_to_end
+from mahjong_ai.utils.helper_interface import set_helper_backend
+
+SEED = 7
+NUM_GAMES = 1
+
+
+def play_games(num_games: int, seed: int):
+    """
+    跑 num_games 場真實牌局（模型決策改為隨機挑一個合法 action），回傳寫進 ReplayBuffer 的
+    obs [N, 942, 34]、mask [N, 46]、action [N]、reward [N]。
+    """
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    wall_pool = WallPool(seed, batch_size=num_games)
+    buffer = ReplayBuffer(20000)
+    samples = []
+
+    def answer(decision):
+        if not decision.needs_model:
+            return decision.default
+        obs, mask = decision.encode()
+        action = int(rng.choice(np.flatnonzero(mask)))
+        samples.append((obs.copy(), mask.copy(), action))
+        return action
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(num_games):
+            run_to_end(Table(wall_pool=wall_pool).play(buffer), answer)
+
+    obs = np.stack([s[0] for s in samples])
+    mask = np.stack([s[1] for s in samples])
+    action = np.array([s[2] for s in samples])
+    assert len(buffer) == len(samples), "每個模型決策都要寫進 buffer 一筆"
+    return obs, mask, action, buffer
+
+
+@pytest.fixture(scope="module")
+def games():
+    # reward 要算牌效率，用 native 實作，不必有 helper 執行檔
+    set_helper_backend("native")
+    try:
+        yield play_games(NUM_GAMES, SEED)
+    finally:
+        set_helper_backend(None)
+
+
+def assert_same(actual, expected, what: str):
+    actual = np.asarray(actual)
+    assert actual.shape == expected.shape, f"{what}: 形狀 {actual.shape} != {expected.shape}"
+    diff = np.argwhere(actual != expected)
+    assert len(diff) == 0, f"{what}: {len(diff)} 格不同，第一格 {tuple(diff[0])}：{actual[tuple(diff[0])]} != {expected[tuple(diff[0])]}"
+
+
+def test_games_cover_obs_rows(games):
+    # 確認資料真的用到手牌、牌河與連續值的列，而不是一堆 0
+    obs, mask, _, _ = games
+    assert len(obs) > 20
+    assert obs.shape[1:] == OBS_SHAPE_V2 and mask.shape[1:] == (ACTION_DIM,)
+    assert obs[:, ROW_HAND].any()
+    assert obs[:, ROW_SELF_RIVER:ROW_SELF_RIVER + 30].any()
+    assert obs[:, ROW_OTHERS_RIVER:ROW_OTHERS_RIVER + 90].any()
+    scalars = obs[:, SCALAR_ROWS, 0]
+    assert (scalars != 0).any() and (scalars % 1 != 0).any(), "連續值的列至少要有非整數的值"
+
+
+def test_compress_expand(games):
+    obs, _, _, _ = games
+    assert_same(expand_obs(*compress_obs(obs)), obs, "expand_obs（整批）")
+    assert_same(expand_obs(*compress_obs(obs[0])), obs[0], "expand_obs（單筆）")
+
+
+def test_expand_obs_tensor(games):
+    obs, _, _, _ = games
+    hand, flags, scalars = compress_obs(obs)
+    expanded = expand_obs_tensor(torch.from_numpy(hand), torch.from_numpy(flags), torch.from_numpy(scalars))
+    assert expanded.dtype == torch.float32
+    assert_same(expanded.numpy(), obs, "expand_obs_tensor")
+
+
+def test_replay_buffer(games):
+    obs, mask, action, buffer = games
+    obs_back, mask_back, action_back, _ = buffer.get_arrays(np.arange(len(buffer)))
+    assert_same(obs_back, obs, "ReplayBuffer.get_arrays obs")
+    assert_same(mask_back, mask, "ReplayBuffer.get_arrays mask")
+    assert_same(action_back, action, "ReplayBuffer.get_arrays action")
+
+    compact = buffer.compact_arrays(np.arange(len(buffer)))
+    expanded = expand_obs_tensor(*(torch.from_numpy(compact[key]) for key in ("hand", "flags", "scalars")))
+    assert_same(expanded.numpy(), obs, "ReplayBuffer.compact_arrays → expand_obs_tensor")
+
+
+def test_shards_v2(games, tmp_path):
+    obs, mask, action, buffer = games
+    reward = buffer.rewards()
+    writer = ShardWriter(str(tmp_path), shard_size=16)
+    for i in range(len(obs)):
+        writer.add(obs[i], mask[i], action[i], reward[i])
+    writer.close()
+
+    reader = ShardReader(str(tmp_path))
+    assert reader.version == 2 and len(reader) == len(obs)
+    parts = [reader.get_shard_arrays(shard_id, slice(None)) for shard_id in range(reader.num_shards)]
+    assert_same(np.concatenate([p[0] for p in parts]), obs, "第 2 版分片 obs")
+    assert_same(np.concatenate([p[1] for p in parts]), mask, "第 2 版分片 mask")
+    assert_same(np.concatenate([p[2] for p in parts]), action, "第 2 版分片 action")
+
+
+def write_legacy_dataset(out_dir: str, obs, mask, action, reward, shard_size: int) -> None:
+    """
+    以第 1 版格式寫出分片資料集：obs 存整張 uint8（SCALAR_ROWS 的格子為 0），scalars 另存。
+    """
+    shards = []
+    for start in range(0, len(obs), shard_size):
+        rows = slice(start, start + shard_size)
+        legacy_obs = obs[rows].copy()
+        legacy_obs[:, SCALAR_ROWS, 0] = 0
+        arrays = {
+            "obs": legacy_obs.astype(np.uint8),
+            "scalars": obs[rows][:, SCALAR_ROWS, 0].astype(np.float32),
+            "mask": np.packbits(mask[rows], axis=-1),
+            "action": action[rows].astype(np.int16),
+            "reward": reward[rows].astype(np.float32),
+        }
+        name = f"shard_{len(shards):05d}.npz"
+        np.savez_compressed(os.path.join(out_dir, name), **{key: arrays[key] for key in LEGACY_FIELDS})
+        shards.append({"file": name, "num_samples": len(legacy_obs)})
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": 1,
+        "obs_shape": list(OBS_SHAPE_V2),
+        "action_dim": ACTION_DIM,
+        "scalar_rows": list(SCALAR_ROWS),
+        "compressed": True,
+        "num_samples": len(obs),
+        "shards": shards,
+        "meta": {},
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def test_shards_v1_conversion(games, tmp_path):
+    obs, mask, action, buffer = games
+    write_legacy_dataset(str(tmp_path), obs, mask, action, buffer.rewards(), shard_size=16)
+
+    reader = ShardReader(str(tmp_path))
+    assert reader.version == 1 and len(reader) == len(obs)
+    compact = [reader.read(shard_id, slice(None)) for shard_id in range(reader.num_shards)]
+    hand, flags, scalars = (np.concatenate([c[key] for c in compact]) for key in ("hand", "flags", "scalars"))
+    assert_same(expand_obs(hand, flags, scalars), obs, "第 1 版分片 → expand_obs")
+    expanded = expand_obs_tensor(torch.from_numpy(hand), torch.from_numpy(flags), torch.from_numpy(scalars))
+    assert_same(expanded.numpy(), obs, "第 1 版分片 → expand_obs_tensor")
+
+    parts = [reader.get_shard_arrays(shard_id, slice(None)) for shard_id in range(reader.num_shards)]
+    assert_same(np.concatenate([p[0] for p in parts]), obs, "第 1 版分片 get_shard_arrays obs")
+    assert_same(np.concatenate([p[1] for p in parts]), mask, "第 1 版分片 get_shard_arrays mask")
+    assert_same(np.concatenate([p[2] for p in parts]), action, "第 1 版分片 get_shard_arrays action")